@@ -1,10 +1,22 @@
 from django.contrib import admin
 
 from inventory.models import (Material, MaterialQuantity, MaterialStock,
-                              Product, Store)
+                              Product, ProductAvailability, StockAlert,
+                              StockHold, StockMovement, StockSnapshot, Store)
+
+
+@admin.register(MaterialStock)
+class MaterialStockAdmin(admin.ModelAdmin):
+    # Changed with the shard_stock command, which moves the stock.
+    readonly_fields = ['shard_count']
+
 
 admin.site.register(Store)
 admin.site.register(Product)
 admin.site.register(MaterialQuantity)
 admin.site.register(Material)
-admin.site.register(MaterialStock)
+admin.site.register(ProductAvailability)
+admin.site.register(StockHold)
+admin.site.register(StockMovement)
+admin.site.register(StockSnapshot)
+admin.site.register(StockAlert)
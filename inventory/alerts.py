@@ -0,0 +1,127 @@
+import datetime
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from inventory import serializers, services
+from inventory.models import MaterialStock, StockAlert
+
+# Alerts posted to the webhook per request, and the seconds to wait for it.
+ALERT_DELIVERY_BATCH_SIZE = 100
+ALERT_WEBHOOK_TIMEOUT = 10
+# Seconds after which alerts claimed by a worker that never finished are sent
+# again by another.
+ALERT_CLAIM_TIMEOUT = 6 * ALERT_WEBHOOK_TIMEOUT
+
+
+def check(material_stocks):
+    # Raises or resolves the alerts of the material stocks a write has just
+    # changed, given with their new current capacity, inside the transaction
+    # of the write. Only the changed stocks are looked at.
+    now = timezone.now()
+    low_alerts = []
+    stocked_ids = []
+    for material_stock in material_stocks:
+        if material_stock.reorder_point is None:
+            continue
+        current_capacity = material_stock.total_capacity
+        if current_capacity < material_stock.reorder_point:
+            low_alerts.append(
+                StockAlert(
+                    material_stock_id=material_stock.pk,
+                    store_id=material_stock.store_id,
+                    material_id=material_stock.material_id,
+                    current_capacity=current_capacity,
+                    reorder_point=material_stock.reorder_point,
+                    created_at=now,
+                )
+            )
+        else:
+            stocked_ids.append(material_stock.pk)
+
+    # A stock still low keeps its open alert, the constraint drops the new one.
+    StockAlert.objects.bulk_create(low_alerts, ignore_conflicts=True)
+    resolve(stocked_ids, now)
+
+
+def check_materials(store_id, material_ids):
+    # Same for stocks changed by an UPDATE, which are read back.
+    check(
+        MaterialStock.objects.filter(
+            store=store_id, material__in=material_ids, reorder_point__isnull=False
+        )
+    )
+
+
+def resolve(material_stock_ids, now=None):
+    if material_stock_ids:
+        StockAlert.objects.filter(
+            material_stock__in=material_stock_ids, resolved_at__isnull=True
+        ).update(resolved_at=now or timezone.now())
+
+
+def deliver(batch_size=ALERT_DELIVERY_BATCH_SIZE):
+    # Posts the alerts not sent yet to INVENTORY_ALERT_WEBHOOK_URL as JSON
+    # lists, oldest first, and returns how many were sent. An alert is only
+    # marked once the webhook has answered, so a failed batch is sent again.
+    if not settings.INVENTORY_ALERT_WEBHOOK_URL:
+        return 0
+
+    delivered = 0
+    while True:
+        count = _deliver_batch(batch_size)
+        delivered += count
+        if count < batch_size:
+            return delivered
+
+
+def _deliver_batch(batch_size):
+    # The batch is claimed first so that no row lock is held while the webhook
+    # answers, which would stall the writes resolving these alerts.
+    alerts = _claim_batch(batch_size)
+    if not alerts:
+        return 0
+
+    request = urllib.request.Request(
+        settings.INVENTORY_ALERT_WEBHOOK_URL,
+        data=JSONRenderer().render(
+            serializers.StockAlertSerializer(alerts, many=True).data
+        ),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    alert_ids = [alert.pk for alert in alerts]
+    try:
+        with urllib.request.urlopen(request, timeout=ALERT_WEBHOOK_TIMEOUT):
+            pass
+    except OSError:
+        StockAlert.objects.filter(pk__in=alert_ids).update(claimed_at=None)
+        raise
+    StockAlert.objects.filter(pk__in=alert_ids).update(delivered_at=timezone.now())
+
+    return len(alerts)
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _claim_batch(batch_size):
+    # Alerts being claimed or sent by another worker are skipped, unless its
+    # claim is so old that the worker must have died.
+    now = timezone.now()
+    alerts = list(
+        StockAlert.objects.select_for_update(skip_locked=True)
+        .filter(delivered_at__isnull=True)
+        .filter(
+            Q(claimed_at__isnull=True)
+            | Q(claimed_at__lt=now - datetime.timedelta(seconds=ALERT_CLAIM_TIMEOUT))
+        )
+        .order_by('pk')[:batch_size]
+    )
+    StockAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(
+        claimed_at=now
+    )
+    return alerts
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+from inventorymanagement.databases import set_pragmas
 
 
 class InventoryConfig(AppConfig):
     name = 'inventory'
+
+    def ready(self):
+        from inventory import signals  # noqa: F401
+
+        connection_created.connect(set_pragmas)
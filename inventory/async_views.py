@@ -0,0 +1,181 @@
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from inventory import caching, views
+from inventory.models import Store
+from inventory.streaming import STREAM_QUERY_PARAM
+
+# Seconds between checks of the store versions while long polls wait, and
+# the longest wait a client can ask for.
+LONG_POLL_INTERVAL = 0.5
+LONG_POLL_MAX_WAIT = 60
+
+# Django 3.1 has no async ORM, so the reads run on this bounded pool while
+# the waiting is done on the event loop. A waiting request holds no thread.
+_read_executor = ThreadPoolExecutor(
+    max_workers=settings.INVENTORY_ASYNC_READ_THREADS,
+    thread_name_prefix='inventory-read',
+)
+
+_inventory_view = views.InventoryViewSet.as_view({'get': 'list'})
+_product_capacity_view = views.ProductCapacityViewSet.as_view({'get': 'list'})
+
+
+async def run_read(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _read_executor, functools.partial(_run_read, func, *args, **kwargs)
+    )
+
+
+def _run_read(func, *args, **kwargs):
+    # The pool threads outlive requests, so stale connections are dropped the
+    # way request_started does for a sync worker.
+    close_old_connections()
+    return func(*args, **kwargs)
+
+
+class StoreWatcher:
+    # Checks the versions of every store that long polls are waiting on with
+    # one cache read per interval, and wakes the polls whose stores changed.
+    # There is one per event loop, see get_store_watcher.
+
+    def __init__(self):
+        self.waiters = {}
+        self.task = None
+
+    async def wait(self, versions, timeout):
+        # Returns whether one of the stores moved away from the given
+        # {store_id: version} before the timeout.
+        event = asyncio.Event()
+        self.waiters[event] = versions
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # Not cancelled once the last poll is gone, or a poll arriving
+            # before the cancelled task is done would wait on it. The task
+            # stops on its own at its next check.
+            del self.waiters[event]
+
+        return True
+
+    async def _run(self):
+        while self.waiters:
+            await asyncio.sleep(LONG_POLL_INTERVAL)
+            if not self.waiters:
+                return
+            store_ids = list(
+                {
+                    store_id
+                    for versions in self.waiters.values()
+                    for store_id in versions
+                }
+            )
+            current_versions = dict(
+                zip(store_ids, await run_read(caching.get_store_versions, store_ids))
+            )
+            for event, versions in list(self.waiters.items()):
+                if any(
+                    current_versions[store_id] != version
+                    for store_id, version in versions.items()
+                ):
+                    event.set()
+
+
+_store_watchers = weakref.WeakKeyDictionary()
+
+
+def get_store_watcher():
+    loop = asyncio.get_running_loop()
+    if loop not in _store_watchers:
+        _store_watchers[loop] = StoreWatcher()
+    return _store_watchers[loop]
+
+
+def _render_view(view, request, **kwargs):
+    response = view(request, **kwargs)
+    return response.render()
+
+
+def _get_store_versions(request, store_pk):
+    stores = Store.objects.filter(user=request.user).order_by('pk')
+    if store_pk is not None:
+        stores = stores.filter(pk=store_pk)
+    store_ids = list(stores.values_list('pk', flat=True))
+    return dict(zip(store_ids, caching.get_store_versions(store_ids)))
+
+
+def _get_cached_response(request, store_ids):
+    # The new version of a response another request has already cached, so a
+    # change seen by many polls is read from the database once.
+    etag = caching.get_etag(request, store_ids)
+    data = caching.get_cached_data(etag)
+    if data is None:
+        return None
+
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type='application/json'
+    )
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
+
+
+async def long_poll(request, view, **kwargs):
+    # Runs a cached list view and, when the client already has the current
+    # version (If-None-Match) and asks to ?wait=<seconds>, holds the 304 until
+    # one of the stores changes or the wait runs out.
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if STREAM_QUERY_PARAM in request.GET:
+        return JsonResponse(
+            {"detail": "Streaming is not served by the async routes"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        wait = min(
+            float(request.GET.get(caching.WAIT_QUERY_PARAM, 0)), LONG_POLL_MAX_WAIT
+        )
+    except ValueError:
+        return JsonResponse(
+            {"detail": "Wait is not a number"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    response = await run_read(_render_view, view, request, **kwargs)
+    if wait <= 0 or response.status_code != status.HTTP_304_NOT_MODIFIED:
+        return response
+
+    # The view has authenticated request.user by now. Versions read after the
+    # view may already be newer than the ones its ETag was made from.
+    versions = await run_read(_get_store_versions, request, kwargs.get('store_pk'))
+    etag = caching.make_etag(request, list(versions.values()))
+    if etag == response['ETag'] and not await get_store_watcher().wait(versions, wait):
+        return response
+
+    cached_response = await run_read(_get_cached_response, request, list(versions))
+    if cached_response is not None:
+        return cached_response
+    return await run_read(_render_view, view, request, **kwargs)
+
+
+async def inventory(request):
+    return await long_poll(request, _inventory_view)
+
+
+async def product_capacity(request, store_pk=None):
+    if store_pk is None:
+        return await long_poll(request, _product_capacity_view)
+    return await long_poll(request, _product_capacity_view, store_pk=store_pk)
@@ -0,0 +1,423 @@
+import asyncio
+import bisect
+import contextlib
+import os
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import factory
+from django.db import OperationalError, connection, connections, reset_queries
+from django.test import AsyncClient, Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from inventory.models import Material, MaterialQuantity, MaterialStock, Product
+from inventory.profiling import percentile
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+from inventory.urls import router
+
+SCALES = {
+    'small': {'materials': 10, 'products': 10, 'max_ingredients': 5},
+    'medium': {'materials': 1000, 'products': 1000, 'max_ingredients': 20},
+    'large': {'materials': 50000, 'products': 10000, 'max_ingredients': 50},
+}
+
+# Products are added to the store in chunks so the availability refresh
+# triggered by Store.products stays below SQLite's bound parameter limit.
+PRODUCT_CHUNK_SIZE = 200
+
+
+def create_store(materials, products, max_ingredients, seed=0):
+    rng = random.Random(seed)
+    user = UserFactory()
+    store = StoreFactory(user=user)
+    prefix = 'benchmark-{store}'.format(store=store.pk)
+
+    Material.objects.bulk_create(
+        MaterialFactory.build_batch(
+            materials,
+            name=factory.Sequence(lambda n: '{}-material-{}'.format(prefix, n)),
+        ),
+        batch_size=500,
+    )
+    material_ids = list(
+        Material.objects.filter(name__startswith=prefix).values_list('pk', flat=True)
+    )
+    MaterialStock.objects.bulk_create(
+        [
+            MaterialStockFactory.build(
+                store=store,
+                material=Material(pk=material_id),
+                max_capacity=1000000,
+                current_capacity=500000,
+            )
+            for material_id in material_ids
+        ],
+        batch_size=500,
+    )
+
+    Product.objects.bulk_create(
+        ProductFactory.build_batch(
+            products,
+            name=factory.Sequence(lambda n: '{}-product-{}'.format(prefix, n)),
+        ),
+        batch_size=500,
+    )
+    product_ids = list(
+        Product.objects.filter(name__startswith=prefix).values_list('pk', flat=True)
+    )
+    MaterialQuantity.objects.bulk_create(
+        [
+            MaterialQuantityFactory.build(
+                product=Product(pk=product_id),
+                ingredient=Material(pk=material_id),
+            )
+            for product_id in product_ids
+            for material_id in rng.sample(
+                material_ids, rng.randint(1, min(max_ingredients, len(material_ids)))
+            )
+        ],
+        batch_size=500,
+    )
+
+    for start in range(0, len(product_ids), PRODUCT_CHUNK_SIZE):
+        store.products.add(*product_ids[start : start + PRODUCT_CHUNK_SIZE])
+
+    return store, material_ids, product_ids
+
+
+def get_endpoints(material_ids, product_ids):
+    endpoints = [
+        ('get', '/{}/'.format(prefix), None) for prefix, _, _ in router.registry
+    ]
+    endpoints.append(
+        (
+            'post',
+            '/sales/',
+            {
+                "sale": [
+                    {"product": product_id, "quantity": 1}
+                    for product_id in product_ids[:5]
+                ]
+            },
+        )
+    )
+    endpoints.append(
+        (
+            'post',
+            '/restock/',
+            {
+                "materials": [
+                    {"material": material_id, "quantity": 1}
+                    for material_id in material_ids[:5]
+                ]
+            },
+        )
+    )
+    return endpoints
+
+
+def measure_endpoint(client, method, path, data, iterations):
+    def request():
+        response = getattr(client, method)(path, data, format='json')
+        # A streamed response only runs its queries as its body is read.
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = request()
+    query_count = len(queries)
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000.0)
+
+    tracemalloc.start()
+    try:
+        request()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'method': method.upper(),
+        'path': path,
+        'status': response.status_code,
+        'queries': query_count,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'peak_memory_kb': round(peak_memory / 1024.0, 1),
+    }
+
+
+def run_benchmark(scale, iterations=20, seed=0):
+    store, material_ids, product_ids = create_store(seed=seed, **scale)
+    client = APIClient()
+    client.force_authenticate(user=store.user)
+
+    # The response cache off, or the repeats of a GET would time cache hits.
+    with override_settings(INVENTORY_RESPONSE_CACHE=False):
+        return [
+            measure_endpoint(client, method, path, data, iterations)
+            for method, path, data in get_endpoints(material_ids, product_ids)
+        ]
+
+
+def run_concurrency_benchmark(store, product_ids, readers, writers, duration):
+    # Readers poll /inventory/ while writers post single line sales, each on
+    # its own thread and database connection, for duration seconds.
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def run_client(method, path, data, key):
+        client = APIClient()
+        client.force_authenticate(user=store.user)
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    response = getattr(client, method)(path, data, format='json')
+                    succeeded = response.status_code == 200
+                except OperationalError:
+                    succeeded = False
+                with lock:
+                    counts[key if succeeded else 'errors'] += 1
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=run_client, args=('get', '/inventory/', None, 'reads'))
+        for _ in range(readers)
+    ]
+    for index in range(writers):
+        sale = {
+            "sale": [{"product": product_ids[index % len(product_ids)], "quantity": 1}]
+        }
+        threads.append(
+            threading.Thread(
+                target=run_client, args=('post', '/sales/', sale, 'writes')
+            )
+        )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'reads_per_s': round(counts['reads'] / duration, 1),
+        'writes_per_s': round(counts['writes'] / duration, 1),
+        'errors': counts['errors'],
+    }
+
+
+@contextlib.contextmanager
+def throwaway_sqlite_database():
+    # Creates the tables in a temporary SQLite file, which unlike the in-memory
+    # test database is shared by the threads of a benchmark. DEBUG is off so
+    # timings do not include query logging.
+    settings_dict = connection.settings_dict
+    old_name = settings_dict['NAME']
+    old_test_name = settings_dict['TEST']['NAME']
+    old_pragmas = settings_dict.get('PRAGMAS')
+    directory = tempfile.mkdtemp()
+    settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        settings_dict['PRAGMAS'] = old_pragmas
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        settings_dict['TEST']['NAME'] = old_test_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_long_poll_benchmark(
+    store, dashboards, threads, duration, change_interval=1.0, poll_interval=1.0
+):
+    # The same dashboards watch /product-capacity/ of a store that changes
+    # every change_interval seconds: once as long polls on the async route,
+    # and once polling every poll_interval seconds through a fixed pool of
+    # threads, the way sync workers serve them.
+    token = Token.objects.get_or_create(user=store.user)[0].key
+    material_stock = MaterialStock.objects.filter(store=store).first()
+
+    runs = {
+        'asgi': lambda: asyncio.run(_run_asgi_dashboards(token, dashboards, duration)),
+        'wsgi': lambda: _run_wsgi_dashboards(
+            token, dashboards, threads, duration, poll_interval
+        ),
+    }
+    results = {}
+    for path, run_dashboards in runs.items():
+        changes = []
+        stop = threading.Event()
+        writer = threading.Thread(
+            target=_change_store, args=(material_stock, change_interval, changes, stop)
+        )
+        writer.start()
+        try:
+            counts, latencies, peak_threads = run_dashboards()
+        finally:
+            stop.set()
+            writer.join()
+
+        # A dashboard learnt of the first change it had missed only when it
+        # received the new data.
+        notification_ms = []
+        for seen_before, seen in latencies:
+            index = bisect.bisect_right(changes, seen_before)
+            if index < len(changes) and changes[index] < seen:
+                notification_ms.append((seen - changes[index]) * 1000.0)
+        results[path] = {
+            'responses_per_s': round(counts['responses'] / duration, 1),
+            'errors': counts['errors'],
+            'notifications': len(notification_ms),
+            'p50_notification_ms': round(percentile(notification_ms, 50), 1)
+            if notification_ms
+            else None,
+            'p99_notification_ms': round(percentile(notification_ms, 99), 1)
+            if notification_ms
+            else None,
+            'peak_threads': peak_threads,
+        }
+
+    return results
+
+
+def _change_store(material_stock, change_interval, changes, stop):
+    try:
+        while not stop.wait(change_interval):
+            material_stock.current_capacity = 1 + len(changes) % 2
+            material_stock.save()
+            changes.append(time.perf_counter())
+    finally:
+        connections.close_all()
+
+
+async def _run_asgi_dashboards(token, dashboards, duration):
+    client = AsyncClient()
+    counts = {'responses': 0, 'errors': 0}
+    latencies = []
+    peak_threads = threading.active_count()
+    deadline = time.perf_counter() + duration
+
+    async def run_dashboard():
+        etag = ''
+        seen = time.perf_counter()
+        while time.perf_counter() < deadline:
+            wait = max(deadline - time.perf_counter(), 0.1)
+            response = await client.get(
+                '/async/product-capacity/?wait={:.1f}'.format(wait),
+                authorization='Token {}'.format(token),
+                if_none_match=etag,
+            )
+            if response.status_code not in (200, 304):
+                counts['errors'] += 1
+                continue
+            counts['responses'] += 1
+            if response.status_code == 200:
+                if etag:
+                    latencies.append((seen, time.perf_counter()))
+                etag = response['ETag']
+                seen = time.perf_counter()
+
+    tasks = [asyncio.ensure_future(run_dashboard()) for _ in range(dashboards)]
+    while not all(task.done() for task in tasks):
+        peak_threads = max(peak_threads, threading.active_count())
+        await asyncio.sleep(0.1)
+    await asyncio.gather(*tasks)
+
+    return counts, latencies, peak_threads
+
+
+def _run_wsgi_dashboards(token, dashboards, threads, duration, poll_interval):
+    counts = {'responses': 0, 'errors': 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    states = queue.Queue()
+    for _ in range(dashboards):
+        states.put({'etag': '', 'seen': time.perf_counter(), 'due': 0.0})
+
+    def run_worker():
+        client = Client()
+        try:
+            while time.perf_counter() < deadline:
+                state = states.get()
+                time.sleep(max(state['due'] - time.perf_counter(), 0.0))
+                response = client.get(
+                    '/product-capacity/',
+                    HTTP_AUTHORIZATION='Token {}'.format(token),
+                    HTTP_IF_NONE_MATCH=state['etag'],
+                )
+                with lock:
+                    if response.status_code not in (200, 304):
+                        counts['errors'] += 1
+                    else:
+                        counts['responses'] += 1
+                    if response.status_code == 200:
+                        if state['etag']:
+                            latencies.append((state['seen'], time.perf_counter()))
+                        state['etag'] = response['ETag']
+                        state['seen'] = time.perf_counter()
+                state['due'] = time.perf_counter() + poll_interval
+                states.put(state)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=run_worker) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    peak_threads = threading.active_count()
+    for worker in workers:
+        worker.join()
+
+    return counts, latencies, peak_threads
+
+
+def compare_results(previous, current, tolerance):
+    previous_endpoints = {
+        (result['scale'], endpoint['method'], endpoint['path']): endpoint
+        for result in previous['results']
+        for endpoint in result['endpoints']
+    }
+
+    regressions = []
+    for result in current['results']:
+        for endpoint in result['endpoints']:
+            key = (result['scale'], endpoint['method'], endpoint['path'])
+            before = previous_endpoints.get(key)
+            if before is None:
+                continue
+            if endpoint['queries'] > before['queries']:
+                regressions.append(
+                    "{} {} {}: queries {} -> {}".format(
+                        *key, before['queries'], endpoint['queries']
+                    )
+                )
+            if endpoint['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append(
+                    "{} {} {}: p50 {}ms -> {}ms".format(
+                        *key, before['p50_ms'], endpoint['p50_ms']
+                    )
+                )
+
+    return regressions
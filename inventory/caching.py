@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from inventory.models import Store
+from inventory.streaming import is_stream_requested
+
+# Every store has an opaque version token that changes whenever anything shown
+# by its read endpoints changes. Responses are cached under the versions of
+# the user's stores, so a write never has to find the entries it makes stale.
+STORE_VERSION_CACHE_KEY = 'inventory:store-version:{store_id}'
+RESPONSE_CACHE_KEY = 'inventory:response:{etag}'
+# How long a long poll waits for a change, see inventory.async_views. It does
+# not change the response, so it is left out of the ETag.
+WAIT_QUERY_PARAM = 'wait'
+
+
+def get_store_versions(store_ids):
+    cache_keys = [
+        STORE_VERSION_CACHE_KEY.format(store_id=store_id) for store_id in store_ids
+    ]
+    versions = cache.get_many(cache_keys)
+    missing_versions = {
+        cache_key: uuid.uuid4().hex
+        for cache_key in cache_keys
+        if cache_key not in versions
+    }
+    if missing_versions:
+        cache.set_many(missing_versions, timeout=None)
+        versions.update(missing_versions)
+
+    return [versions[cache_key] for cache_key in cache_keys]
+
+
+def _set_store_versions(store_ids):
+    cache.set_many(
+        {
+            STORE_VERSION_CACHE_KEY.format(store_id=store_id): uuid.uuid4().hex
+            for store_id in store_ids
+        },
+        timeout=None,
+    )
+
+
+def invalidate_stores(store_ids):
+    store_ids = set(store_ids)
+    if not store_ids:
+        return
+
+    _set_store_versions(store_ids)
+    # Once more on commit: a concurrent request may have cached the data from
+    # before this transaction under the version set above.
+    transaction.on_commit(lambda: _set_store_versions(store_ids))
+
+
+def get_etag(request, store_ids):
+    return make_etag(request, get_store_versions(store_ids))
+
+
+def make_etag(request, versions):
+    query = request.GET.copy()
+    query.pop(WAIT_QUERY_PARAM, None)
+    url = request.build_absolute_uri(request.path)
+    if query:
+        url = '{}?{}'.format(url, query.urlencode())
+    key = '|'.join([str(request.user.pk), url] + versions)
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+
+def get_cached_data(etag):
+    return cache.get(RESPONSE_CACHE_KEY.format(etag=etag.strip('"')))
+
+
+def cache_response(list_method):
+    # Caches the data of a list action per user, URL and store versions and
+    # answers a matching If-None-Match with 304 before running the view.
+    @functools.wraps(list_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not settings.INVENTORY_RESPONSE_CACHE or is_stream_requested(request):
+            return list_method(self, request, *args, **kwargs)
+
+        if hasattr(self, 'get_stores'):
+            store_ids = [store.pk for store in self.get_stores()]
+        else:
+            store_ids = (
+                Store.objects.filter(user=request.user)
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+        etag = get_etag(request, store_ids)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = get_cached_data(etag)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = list_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(
+                    RESPONSE_CACHE_KEY.format(etag=etag.strip('"')),
+                    response.data,
+                    settings.INVENTORY_RESPONSE_CACHE_TIMEOUT,
+                )
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
+
+    return wrapper
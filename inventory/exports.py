@@ -0,0 +1,84 @@
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from inventory import services
+from inventory.models import MaterialStock, ProductAvailability
+from inventory.streaming import iter_csv, iter_ndjson, iter_queryset
+
+# One flat row per material stock or product of a store, so every format has
+# the same typed columns. The columns that do not apply to a kind are empty.
+SNAPSHOT_COLUMNS = [
+    'snapshot_at',
+    'store',
+    'kind',
+    'id',
+    'current_capacity',
+    'max_capacity',
+    'available_quantity',
+]
+
+SNAPSHOT_FORMATS = {
+    'csv': ('text/csv', iter_csv),
+    'ndjson': ('application/x-ndjson', iter_ndjson),
+}
+
+
+def iter_snapshot(store_ids, output):
+    _, iter_format = SNAPSHOT_FORMATS[output]
+    return iter_format(SNAPSHOT_COLUMNS, iter_snapshot_rows(store_ids))
+
+
+def stream_snapshot(store_ids, output):
+    content_type, _ = SNAPSHOT_FORMATS[output]
+    response = StreamingHttpResponse(
+        iter_snapshot(store_ids, output), content_type=content_type
+    )
+    response['Content-Disposition'] = 'attachment; filename="snapshot.{}"'.format(
+        output
+    )
+    return response
+
+
+def iter_snapshot_rows(store_ids, snapshot_at=None):
+    # Rows are read with iter_queryset so only one chunk of each query is held.
+    snapshot_at = (snapshot_at or timezone.now()).isoformat()
+
+    material_stocks = (
+        MaterialStock.objects.filter(store__in=store_ids)
+        .order_by('store', 'material')
+        .annotate(total_capacity=services.get_current_capacity())
+        .values_list('store', 'material', 'total_capacity', 'max_capacity')
+    )
+    for (
+        store_id,
+        material_id,
+        current_capacity,
+        max_capacity,
+    ) in iter_queryset(material_stocks):
+        yield [
+            snapshot_at,
+            store_id,
+            'material',
+            material_id,
+            current_capacity,
+            max_capacity,
+            None,
+        ]
+
+    product_availabilities = (
+        ProductAvailability.objects.filter(store__in=store_ids)
+        .order_by('store', 'product')
+        .values_list('store', 'product', 'available_quantity')
+    )
+    for store_id, product_id, available_quantity in iter_queryset(
+        product_availabilities
+    ):
+        yield [
+            snapshot_at,
+            store_id,
+            'product',
+            product_id,
+            None,
+            None,
+            available_quantity,
+        ]
@@ -0,0 +1,33 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class BelowPercentageFilter(BaseFilterBackend):
+    # ?below_pct=20 keeps the stocks filled to less than 20% of their capacity.
+    query_param = 'below_pct'
+
+    def filter_queryset(self, request, queryset, view):
+        below_percentage = request.query_params.get(self.query_param)
+        if below_percentage is None:
+            return queryset
+
+        try:
+            below_percentage = float(below_percentage)
+        except ValueError:
+            raise ValidationError("below_pct is not a number")
+        return queryset.filter(percentage__lt=below_percentage)
+
+
+class StableOrderingFilter(OrderingFilter):
+    # Always breaks ties on the primary key so cursor pagination stays stable.
+    # A field of the view's ordering_aliases is ordered by the annotation that
+    # stands in for it.
+    def get_ordering(self, request, queryset, view):
+        aliases = getattr(view, 'ordering_aliases', {})
+        ordering = []
+        for term in super().get_ordering(request, queryset, view) or []:
+            field = term.lstrip('-')
+            ordering.append(term[: -len(field)] + aliases.get(field, field))
+        if 'id' not in ordering and '-id' not in ordering:
+            ordering.append('id')
+        return ordering
@@ -0,0 +1,191 @@
+import datetime
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from inventory import alerts, caching, ledger, services, shards
+from inventory.models import MaterialStock, StockHold, StockMovement
+from inventory.serializers import validate_sale_item
+
+# Seconds a hold keeps its stock when no ttl is given, and the longest ttl a
+# client can ask for.
+HOLD_TTL = 300
+HOLD_MAX_TTL = 3600
+
+# Expired holds given back per transaction by expire_holds.
+HOLD_SWEEP_BATCH_SIZE = 1000
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def reserve(store, items, ttl=HOLD_TTL):
+    if not isinstance(ttl, int) or not 0 < ttl <= HOLD_MAX_TTL:
+        raise serializers.ValidationError(
+            "Ttl is not an integer between 1 and {}".format(HOLD_MAX_TTL)
+        )
+
+    held_quantities = {}
+    for item in items:
+        validate_sale_item(item)
+        held_quantities[item['product']] = (
+            held_quantities.get(item['product'], 0) + item['quantity']
+        )
+    if not held_quantities:
+        raise serializers.ValidationError("No items given")
+
+    store_products = set(
+        store.products.filter(product_id__in=held_quantities).values_list(
+            'product_id', flat=True
+        )
+    )
+    for product_id in held_quantities:
+        if product_id not in store_products:
+            raise serializers.ValidationError(
+                "Product with id of {id} not found in store".format(id=product_id)
+            )
+
+    available_quantities = services.get_products_available_quantity(
+        store, held_quantities
+    )
+    for product_id, held_quantity in held_quantities.items():
+        if held_quantity > available_quantities.get(product_id, 0):
+            raise serializers.ValidationError(
+                "Product {id} held quantity is more than the current available "
+                "quantity".format(id=product_id)
+            )
+
+    materials = services.get_material_deductions(
+        held_quantities, services.get_recipes(held_quantities)
+    )
+    # Holds are reserved on the stock row, so sharded stocks are gathered into
+    # it first.
+    shards.lock(store.pk, materials, collect=True)
+    # A single conditional UPDATE reserves every material against its
+    # committed value, on the rows locked above, so concurrent holds cannot
+    # take the same stock and no row stays locked while the payment completes.
+    increment = _get_material_case(materials.items())
+    updated = MaterialStock.objects.filter(
+        store=store,
+        material__in=materials,
+        current_capacity__gte=F('held_capacity') + increment,
+    ).update(held_capacity=F('held_capacity') + increment)
+    if updated != len(materials):
+        raise serializers.ValidationError("Not enough stock left to hold the products")
+
+    hold = StockHold.objects.create(
+        store=store,
+        items=[
+            {"product": product_id, "quantity": quantity}
+            for product_id, quantity in held_quantities.items()
+        ],
+        materials=sorted(materials.items()),
+        expires_at=timezone.now() + datetime.timedelta(seconds=ttl),
+    )
+    services.refresh_material_availability(store.pk, materials)
+    caching.invalidate_stores([store.pk])
+
+    return hold
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def commit(hold_id):
+    # Sells the held stock, or gives it back if the hold has expired. Returns
+    # whether the stock was sold.
+    hold = _get_hold(hold_id)
+    sold = hold.expires_at > timezone.now()
+    _give_back(hold.store_id, hold.materials, sold)
+    hold.delete()
+
+    return sold
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def release(hold_id):
+    hold = _get_hold(hold_id)
+    _give_back(hold.store_id, hold.materials, False)
+    hold.delete()
+
+
+def expire_holds(now=None, batch_size=HOLD_SWEEP_BATCH_SIZE):
+    # Gives back the stock of every hold expired by now, a batch at a time,
+    # and returns how many were expired.
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        count = _expire_hold_batch(now, batch_size)
+        expired += count
+        if count < batch_size:
+            return expired
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _expire_hold_batch(now, batch_size):
+    # Holds being committed or released are left to that request.
+    holds = list(
+        StockHold.objects.select_for_update(skip_locked=True)
+        .filter(expires_at__lte=now)
+        .order_by('expires_at')
+        .values_list('pk', 'store', 'materials')[:batch_size]
+    )
+
+    store_materials = {}
+    for _, store_id, materials in holds:
+        totals = store_materials.setdefault(store_id, {})
+        for material_id, quantity in materials:
+            totals[material_id] = totals.get(material_id, 0) + quantity
+    for store_id, totals in sorted(store_materials.items()):
+        _give_back(store_id, totals.items(), False)
+    StockHold.objects.filter(pk__in=[pk for pk, _, _ in holds]).delete()
+
+    return len(holds)
+
+
+def _get_hold(hold_id):
+    hold = StockHold.objects.select_for_update().filter(pk=hold_id).first()
+    if hold is None:
+        raise serializers.ValidationError(
+            "Hold with id of {id} not found".format(id=hold_id)
+        )
+    return hold
+
+
+def _give_back(store_id, materials, sold):
+    # Takes the materials off the held capacity and, for a sale, off the
+    # current capacity too.
+    materials = list(materials)
+    # Locked first in the order sales take them, which the UPDATE alone does
+    # not keep, so the two cannot deadlock.
+    shards.lock(store_id, [material_id for material_id, _ in materials])
+    decrement = _get_material_case(materials)
+    changes = {'held_capacity': F('held_capacity') - decrement}
+    if sold:
+        changes['current_capacity'] = F('current_capacity') - decrement
+    MaterialStock.objects.filter(
+        store=store_id, material__in=[material_id for material_id, _ in materials]
+    ).update(**changes)
+    if sold:
+        ledger.record(
+            StockMovement.SALE,
+            {(store_id, material_id): -quantity for material_id, quantity in materials},
+        )
+        alerts.check_materials(store_id, [material_id for material_id, _ in materials])
+
+    services.refresh_material_availability(
+        store_id, [material_id for material_id, _ in materials]
+    )
+    caching.invalidate_stores([store_id])
+
+
+def _get_material_case(materials):
+    return Case(
+        *[
+            When(material=material_id, then=Value(quantity))
+            for material_id, quantity in materials
+        ],
+        output_field=models.PositiveIntegerField(),
+    )
@@ -0,0 +1,408 @@
+import codecs
+import csv
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+
+from inventory import alerts, caching, ledger, services, shards
+from inventory.models import (Material, MaterialQuantity, MaterialStock,
+                              Product, StockMovement, Store)
+from inventory.serializers import (MaterialImportSerializer,
+                                   ProductImportSerializer,
+                                   RecipeImportSerializer, validate_sale_item)
+
+# Lines applied per transaction, so a long journal neither holds the write
+# lock for its whole length nor loses everything to one bad batch.
+SALES_BATCH_SIZE = 5000
+CATALOGUE_BATCH_SIZE = 2000
+
+CSV_CONTENT_TYPE = 'text/csv'
+
+CATALOGUE_KINDS = ('materials', 'products', 'recipes')
+
+
+def iter_records(stream, content_type=None):
+    # Yields (line number, record or error) from a text stream of NDJSON
+    # objects or, for text/csv, CSV rows under a header line.
+    if content_type == CSV_CONTENT_TYPE:
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, {
+                key: value for key, value in row.items() if key and value
+            }
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line_number, "Line is not valid JSON"
+            continue
+        if not isinstance(item, dict):
+            yield line_number, "Line is not a JSON object"
+            continue
+        yield line_number, item
+
+
+def iter_sale_lines(stream, content_type=None):
+    # CSV values are all strings, so the integers are converted for the checks
+    # of validate_sale_item.
+    for line_number, item in iter_records(stream, content_type):
+        if content_type == CSV_CONTENT_TYPE:
+            item = {
+                key: int(value) if value.lstrip('-').isdigit() else value
+                for key, value in item.items()
+            }
+        yield line_number, item
+
+
+def iter_text_lines(stream):
+    # Decodes a binary stream, such as the body of a request, line by line.
+    return codecs.iterdecode(stream, 'utf-8')
+
+
+def ingest_sales(user, lines, batch_size=SALES_BATCH_SIZE):
+    # Applies a journal of sale lines across the user's stores and reports the
+    # lines that could not be applied. Lines are applied in order, so a line
+    # is only rejected for stock once the lines before it have been deducted.
+    store_ids = set(Store.objects.filter(user=user).values_list('pk', flat=True))
+    report = {"lines": 0, "applied": 0, "errors": []}
+
+    batch = []
+    for line_number, item in lines:
+        report["lines"] += 1
+        error = _get_line_error(item, store_ids)
+        if error is not None:
+            report["errors"].append({"line": line_number, "error": error})
+            continue
+
+        batch.append((line_number, item))
+        if len(batch) == batch_size:
+            _apply_batch(batch, store_ids, report)
+            batch = []
+    if batch:
+        _apply_batch(batch, store_ids, report)
+
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
+
+
+def _get_line_error(item, store_ids):
+    if isinstance(item, str):
+        return item
+
+    try:
+        validate_sale_item(item)
+    except serializers.ValidationError as error:
+        return str(error.detail[0])
+
+    if "store" not in item:
+        if len(store_ids) != 1:
+            return "Store field is not given"
+        item["store"] = next(iter(store_ids))
+    if not isinstance(item["store"], int):
+        return "Store is not an integer"
+    if item["store"] not in store_ids:
+        return "Store with id of {id} not found".format(id=item["store"])
+
+
+def _apply_batch(batch, store_ids, report):
+    lines_by_store = {}
+    for line_number, item in batch:
+        lines_by_store.setdefault(item["store"], []).append((line_number, item))
+
+    for store_id, lines in sorted(lines_by_store.items()):
+        applied, errors = _apply_store_lines(store_id, lines)
+        report["applied"] += applied
+        report["errors"].extend(errors)
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _apply_store_lines(store_id, lines):
+    product_ids = {item["product"] for _, item in lines}
+    store_products = set(
+        Store.products.through.objects.filter(
+            store=store_id, product__in=product_ids
+        ).values_list('product', flat=True)
+    )
+    recipes = services.get_recipes(store_products)
+    material_ids = {
+        material_id for recipe in recipes.values() for material_id, _ in recipe
+    }
+    # A batch works on the stock rows, so sharded stocks are gathered into
+    # them for its length.
+    material_stocks = shards.lock(store_id, material_ids, collect=True)
+
+    applied = 0
+    errors = []
+    sold_quantities = {}
+    for line_number, item in lines:
+        product_id = item["product"]
+        if product_id not in store_products:
+            errors.append(
+                {
+                    "line": line_number,
+                    "error": "Product with id of {id} not found in store".format(
+                        id=product_id
+                    ),
+                }
+            )
+            continue
+
+        deductions = services.get_material_deductions(
+            {product_id: item["quantity"]}, recipes
+        )
+        if not deductions or any(
+            material_id not in material_stocks
+            or deduction > material_stocks[material_id].unheld_capacity
+            for material_id, deduction in deductions.items()
+        ):
+            errors.append(
+                {
+                    "line": line_number,
+                    "error": "Product {id} sold quantity is more than the current "
+                    "available quantity".format(id=product_id),
+                }
+            )
+            continue
+
+        for material_id, deduction in deductions.items():
+            material_stocks[material_id].current_capacity -= deduction
+            sold_quantities[material_id] = (
+                sold_quantities.get(material_id, 0) + deduction
+            )
+        applied += 1
+
+    if sold_quantities:
+        MaterialStock.objects.bulk_update(
+            [material_stocks[material_id] for material_id in sold_quantities],
+            ['current_capacity'],
+        )
+        alerts.check(material_stocks[material_id] for material_id in sold_quantities)
+        # One movement per material for the batch, not per line.
+        ledger.record(
+            StockMovement.SALE,
+            {
+                (store_id, material_id): -quantity
+                for material_id, quantity in sold_quantities.items()
+            },
+        )
+        services.refresh_material_availability(store_id, sold_quantities)
+        caching.invalidate_stores([store_id])
+
+    return applied, errors
+
+
+def ingest_catalogue(kind, lines, user=None, batch_size=CATALOGUE_BATCH_SIZE):
+    # Creates or updates the materials (name,price), products (name) or recipes
+    # (product,material,quantity) of a file, matched by their unique names.
+    # Given a user, only the rows the user's stores use can be updated, as
+    # through the endpoints of the rows; without one, as for the command, all.
+    serializer_class, import_batch = _CATALOGUE_IMPORTERS[kind]
+    report = {"lines": 0, "created": 0, "updated": 0, "errors": []}
+
+    batch = []
+    for line_number, item in lines:
+        report["lines"] += 1
+        if isinstance(item, str):
+            report["errors"].append({"line": line_number, "error": item})
+            continue
+
+        serializer = serializer_class(data=item)
+        if not serializer.is_valid():
+            report["errors"].append(
+                {"line": line_number, "error": _get_serializer_error(serializer)}
+            )
+            continue
+
+        batch.append((line_number, serializer.validated_data))
+        if len(batch) == batch_size:
+            _import_batch(import_batch, batch, user, report)
+            batch = []
+    if batch:
+        _import_batch(import_batch, batch, user, report)
+
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
+
+
+def _get_serializer_error(serializer):
+    field, errors = next(iter(serializer.errors.items()))
+    return "{field}: {error}".format(field=field, error=errors[0])
+
+
+def _import_batch(import_batch, batch, user, report):
+    created, updated, errors = import_batch(batch, user)
+    report["created"] += created
+    report["updated"] += updated
+    report["errors"].extend(errors)
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _import_materials(batch, user):
+    materials = Material.objects.in_bulk(
+        {item["name"] for _, item in batch}, field_name='name'
+    )
+    if user is not None:
+        stocked_ids = set(
+            MaterialStock.objects.filter(
+                store__user=user, material__in=materials.values()
+            ).values_list('material', flat=True)
+        )
+
+    errors = []
+    # A later line of the same name wins.
+    items = {}
+    for line_number, item in batch:
+        material = materials.get(item["name"])
+        if user is not None and material and material.pk not in stocked_ids:
+            errors.append(
+                {
+                    "line": line_number,
+                    "error": "Material {name} not found in the user's stores".format(
+                        name=item["name"]
+                    ),
+                }
+            )
+            continue
+        items[item["name"]] = item
+
+    new_materials = [
+        Material(name=name, price=item.get("price", 0))
+        for name, item in items.items()
+        if name not in materials
+    ]
+    changed_materials = []
+    for name, material in materials.items():
+        if name not in items:
+            continue
+        price = items[name].get("price", material.price)
+        if price != material.price:
+            material.price = price
+            changed_materials.append(material)
+
+    Material.objects.bulk_create(new_materials, ignore_conflicts=True)
+    if changed_materials:
+        # bulk_update sends no post_save, so the work of the Material
+        # receivers is done here.
+        Material.objects.bulk_update(changed_materials, ['price'])
+        for material in changed_materials:
+            services.clear_material_price(material.pk)
+        caching.invalidate_stores(
+            MaterialStock.objects.filter(material__in=changed_materials).values_list(
+                'store', flat=True
+            )
+        )
+
+    return len(new_materials), len(changed_materials), errors
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _import_products(batch, user):
+    names = {item["name"] for _, item in batch}
+    products = Product.objects.in_bulk(names, field_name='name')
+
+    new_products = [Product(name=name) for name in names if name not in products]
+    Product.objects.bulk_create(new_products, ignore_conflicts=True)
+
+    return len(new_products), 0, []
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _import_recipes(batch, user):
+    products = Product.objects.in_bulk(
+        {item["product"] for _, item in batch}, field_name='name'
+    )
+    materials = Material.objects.in_bulk(
+        {item["material"] for _, item in batch}, field_name='name'
+    )
+
+    errors = []
+    keyed_lines = []
+    for line_number, item in batch:
+        if item["product"] not in products:
+            error = "Product {name} not found".format(name=item["product"])
+        elif item["material"] not in materials:
+            error = "Material {name} not found".format(name=item["material"])
+        else:
+            key = (products[item["product"]].pk, materials[item["material"]].pk)
+            keyed_lines.append((line_number, item, key))
+            continue
+        errors.append({"line": line_number, "error": error})
+
+    material_quantities = {}
+    for material_quantity in MaterialQuantity.objects.filter(
+        product__in={key[0] for _, _, key in keyed_lines}
+    ):
+        key = (material_quantity.product_id, material_quantity.ingredient_id)
+        material_quantities[key] = material_quantity
+    if user is not None:
+        sold_ids = set(
+            Store.products.through.objects.filter(
+                store__user=user,
+                product__in={product_id for product_id, _ in material_quantities},
+            ).values_list('product', flat=True)
+        )
+
+    quantities = {}
+    for line_number, item, key in keyed_lines:
+        if user is not None and key in material_quantities and key[0] not in sold_ids:
+            errors.append(
+                {
+                    "line": line_number,
+                    "error": "Recipe of {name} not found in the user's stores".format(
+                        name=item["product"]
+                    ),
+                }
+            )
+            continue
+        quantities[key] = item["quantity"]
+
+    new_material_quantities = []
+    changed_material_quantities = []
+    for (product_id, material_id), quantity in quantities.items():
+        material_quantity = material_quantities.get((product_id, material_id))
+        if material_quantity is None:
+            new_material_quantities.append(
+                MaterialQuantity(
+                    product_id=product_id, ingredient_id=material_id, quantity=quantity
+                )
+            )
+        elif material_quantity.quantity != quantity:
+            material_quantity.quantity = quantity
+            changed_material_quantities.append(material_quantity)
+
+    MaterialQuantity.objects.bulk_create(new_material_quantities, ignore_conflicts=True)
+    MaterialQuantity.objects.bulk_update(changed_material_quantities, ['quantity'])
+
+    # Neither bulk method sends the MaterialQuantity signals, so the recipes,
+    # availabilities and cached responses of the products are refreshed here.
+    product_ids = {
+        material_quantity.product_id
+        for material_quantity in new_material_quantities + changed_material_quantities
+    }
+    for product_id in product_ids:
+        services.clear_recipe(product_id)
+    store_product_ids = {}
+    for store_id, product_id in Store.products.through.objects.filter(
+        product__in=product_ids
+    ).values_list('store', 'product'):
+        store_product_ids.setdefault(store_id, []).append(product_id)
+    for store_id, store_products in store_product_ids.items():
+        services.refresh_product_availability(store_id, store_products)
+    caching.invalidate_stores(store_product_ids)
+
+    return len(new_material_quantities), len(changed_material_quantities), errors
+
+
+_CATALOGUE_IMPORTERS = {
+    'materials': (MaterialImportSerializer, _import_materials),
+    'products': (ProductImportSerializer, _import_products),
+    'recipes': (RecipeImportSerializer, _import_recipes),
+}
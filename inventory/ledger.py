@@ -0,0 +1,116 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from inventory import services
+from inventory.models import StockMovement, StockSnapshot, Store
+
+# Movements younger than this are left out of a compaction, so a transaction
+# that took its time before committing cannot land behind a snapshot.
+COMPACTION_LAG = 60
+
+MOVEMENT_BATCH_SIZE = 1000
+
+
+def record(kind, quantities):
+    # Appends a movement for every {(store_id, material_id): quantity} change
+    # to the current capacity. Called inside the transaction of the change.
+    created_at = timezone.now()
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(
+                store_id=store_id,
+                material_id=material_id,
+                quantity=quantity,
+                kind=kind,
+                created_at=created_at,
+            )
+            for (store_id, material_id), quantity in sorted(quantities.items())
+            if quantity
+        ],
+        batch_size=MOVEMENT_BATCH_SIZE,
+    )
+
+
+def get_stock_levels(store_id, at):
+    # Returns the {material_id: current capacity} of a store at a point in
+    # time, from its latest snapshots plus the movements since they were taken.
+    compacted_at = _get_compacted_at(store_id, at)
+
+    levels = {}
+    if compacted_at is not None:
+        latest_taken_at = (
+            StockSnapshot.objects.filter(
+                store=store_id, material=OuterRef('material'), taken_at__lte=at
+            )
+            .order_by('-taken_at')
+            .values('taken_at')[:1]
+        )
+        levels.update(
+            StockSnapshot.objects.filter(
+                store=store_id, taken_at=Subquery(latest_taken_at)
+            ).values_list('material', 'current_capacity')
+        )
+
+    for material_id, quantity in _get_deltas(store_id, compacted_at, at):
+        levels[material_id] = levels.get(material_id, 0) + quantity
+
+    return levels
+
+
+def compact(until=None):
+    # Snapshots the stock of every store up to until, so a point in time query
+    # only adds the movements since the snapshot before it. Returns how many
+    # snapshots were taken.
+    until = until or timezone.now() - datetime.timedelta(seconds=COMPACTION_LAG)
+    return sum(
+        _compact_store(store_id, until)
+        for store_id in Store.objects.order_by('pk').values_list('pk', flat=True)
+    )
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _compact_store(store_id, until):
+    compacted_at = _get_compacted_at(store_id, until)
+    changed_material_ids = {
+        material_id for material_id, _ in _get_deltas(store_id, compacted_at, until)
+    }
+    if not changed_material_ids:
+        return 0
+
+    levels = get_stock_levels(store_id, until)
+    StockSnapshot.objects.bulk_create(
+        [
+            StockSnapshot(
+                store_id=store_id,
+                material_id=material_id,
+                current_capacity=levels[material_id],
+                taken_at=until,
+            )
+            for material_id in sorted(changed_material_ids)
+        ],
+        batch_size=MOVEMENT_BATCH_SIZE,
+    )
+
+    return len(changed_material_ids)
+
+
+def _get_compacted_at(store_id, at):
+    return StockSnapshot.objects.filter(store=store_id, taken_at__lte=at).aggregate(
+        taken_at=Max('taken_at')
+    )['taken_at']
+
+
+def _get_deltas(store_id, since, at):
+    movements = StockMovement.objects.filter(store=store_id, created_at__lte=at)
+    if since is not None:
+        movements = movements.filter(created_at__gt=since)
+    return (
+        movements.values('material')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+        .values_list('material', 'quantity')
+    )
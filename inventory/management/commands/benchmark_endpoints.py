@@ -0,0 +1,93 @@
+import json
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from inventory import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every inventory endpoint against synthetic stores in a "
+        "throwaway test database and print the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            action='append',
+            choices=sorted(benchmarks.SCALES),
+            help="Store size to benchmark, can be repeated (default: small).",
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON to this file.")
+        parser.add_argument(
+            '--compare', help="Previous JSON output to check for regressions."
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help="Allowed relative p50 slowdown when comparing (default: 0.2).",
+        )
+
+    def handle(self, *args, **options):
+        scales = options['scale'] or ['small']
+
+        # DEBUG off so timings do not include query logging.
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = [
+                {
+                    'scale': scale,
+                    'store': benchmarks.SCALES[scale],
+                    'endpoints': benchmarks.run_benchmark(
+                        benchmarks.SCALES[scale],
+                        iterations=options['iterations'],
+                        seed=options['seed'],
+                    ),
+                }
+                for scale in scales
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'commit': self._get_commit(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                previous = json.load(previous_file)
+            regressions = benchmarks.compare_results(
+                previous, report, options['tolerance']
+            )
+            if regressions:
+                raise CommandError("Regressions found:\n" + "\n".join(regressions))
+
+    def _get_commit(self):
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from inventory import benchmarks
+from inventorymanagement.databases import SINGLE_NODE_PRAGMAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold many dashboard connections on a changing store, as long polls on "
+        "the async routes and as polls through a fixed pool of threads, on a "
+        "throwaway database file, and print the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(benchmarks.SCALES), default='small'
+        )
+        parser.add_argument('--dashboards', type=int, default=1000)
+        parser.add_argument(
+            '--threads', type=int, default=8, help="Threads serving the polls."
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10.0, help="Seconds per path."
+        )
+        parser.add_argument(
+            '--change-interval',
+            type=float,
+            default=5.0,
+            help="Seconds between changes to the store.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help="Seconds between the polls of a dashboard on the sync path.",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The default database is not SQLite.")
+
+        with benchmarks.throwaway_sqlite_database():
+            connection.settings_dict['PRAGMAS'] = SINGLE_NODE_PRAGMAS
+            connection.close()
+            store, _, _ = benchmarks.create_store(
+                seed=options['seed'], **benchmarks.SCALES[options['scale']]
+            )
+            # Both paths answer with the ETags of the response cache, which
+            # is shared here since the dashboards run in this process.
+            with override_settings(INVENTORY_RESPONSE_CACHE=True):
+                results = benchmarks.run_long_poll_benchmark(
+                    store,
+                    dashboards=options['dashboards'],
+                    threads=options['threads'],
+                    duration=options['duration'],
+                    change_interval=options['change_interval'],
+                    poll_interval=options['poll_interval'],
+                )
+
+        report = {
+            'scale': options['scale'],
+            'dashboards': options['dashboards'],
+            'threads': options['threads'],
+            'duration': options['duration'],
+            'change_interval': options['change_interval'],
+            'poll_interval': options['poll_interval'],
+            'results': results,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
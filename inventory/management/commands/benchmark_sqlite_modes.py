@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from inventory import benchmarks
+from inventorymanagement.databases import SINGLE_NODE_PRAGMAS
+
+# The default mode sets the journal back explicitly since WAL is persistent.
+MODES = [
+    ('default', {'journal_mode': 'DELETE'}),
+    ('single-node', SINGLE_NODE_PRAGMAS),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent read and sale throughput of the default SQLite "
+        "configuration with the single-node pragmas, on a throwaway database "
+        "file, and print the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(benchmarks.SCALES), default='small'
+        )
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--duration', type=float, default=5.0, help="Seconds per mode."
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The default database is not SQLite.")
+
+        with benchmarks.throwaway_sqlite_database():
+            # The response cache off so every read reaches the database.
+            with override_settings(INVENTORY_RESPONSE_CACHE=False):
+                store, _, product_ids = benchmarks.create_store(
+                    seed=options['seed'], **benchmarks.SCALES[options['scale']]
+                )
+                results = []
+                for mode, pragmas in MODES:
+                    # New connections pick up the pragmas of the mode.
+                    connection.settings_dict['PRAGMAS'] = pragmas
+                    connections.close_all()
+                    result = benchmarks.run_concurrency_benchmark(
+                        store,
+                        product_ids,
+                        readers=options['readers'],
+                        writers=options['writers'],
+                        duration=options['duration'],
+                    )
+                    results.append(dict(result, mode=mode))
+
+        report = {
+            'scale': options['scale'],
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'duration': options['duration'],
+            'results': results,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
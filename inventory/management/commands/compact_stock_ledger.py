@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot the stock levels changed since the last compaction, so point "
+        "in time queries read a bounded number of movements. With --interval, "
+        "keep compacting every so many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float)
+
+    def handle(self, *args, **options):
+        while True:
+            snapshots = ledger.compact()
+            if snapshots or options['interval'] is None:
+                self.stdout.write("Took {} snapshots.".format(snapshots))
+            if options['interval'] is None:
+                return
+
+            time.sleep(options['interval'])
+            close_old_connections()
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from inventory import alerts
+
+
+class Command(BaseCommand):
+    help = (
+        "Post the low stock alerts not sent yet to INVENTORY_ALERT_WEBHOOK_URL. "
+        "With --interval, keep delivering every so many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float)
+        parser.add_argument(
+            '--batch-size', type=int, default=alerts.ALERT_DELIVERY_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if not settings.INVENTORY_ALERT_WEBHOOK_URL:
+            raise CommandError("INVENTORY_ALERT_WEBHOOK_URL is not set.")
+
+        while True:
+            try:
+                delivered = alerts.deliver(batch_size=options['batch_size'])
+            except OSError as error:
+                # The alerts stay queued for the next run.
+                if options['interval'] is None:
+                    raise CommandError("Webhook failed: {}".format(error))
+                self.stderr.write("Webhook failed: {}".format(error))
+                delivered = 0
+            if delivered or options['interval'] is None:
+                self.stdout.write("Delivered {} alerts.".format(delivered))
+            if options['interval'] is None:
+                return
+
+            time.sleep(options['interval'])
+            close_old_connections()
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Give back the stock of the expired holds. With --interval, keep "
+        "sweeping every so many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float)
+        parser.add_argument(
+            '--batch-size', type=int, default=holds.HOLD_SWEEP_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = holds.expire_holds(batch_size=options['batch_size'])
+            if expired or options['interval'] is None:
+                self.stdout.write("Expired {} holds.".format(expired))
+            if options['interval'] is None:
+                return
+
+            time.sleep(options['interval'])
+            close_old_connections()
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import exports
+from inventory.models import Store
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a snapshot of the material stocks and product availabilities of "
+        "the stores of a user as CSV or NDJSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username owning the stores.")
+        parser.add_argument(
+            '--store', type=int, action='append', help="Only export this store."
+        )
+        parser.add_argument(
+            '--output', choices=exports.SNAPSHOT_FORMATS, default='ndjson'
+        )
+        parser.add_argument('--path', help="File to write instead of stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError("User {} not found.".format(options['user']))
+
+        stores = Store.objects.filter(user=user)
+        if options['store']:
+            stores = stores.filter(pk__in=options['store'])
+        store_ids = list(stores.order_by('pk').values_list('pk', flat=True))
+
+        chunks = exports.iter_snapshot(store_ids, options['output'])
+        if options['path'] is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['path'], 'w', encoding='utf-8', newline='') as snapshot:
+            for chunk in chunks:
+                snapshot.write(chunk)
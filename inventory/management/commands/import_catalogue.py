@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from inventory import ingestion
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update materials (name,price), products (name) or recipes "
+        "(product,material,quantity) from NDJSON lines or CSV rows, matched by "
+        "name, and print the lines that failed as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=ingestion.CATALOGUE_KINDS)
+        parser.add_argument(
+            'path', help="File to import, read as CSV if it ends in .csv."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=ingestion.CATALOGUE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        content_type = None
+        if options['path'].endswith('.csv'):
+            content_type = ingestion.CSV_CONTENT_TYPE
+        with open(options['path'], encoding='utf-8', newline='') as catalogue:
+            report = ingestion.ingest_catalogue(
+                options['kind'],
+                ingestion.iter_records(catalogue, content_type),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(json.dumps(report, indent=2))
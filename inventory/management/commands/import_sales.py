@@ -0,0 +1,40 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import ingestion
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply a sale journal of NDJSON lines or CSV rows (store,product,quantity) "
+        "to the stores of a user and print the lines that failed as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help="Journal file, read as CSV if it ends in .csv."
+        )
+        parser.add_argument('--user', required=True, help="Username owning the stores.")
+        parser.add_argument(
+            '--batch-size', type=int, default=ingestion.SALES_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError("User {} not found.".format(options['user']))
+
+        content_type = None
+        if options['path'].endswith('.csv'):
+            content_type = ingestion.CSV_CONTENT_TYPE
+        with open(options['path'], encoding='utf-8', newline='') as journal:
+            report = ingestion.ingest_sales(
+                user,
+                ingestion.iter_sale_lines(journal, content_type),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from inventory import profiling
+
+
+class Command(BaseCommand):
+    help = "Rank endpoints by the time recorded by the profiling middleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Output JSON.")
+        parser.add_argument(
+            '--limit', type=int, default=20, help="Number of endpoints to show."
+        )
+
+    def handle(self, *args, **options):
+        report = profiling.get_report(profiling.get_snapshots())[: options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for row in report:
+            self.stdout.write(
+                "{endpoint}: {requests} requests, {total_ms}ms total, "
+                "p50 {p50_ms}ms, p99 {p99_ms}ms, {avg_queries} queries, "
+                "db {avg_db_ms}ms, serialize {avg_serialize_ms}ms".format(**row)
+            )
+            for duplicate in row['duplicates']:
+                self.stdout.write(
+                    "    {count}x {sql}".format(
+                        count=duplicate['count'], sql=duplicate['sql']
+                    )
+                )
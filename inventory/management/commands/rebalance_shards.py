@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread the stock of the sharded material stocks evenly over their "
+        "shards again where one has run low, and refresh the availability of "
+        "the products made from them. With --interval, keep rebalancing every "
+        "so many seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float)
+
+    def handle(self, *args, **options):
+        levels = {}
+        while True:
+            rebalanced = shards.rebalance()
+            if rebalanced or options['interval'] is None:
+                self.stdout.write("Rebalanced {} stocks.".format(rebalanced))
+            refreshed = shards.refresh_availability(levels)
+            if refreshed or options['interval'] is None:
+                self.stdout.write(
+                    "Refreshed the availability of {} stocks.".format(refreshed)
+                )
+            if options['interval'] is None:
+                return
+
+            time.sleep(options['interval'])
+            close_old_connections()
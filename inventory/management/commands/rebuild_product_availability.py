@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from inventory import services
+from inventory.models import ProductAvailability, Store
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized product availability of every store."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'store_ids', nargs='*', type=int, help="Only rebuild these stores."
+        )
+
+    def handle(self, *args, **options):
+        stores = Store.objects.all()
+        if options['store_ids']:
+            stores = stores.filter(pk__in=options['store_ids'])
+
+        for store in stores:
+            product_ids = list(store.products.values_list('pk', flat=True))
+            ProductAvailability.objects.filter(store=store).exclude(
+                product__in=product_ids
+            ).delete()
+            services.refresh_product_availability(store.pk, product_ids)
+            self.stdout.write(
+                "Rebuilt {count} products of {store}".format(
+                    count=len(product_ids), store=store
+                )
+            )
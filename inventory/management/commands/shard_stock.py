@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from inventory import shards
+from inventory.models import MaterialStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Split the stock of a material in a store over shards that concurrent "
+        "sales take from, or with --shards 0 keep it on one row again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('store', type=int)
+        parser.add_argument('material', type=int)
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        material_stock_id = (
+            MaterialStock.objects.filter(
+                store=options['store'], material=options['material']
+            )
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if material_stock_id is None:
+            raise CommandError("Material stock not found.")
+
+        try:
+            shards.set_shard_count(material_stock_id, options['shards'])
+        except serializers.ValidationError as error:
+            raise CommandError(error.detail[0])
+        self.stdout.write(
+            "Material stock {} has {} shards.".format(
+                material_stock_id, options['shards']
+            )
+        )
@@ -0,0 +1,69 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_product_availability(apps, schema_editor):
+    Store = apps.get_model('inventory', 'Store')
+    MaterialStock = apps.get_model('inventory', 'MaterialStock')
+    MaterialQuantity = apps.get_model('inventory', 'MaterialQuantity')
+    ProductAvailability = apps.get_model('inventory', 'ProductAvailability')
+
+    recipes = {}
+    for product_id, material_id, quantity in MaterialQuantity.objects.values_list(
+        'product', 'ingredient', 'quantity'
+    ):
+        recipes.setdefault(product_id, []).append((material_id, quantity))
+
+    product_availabilities = []
+    for store in Store.objects.all():
+        current_capacities = dict(
+            MaterialStock.objects.filter(store=store).values_list(
+                'material', 'current_capacity'
+            )
+        )
+        for product_id in store.products.values_list('pk', flat=True):
+            recipe = recipes.get(product_id)
+            available_quantity = 0
+            if recipe:
+                available_quantity = min(
+                    current_capacities.get(material_id, 0) // quantity
+                    for material_id, quantity in recipe
+                )
+            product_availabilities.append(
+                ProductAvailability(
+                    store=store,
+                    product_id=product_id,
+                    available_quantity=available_quantity,
+                )
+            )
+
+    ProductAvailability.objects.bulk_create(product_availabilities, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAvailability',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('available_quantity', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_availabilities', to='inventory.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_availabilities', to='inventory.store')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Availabilities',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productavailability',
+            constraint=models.UniqueConstraint(fields=('store', 'product'), name='unique product availability'),
+        ),
+        migrations.RunPython(populate_product_availability, migrations.RunPython.noop),
+    ]
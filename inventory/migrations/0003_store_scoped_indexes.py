@@ -0,0 +1,29 @@
+# Generated by Django 3.1.7 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_productavailability'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='materialquantity',
+            index=models.Index(fields=['product', 'ingredient', 'quantity'], name='material_quantity_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialquantity',
+            index=models.Index(fields=['ingredient', 'product'], name='material_quantity_usage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialstock',
+            index=models.Index(fields=['store', 'material', 'current_capacity', 'max_capacity'], name='material_stock_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productavailability',
+            index=models.Index(fields=['store', 'product', 'available_quantity'], name='product_availability_list_idx'),
+        ),
+    ]
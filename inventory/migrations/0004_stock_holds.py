@@ -0,0 +1,53 @@
+# Generated by Django 3.1.7 on 2026-10-18 19:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_store_scoped_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('items', models.JSONField()),
+                ('materials', models.JSONField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Holds',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='materialstock',
+            name='material_stock_level_idx',
+        ),
+        migrations.AddField(
+            model_name='materialstock',
+            name='held_capacity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='materialstock',
+            index=models.Index(fields=['store', 'material', 'current_capacity', 'held_capacity', 'max_capacity'], name='material_stock_level_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='materialstock',
+            constraint=models.CheckConstraint(check=models.Q(held_capacity__lte=django.db.models.expressions.F('current_capacity')), name='held capacity <= current capacity'),
+        ),
+        migrations.AddField(
+            model_name='stockhold',
+            name='store',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='inventory.store'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhold',
+            index=models.Index(fields=['expires_at'], name='stock_hold_expiry_idx'),
+        ),
+    ]
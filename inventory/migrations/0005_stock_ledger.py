@@ -0,0 +1,78 @@
+# Generated by Django 3.1.7 on 2026-10-18 19:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def record_opening_stock(apps, schema_editor):
+    # The stock that exists before the ledger is its opening movement.
+    MaterialStock = apps.get_model('inventory', 'MaterialStock')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+
+    created_at = timezone.now()
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(
+                store_id=store_id,
+                material_id=material_id,
+                quantity=current_capacity,
+                kind='adjustment',
+                created_at=created_at,
+            )
+            for store_id, material_id, current_capacity in MaterialStock.objects.filter(
+                current_capacity__gt=0
+            ).values_list('store', 'material', 'current_capacity')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_capacity', models.PositiveIntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.material')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.store')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('kind', models.CharField(choices=[('restock', 'Restock'), ('sale', 'Sale'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.material')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.store')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Movements',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['store', 'material', 'taken_at', 'current_capacity'], name='stock_snapshot_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['store', 'taken_at'], name='stock_snapshot_store_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['store', 'created_at', 'material', 'quantity'], name='stock_movement_delta_idx'),
+        ),
+        migrations.RunPython(record_opening_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.1.7 on 2026-10-18 19:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialStockShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_capacity', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Material Stock Shards',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='materialstock',
+            name='material_stock_level_idx',
+        ),
+        migrations.AddField(
+            model_name='materialstock',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='materialstock',
+            index=models.Index(fields=['store', 'material', 'current_capacity', 'held_capacity', 'max_capacity', 'shard_count'], name='material_stock_level_idx'),
+        ),
+        migrations.AddField(
+            model_name='materialstockshard',
+            name='material_stock',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='inventory.materialstock'),
+        ),
+        migrations.AddIndex(
+            model_name='materialstockshard',
+            index=models.Index(fields=['material_stock', 'current_capacity'], name='material_stock_shard_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.1.7 on 2026-10-18 19:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_material_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materialstock',
+            name='reorder_point',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_capacity', models.PositiveIntegerField()),
+                ('reorder_point', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='inventory.material')),
+                ('material_stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='inventory.materialstock')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='inventory.store')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock Alerts',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['store', 'resolved_at'], name='stock_alert_store_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['delivered_at'], name='stock_alert_outbox_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(resolved_at__isnull=True), fields=('material_stock',), name='unique open stock alert'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockalert',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
-from django.db.models import CheckConstraint, F, Q, UniqueConstraint
+from django.db.models import (CheckConstraint, F, Index, Q, Sum,
+                              UniqueConstraint)
 
 
 class Store(models.Model):
@@ -21,6 +22,15 @@ class MaterialStock(models.Model):
     )
     max_capacity = models.PositiveIntegerField(default=9999)
     current_capacity = models.PositiveIntegerField(default=0)
+    # Part of the current capacity reserved by the active stock holds, which
+    # sales and availability leave out.
+    held_capacity = models.PositiveIntegerField(default=0)
+    # A sharded stock keeps most of its current capacity in shard rows that
+    # sales take from, see inventory.shards. current_capacity is then the part
+    # left on this row.
+    shard_count = models.PositiveSmallIntegerField(default=0)
+    # A StockAlert is raised while the current capacity is below it.
+    reorder_point = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         verbose_name_plural = "Material Stocks"
@@ -31,14 +41,64 @@ class MaterialStock(models.Model):
                 & Q(current_capacity__lte=F('max_capacity')),
                 name="current capacity >= to 0 and <= max capacity",
             ),
+            CheckConstraint(
+                check=Q(held_capacity__lte=F('current_capacity')),
+                name="held capacity <= current capacity",
+            ),
             UniqueConstraint(
                 fields=['store', 'material'], name="unique material stock"
             ),
         ]
+        indexes = [
+            # Covers the stock levels read for sales and availability.
+            Index(
+                fields=[
+                    'store',
+                    'material',
+                    'current_capacity',
+                    'held_capacity',
+                    'max_capacity',
+                    'shard_count',
+                ],
+                name='material_stock_level_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.store} {self.material}"
 
+    @property
+    def unheld_capacity(self):
+        return self.current_capacity - self.held_capacity
+
+    @property
+    def total_capacity(self):
+        if not self.shard_count:
+            return self.current_capacity
+        return self.current_capacity + (
+            self.shards.aggregate(total=Sum('current_capacity'))['total'] or 0
+        )
+
+
+class MaterialStockShard(models.Model):
+    material_stock = models.ForeignKey(
+        'MaterialStock', on_delete=models.CASCADE, related_name='shards'
+    )
+    current_capacity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Material Stock Shards"
+        indexes = [
+            # Covers the shards of a stock holding enough for a sale.
+            Index(
+                fields=['material_stock', 'current_capacity'],
+                name='material_stock_shard_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.material_stock} shard {self.pk}"
+
 
 class Material(models.Model):
     material_id = models.AutoField(primary_key=True)
@@ -80,6 +140,163 @@ class MaterialQuantity(models.Model):
                 fields=['product', 'ingredient'], name="unique product quantity"
             ),
         ]
+        indexes = [
+            # Covers the recipe reads and the products using a material.
+            Index(
+                fields=['product', 'ingredient', 'quantity'],
+                name='material_quantity_recipe_idx',
+            ),
+            Index(fields=['ingredient', 'product'], name='material_quantity_usage_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product} {self.ingredient} {self.quantity}"
+
+
+class StockHold(models.Model):
+    store = models.ForeignKey(
+        'Store', on_delete=models.CASCADE, related_name='stock_holds'
+    )
+    # [{"product": id, "quantity": n}] as reserved, and the [material_id, n]
+    # pairs they took from MaterialStock.held_capacity, given back on release.
+    items = models.JSONField()
+    materials = models.JSONField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Stock Holds"
+        indexes = [
+            # Covers the sweep of expired holds.
+            Index(fields=['expires_at'], name='stock_hold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.store} {self.pk} {self.expires_at}"
+
+
+class StockMovement(models.Model):
+    RESTOCK = 'restock'
+    SALE = 'sale'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (RESTOCK, 'Restock'),
+        (SALE, 'Sale'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    store = models.ForeignKey(
+        'Store', on_delete=models.CASCADE, related_name='stock_movements'
+    )
+    material = models.ForeignKey(
+        'Material', on_delete=models.CASCADE, related_name='stock_movements'
+    )
+    # Change to the current capacity, negative when stock goes out.
+    quantity = models.IntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Stock Movements"
+        indexes = [
+            # Covers the movements of a store since its last compaction.
+            Index(
+                fields=['store', 'created_at', 'material', 'quantity'],
+                name='stock_movement_delta_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.store} {self.material} {self.kind} {self.quantity}"
+
+
+class StockSnapshot(models.Model):
+    store = models.ForeignKey(
+        'Store', on_delete=models.CASCADE, related_name='stock_snapshots'
+    )
+    material = models.ForeignKey(
+        'Material', on_delete=models.CASCADE, related_name='stock_snapshots'
+    )
+    current_capacity = models.PositiveIntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Stock Snapshots"
+        indexes = [
+            # Covers the latest snapshot of every material of a store, and the
+            # time a store was last compacted.
+            Index(
+                fields=['store', 'material', 'taken_at', 'current_capacity'],
+                name='stock_snapshot_level_idx',
+            ),
+            Index(fields=['store', 'taken_at'], name='stock_snapshot_store_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.store} {self.material} {self.taken_at}"
+
+
+class StockAlert(models.Model):
+    material_stock = models.ForeignKey(
+        'MaterialStock', on_delete=models.CASCADE, related_name='stock_alerts'
+    )
+    store = models.ForeignKey(
+        'Store', on_delete=models.CASCADE, related_name='stock_alerts'
+    )
+    material = models.ForeignKey(
+        'Material', on_delete=models.CASCADE, related_name='stock_alerts'
+    )
+    # The stock level that raised the alert, and the reorder point it was under.
+    current_capacity = models.PositiveIntegerField()
+    reorder_point = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    # Set once the alert has been sent to the webhook, see inventory.alerts.
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    # Set while a worker is sending the alert.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Stock Alerts"
+        constraints = [
+            # A stock has one open alert however long it stays low.
+            UniqueConstraint(
+                fields=['material_stock'],
+                condition=Q(resolved_at__isnull=True),
+                name="unique open stock alert",
+            ),
+        ]
+        indexes = [
+            Index(fields=['store', 'resolved_at'], name='stock_alert_store_idx'),
+            Index(fields=['delivered_at'], name='stock_alert_outbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.store} {self.material} {self.current_capacity}"
+
+
+class ProductAvailability(models.Model):
+    store = models.ForeignKey(
+        'Store', on_delete=models.CASCADE, related_name='product_availabilities'
+    )
+    product = models.ForeignKey(
+        'Product', on_delete=models.CASCADE, related_name='product_availabilities'
+    )
+    available_quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Product Availabilities"
+        constraints = [
+            UniqueConstraint(
+                fields=['store', 'product'], name="unique product availability"
+            ),
+        ]
+        indexes = [
+            # Covers the store's availability list.
+            Index(
+                fields=['store', 'product', 'available_quantity'],
+                name='product_availability_list_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.store} {self.product} {self.available_quantity}"
@@ -0,0 +1,32 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class MaterialStockCursorPagination(CursorPagination):
+    # Keyset pagination over material stocks. It only kicks in when the client
+    # asks for a page, so existing callers keep getting the whole list.
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                list(data.items())
+                + [
+                    ('next', self.get_next_link()),
+                    ('previous', self.get_previous_link()),
+                ]
+            )
+        )
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+PROCESSES_CACHE_KEY = 'inventory:profiling:processes'
+SNAPSHOT_CACHE_KEY = 'inventory:profiling:{pid}'
+
+
+class QueryRecorder:
+    # Execute wrapper timing every query of a request and counting how often
+    # each SQL fingerprint (the statement with its placeholders) runs.
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[sql] += 1
+
+    def get_duplicates(self):
+        return {
+            fingerprint: count
+            for fingerprint, count in self.fingerprints.items()
+            if count > 1
+        }
+
+
+class RollingProfile:
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+        self.duplicates = defaultdict(Counter)
+
+    def record(self, endpoint, total, db, serialize, queries, duplicates):
+        with self.lock:
+            self.samples[endpoint].append((total, db, serialize, queries))
+            self.duplicates[endpoint].update(duplicates)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                endpoint: {
+                    'samples': list(samples),
+                    'duplicates': dict(self.duplicates[endpoint]),
+                }
+                for endpoint, samples in self.samples.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.duplicates.clear()
+
+
+profile = RollingProfile(getattr(settings, 'INVENTORY_PROFILING_WINDOW', 1000))
+
+
+def get_endpoint_name(view_func, method):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return view_func.__name__
+
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    return '{}.{}'.format(view_class.__name__, action or method.lower())
+
+
+def publish_snapshot():
+    pid = os.getpid()
+    processes = cache.get(PROCESSES_CACHE_KEY, [])
+    if pid not in processes:
+        cache.set(PROCESSES_CACHE_KEY, processes + [pid], timeout=None)
+    cache.set(SNAPSHOT_CACHE_KEY.format(pid=pid), profile.snapshot(), timeout=None)
+
+
+def get_snapshots():
+    # Every worker publishes its own window; this process is read directly so
+    # a report works even with a per-process cache backend.
+    snapshots = {os.getpid(): profile.snapshot()}
+    for pid in cache.get(PROCESSES_CACHE_KEY, []):
+        if pid not in snapshots:
+            snapshot = cache.get(SNAPSHOT_CACHE_KEY.format(pid=pid))
+            if snapshot is not None:
+                snapshots[pid] = snapshot
+
+    return list(snapshots.values())
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100.0 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def get_report(snapshots):
+    samples = defaultdict(list)
+    duplicates = defaultdict(Counter)
+    for snapshot in snapshots:
+        for endpoint, data in snapshot.items():
+            samples[endpoint].extend(data['samples'])
+            duplicates[endpoint].update(data['duplicates'])
+
+    report = []
+    for endpoint, endpoint_samples in samples.items():
+        totals = [sample[0] for sample in endpoint_samples]
+        count = len(endpoint_samples)
+        report.append(
+            {
+                'endpoint': endpoint,
+                'requests': count,
+                'total_ms': round(sum(totals), 3),
+                'p50_ms': round(percentile(totals, 50), 3),
+                'p99_ms': round(percentile(totals, 99), 3),
+                'avg_db_ms': round(
+                    sum(sample[1] for sample in endpoint_samples) / count, 3
+                ),
+                'avg_serialize_ms': round(
+                    sum(sample[2] for sample in endpoint_samples) / count, 3
+                ),
+                'avg_queries': round(
+                    sum(sample[3] for sample in endpoint_samples) / count, 2
+                ),
+                'duplicates': [
+                    {'sql': sql, 'count': duplicate_count}
+                    for sql, duplicate_count in duplicates[endpoint].most_common(5)
+                ],
+            }
+        )
+
+    # Hot paths first: the endpoints that spent the most time overall.
+    report.sort(key=lambda row: row['total_ms'], reverse=True)
+    return report
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'INVENTORY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.publish_interval = getattr(
+            settings, 'INVENTORY_PROFILING_PUBLISH_INTERVAL', 5
+        )
+        self.published = 0.0
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        total = finished - started
+
+        # Python time from the start of the view to the rendered response
+        # outside SQL, which for these viewsets is dominated by serialization.
+        view_started = getattr(request, '_profiling_view_started', finished)
+        serialize = max(finished - view_started - recorder.duration, 0.0)
+        response['Server-Timing'] = (
+            'db;dur={db:.3f};desc="{queries} queries", '
+            'serialize;dur={serialize:.3f}, total;dur={total:.3f}'.format(
+                db=recorder.duration * 1000.0,
+                queries=recorder.count,
+                serialize=serialize * 1000.0,
+                total=total * 1000.0,
+            )
+        )
+
+        profile.record(
+            getattr(request, '_profiling_endpoint', 'unresolved'),
+            total * 1000.0,
+            recorder.duration * 1000.0,
+            serialize * 1000.0,
+            recorder.count,
+            recorder.get_duplicates(),
+        )
+        if time.monotonic() - self.published >= self.publish_interval:
+            self.published = time.monotonic()
+            publish_snapshot()
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profiling_endpoint = get_endpoint_name(view_func, request.method)
+        request._profiling_view_started = time.perf_counter()
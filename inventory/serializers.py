@@ -1,11 +1,12 @@
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
 from rest_framework import serializers
 
-from inventory import services
+from inventory import alerts, caching, ledger, services, shards
 from inventory.models import (Material, MaterialQuantity, MaterialStock,
-                              Product, Store)
+                              Product, ProductAvailability, StockAlert,
+                              StockHold, StockMovement, Store)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -24,6 +25,12 @@ class MaterialStockSerializer(serializers.ModelSerializer):
     class Meta:
         model = MaterialStock
         fields = '__all__'
+        read_only_fields = ['held_capacity', 'shard_count']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['current_capacity'] = instance.total_capacity
+        return data
 
 
 class MaterialSerializer(serializers.ModelSerializer):
@@ -44,6 +51,43 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class StockHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockHold
+        fields = ['id', 'store', 'items', 'expires_at']
+
+
+class StockAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockAlert
+        fields = [
+            'id',
+            'store',
+            'material',
+            'current_capacity',
+            'reorder_point',
+            'created_at',
+            'resolved_at',
+        ]
+
+
+class MaterialImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+
+
+class ProductImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    product = serializers.CharField(max_length=100)
+    material = serializers.CharField(max_length=100)
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class MaterialCapacityInPercentageSerializer(serializers.ModelSerializer):
     class Meta:
         model = MaterialStock
@@ -54,15 +98,19 @@ class MaterialCapacityInPercentageSerializer(serializers.ModelSerializer):
             'percentage_of_capacity',
         ]
 
+    current_capacity = serializers.SerializerMethodField()
     percentage_of_capacity = serializers.SerializerMethodField()
 
+    def get_current_capacity(self, obj):
+        return obj.total_capacity
+
     def get_percentage_of_capacity(self, obj):
-        return round(obj.current_capacity / obj.max_capacity * 100.0, 2)
+        return services.get_percentage_of_capacity(obj.total_capacity, obj.max_capacity)
 
 
 class ProductCapacitySerializer(serializers.ModelSerializer):
     class Meta:
-        model = Product
+        model = ProductAvailability
         fields = [
             'product',
             'quantity',
@@ -75,12 +123,14 @@ class ProductCapacitySerializer(serializers.ModelSerializer):
         return obj.product_id
 
     def get_quantity(self, obj):
-        return services.get_product_available_quantity(obj)
+        return obj.available_quantity
 
 
 class RestockListSerializer(serializers.ListSerializer):
+    @services.retry_on_database_locked
+    @transaction.atomic
     def update(self, instance, validated_data):
-        need_to_save = []
+        restock_quantities = {}
         for item in self.initial_data:
             if "material" not in item:
                 raise serializers.ValidationError("Material field is not given")
@@ -88,36 +138,86 @@ class RestockListSerializer(serializers.ListSerializer):
                 raise serializers.ValidationError("Quantity field is not given")
             if not isinstance(item['material'], int):
                 raise serializers.ValidationError("Material is not an integer")
-            try:
-                existed_material = instance.get(material=item['material'])
-            except ObjectDoesNotExist:
-                raise serializers.ValidationError(
-                    "Material with id of {id} not found in material stock".format(
-                        id=item['material']
-                    )
-                )
             if not isinstance(item['quantity'], int):
                 raise serializers.ValidationError("Quantity is not an integer")
             if item['quantity'] <= 0:
                 raise serializers.ValidationError("Quantity is not larger than 0")
 
-            if (
-                existed_material.current_capacity + item['quantity']
-                >= existed_material.max_capacity
-            ):
+            restock_quantities[item['material']] = (
+                restock_quantities.get(item['material'], 0) + item['quantity']
+            )
+
+        # The rows are locked in the order of shards.lock, the unsharded ones
+        # in material order and then the sharded ones, like the sales do, so
+        # the two cannot deadlock on PostgreSQL.
+        material_stock_ids = {}
+        material_stores = {}
+        for material_id, material_stock_id, store_id in (
+            instance.select_for_update(of=('self',))
+            .filter(material__in=restock_quantities)
+            .annotate(
+                sharded=Case(
+                    When(shard_count=0, then=Value(False)),
+                    default=Value(True),
+                    output_field=models.BooleanField(),
+                )
+            )
+            .order_by('sharded', 'material', 'store')
+            .values_list('material', 'pk', 'store')
+        ):
+            if material_id in material_stock_ids:
+                raise serializers.ValidationError(
+                    "Material with id of {id} is stocked in more than one store, "
+                    "use the /stores/{{store_id}}/ routes".format(id=material_id)
+                )
+            material_stock_ids[material_id] = material_stock_id
+            material_stores[material_id] = store_id
+        store_ids = set(material_stores.values())
+        for material_id in restock_quantities:
+            if material_id not in material_stock_ids:
                 raise serializers.ValidationError(
-                    "Current capacity cannot be greater than max capacity"
+                    "Material with id of {id} not found in material stock".format(
+                        id=material_id
+                    )
                 )
 
-            existed_material.current_capacity = (
-                existed_material.current_capacity + item['quantity']
+        # A single conditional UPDATE increments every row relative to its
+        # committed value, so concurrent restocks cannot overwrite each other.
+        increment = Case(
+            *[
+                When(pk=material_stock_ids[material_id], then=Value(quantity))
+                for material_id, quantity in restock_quantities.items()
+            ],
+            output_field=models.PositiveIntegerField(),
+        )
+        updated = (
+            MaterialStock.objects.annotate(
+                total_capacity=services.get_current_capacity()
+            )
+            .filter(
+                pk__in=material_stock_ids.values(),
+                total_capacity__lt=F('max_capacity') - increment,
+            )
+            .update(current_capacity=F('current_capacity') + increment)
+        )
+        if updated != len(material_stock_ids):
+            raise serializers.ValidationError(
+                "Current capacity cannot be greater than max capacity"
             )
-            need_to_save.append(existed_material)
 
-        for save_item in need_to_save:
-            save_item.save()
+        ledger.record(
+            StockMovement.RESTOCK,
+            {
+                (material_stores[material_id], material_id): quantity
+                for material_id, quantity in restock_quantities.items()
+            },
+        )
+        for store_id in store_ids:
+            alerts.check_materials(store_id, restock_quantities)
+            services.refresh_material_availability(store_id, restock_quantities)
+        caching.invalidate_stores(store_ids)
 
-        return need_to_save
+        return self.initial_data
 
 
 class RestockSerializer(serializers.Serializer):
@@ -135,56 +235,126 @@ class RestockSerializer(serializers.Serializer):
         return obj.material_id
 
     def get_quantity(self, obj):
-        return obj.max_capacity - obj.current_capacity
+        return obj.max_capacity - obj.total_capacity
+
+
+def validate_sale_item(item):
+    if "product" not in item:
+        raise serializers.ValidationError("Product field is not given")
+    if "quantity" not in item:
+        raise serializers.ValidationError("Quantity field is not given")
+    if not isinstance(item['product'], int):
+        raise serializers.ValidationError("Product is not an integer")
+    if not isinstance(item['quantity'], int):
+        raise serializers.ValidationError("Quantity is not an integer")
+    if item['quantity'] <= 0:
+        raise serializers.ValidationError("Quantity is not larger than 0")
 
 
 class SalesListSerializer(serializers.ListSerializer):
+    @services.retry_on_database_locked
     @transaction.atomic
     def update(self, instance, validated_data):
+        sold_quantities = {}
         for item in self.initial_data:
-            if "product" not in item:
-                raise serializers.ValidationError("Product field is not given")
-            if "quantity" not in item:
-                raise serializers.ValidationError("Quantity field is not given")
-            if not isinstance(item['product'], int):
-                raise serializers.ValidationError("Product is not an integer")
-            try:
-                current_product = instance.products.all().get(
-                    product_id=item['product']
-                )
-            except ObjectDoesNotExist:
-                raise serializers.ValidationError(
-                    "Product with id of {id} not found in store".format(
-                        id=item['product']
-                    )
-                )
-            if not isinstance(item['quantity'], int):
-                raise serializers.ValidationError("Quantity is not an integer")
-            if item['quantity'] <= 0:
-                raise serializers.ValidationError("Quantity is not larger than 0")
+            validate_sale_item(item)
+            sold_quantities[item['product']] = (
+                sold_quantities.get(item['product'], 0) + item['quantity']
+            )
 
-            sold_quantity = item['quantity']
-            if sold_quantity > services.get_product_available_quantity(current_product):
+        store_products = set(
+            instance.products.filter(product_id__in=sold_quantities).values_list(
+                'product_id', flat=True
+            )
+        )
+        for product_id in sold_quantities:
+            if product_id not in store_products:
                 raise serializers.ValidationError(
-                    "Product {id} sold quantity is more than the current available quantity".format(
-                        id=item['product']
-                    )
+                    "Product with id of {id} not found in store".format(id=product_id)
                 )
-            material_quantities = MaterialQuantity.objects.filter(
-                product=item['product']
+
+        recipes = services.get_recipes(sold_quantities)
+        deductions = services.get_material_deductions(sold_quantities, recipes)
+        # The stock rows are read once, under lock, and the whole basket is
+        # checked and deducted against that view, so nothing can change in
+        # between.
+        material_stocks = {
+            material_stock.material_id: material_stock
+            for material_stock in instance.material_stocks.select_for_update()
+            .filter(material__in=deductions, shard_count=0)
+            .order_by('material')
+        }
+        # Sharded stocks are taken from one of their shards instead of locking
+        # the stock row every sale of the material goes through.
+        sharded_stock_ids = {}
+        if len(material_stocks) < len(deductions):
+            sharded_stock_ids = dict(
+                instance.material_stocks.filter(
+                    material__in=deductions, shard_count__gt=0
+                ).values_list('material', 'pk')
             )
-            for material_quantity in material_quantities:
-                material_stock_item = instance.material_stocks.get(
-                    material=material_quantity.ingredient
-                )
-                material_stock_item.current_capacity = (
-                    material_stock_item.current_capacity
-                    - material_quantity.quantity * item['quantity']
-                )
-                material_stock_item.save()
+
+        for product_id, sold_quantity in sold_quantities.items():
+            if not recipes.get(product_id):
+                self._raise_not_enough_stock(product_id)
+            for material_id, quantity in recipes[product_id]:
+                if material_id in sharded_stock_ids:
+                    continue
+                material_stock = material_stocks.get(material_id)
+                # Stock held for a checkout is not for sale.
+                if (
+                    material_stock is None
+                    or quantity * sold_quantity > material_stock.unheld_capacity
+                ):
+                    self._raise_not_enough_stock(product_id)
+
+        for material_id, material_stock in material_stocks.items():
+            if deductions[material_id] > material_stock.unheld_capacity:
+                self._raise_not_enough_material(material_id, sold_quantities, recipes)
+            material_stock.current_capacity -= deductions[material_id]
+
+        MaterialStock.objects.bulk_update(
+            list(material_stocks.values()), ['current_capacity']
+        )
+        for material_id, material_stock_id in sorted(sharded_stock_ids.items()):
+            if not shards.take(material_stock_id, deductions[material_id]):
+                self._raise_not_enough_material(material_id, sold_quantities, recipes)
+        alerts.check(material_stocks.values())
+        if sharded_stock_ids:
+            alerts.check_materials(instance.pk, sharded_stock_ids)
+        ledger.record(
+            StockMovement.SALE,
+            {
+                (instance.pk, material_id): -deduction
+                for material_id, deduction in deductions.items()
+            },
+        )
+        # The products made from a sharded stock are refreshed by the
+        # rebalancer, see shards.refresh_availability, or every sale of the
+        # material would lock their availability rows.
+        services.refresh_material_availability(instance.pk, material_stocks)
+        caching.invalidate_stores([instance.pk])
 
         return self.initial_data
 
+    def _raise_not_enough_material(self, material_id, sold_quantities, recipes):
+        # Products sharing an ingredient can each fit on their own but not
+        # together.
+        self._raise_not_enough_stock(
+            next(
+                product_id
+                for product_id in sold_quantities
+                if material_id in dict(recipes.get(product_id, ()))
+            )
+        )
+
+    def _raise_not_enough_stock(self, product_id):
+        raise serializers.ValidationError(
+            "Product {id} sold quantity is more than the current available quantity".format(
+                id=product_id
+            )
+        )
+
 
 class SalesSerializer(serializers.Serializer):
     class Meta:
@@ -201,4 +371,4 @@ class SalesSerializer(serializers.Serializer):
         return obj.product_id
 
     def get_quantity(self, obj):
-        return services.get_product_available_quantity(obj)
+        return obj.available_quantity
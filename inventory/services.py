@@ -1,24 +1,245 @@
-from django.core.exceptions import ObjectDoesNotExist
+import functools
+import random
+import time
 
-from inventory.models import MaterialQuantity
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
 
+from inventory.models import (Material, MaterialQuantity, MaterialStock,
+                              MaterialStockShard, ProductAvailability, Store)
 
-def get_product_available_quantity(obj):
-    material_quantities = MaterialQuantity.objects.filter(product=obj.product_id)
-    material_quantities_list = []
+# Price of a material, kept in sync by the Material signals in
+# inventory.signals.
+MATERIAL_PRICE_CACHE_KEY = 'inventory:material-price:{material_id}'
 
-    for material_quantity in material_quantities:
-        quantity_needed = material_quantity.quantity
-        quantity_available = 0
+# Bill of materials of a product, cached as a list of (material_id, quantity)
+# pairs and kept in sync by the MaterialQuantity signals in inventory.signals.
+# Both are only cached with INVENTORY_CATALOGUE_CACHE, as a process-local cache
+# would keep a row changed through another worker, which sales would then use.
+RECIPE_CACHE_KEY = 'inventory:recipe:{product_id}'
 
-        try:
-            stock = obj.store_set.get().material_stocks.get(
-                material=material_quantity.ingredient
+# Attempts and first backoff in seconds of a transaction failing on SQLite's
+# write lock, see retry_on_database_locked.
+DATABASE_LOCKED_ATTEMPTS = 8
+DATABASE_LOCKED_DELAY = 0.02
+
+
+def get_current_capacity():
+    # The current capacity of the material stocks of a query, adding what a
+    # sharded stock keeps in its shards. Unsharded stocks skip the subquery.
+    shard_capacity = (
+        MaterialStockShard.objects.filter(material_stock=OuterRef('pk'))
+        .values('material_stock')
+        .annotate(total=Sum('current_capacity'))
+        .values('total')
+    )
+    return Case(
+        When(shard_count=0, then=F('current_capacity')),
+        default=F('current_capacity') + Coalesce(Subquery(shard_capacity), 0),
+        output_field=models.PositiveIntegerField(),
+    )
+
+
+def get_products_available_quantity(store, product_ids):
+    # A product can be made as many times as the store's unheld stock of its
+    # scarcest ingredient allows (missing stock counts as 0). The recipes come
+    # from the cached bill of materials so only the stock levels hit the
+    # database.
+    recipes = get_recipes(product_ids)
+    material_ids = {
+        material_id for recipe in recipes.values() for material_id, _ in recipe
+    }
+    unheld_capacities = dict(
+        MaterialStock.objects.filter(store=store, material__in=material_ids)
+        .annotate(unheld_capacity=get_current_capacity() - F('held_capacity'))
+        .values_list('material', 'unheld_capacity')
+    )
+
+    return {
+        product_id: min(
+            unheld_capacities.get(material_id, 0) // quantity
+            for material_id, quantity in recipe
+        )
+        for product_id, recipe in recipes.items()
+        if recipe
+    }
+
+
+@transaction.atomic
+def refresh_product_availability(store_id, product_ids):
+    product_ids = set(
+        Store.products.through.objects.filter(
+            store=store_id, product__in=product_ids
+        ).values_list('product', flat=True)
+    )
+    if not product_ids:
+        return
+
+    # Lock the rows first so the stock read below sees every change committed
+    # by a concurrent refresh of the same products.
+    product_availabilities = {
+        product_availability.product_id: product_availability
+        for product_availability in ProductAvailability.objects.select_for_update()
+        .filter(store=store_id, product__in=product_ids)
+        .order_by('product')
+    }
+    available_quantities = get_products_available_quantity(store_id, product_ids)
+
+    changed_availabilities = []
+    new_availabilities = []
+    for product_id in product_ids:
+        available_quantity = available_quantities.get(product_id, 0)
+        product_availability = product_availabilities.get(product_id)
+        if product_availability is None:
+            new_availabilities.append(
+                ProductAvailability(
+                    store_id=store_id,
+                    product_id=product_id,
+                    available_quantity=available_quantity,
+                )
+            )
+        elif product_availability.available_quantity != available_quantity:
+            product_availability.available_quantity = available_quantity
+            changed_availabilities.append(product_availability)
+
+    ProductAvailability.objects.bulk_create(new_availabilities)
+    ProductAvailability.objects.bulk_update(
+        changed_availabilities, ['available_quantity']
+    )
+
+
+def refresh_material_availability(store_id, material_ids):
+    product_ids = (
+        MaterialQuantity.objects.filter(
+            ingredient__in=material_ids, product__store=store_id
+        )
+        .values_list('product', flat=True)
+        .distinct()
+    )
+    refresh_product_availability(store_id, list(product_ids))
+
+
+def get_percentage_of_capacity(current_capacity, max_capacity):
+    return round(current_capacity / max_capacity * 100.0, 2)
+
+
+def get_recipes(product_ids):
+    if not settings.INVENTORY_CATALOGUE_CACHE:
+        return _read_recipes(product_ids)
+
+    cache_keys = {
+        product_id: RECIPE_CACHE_KEY.format(product_id=product_id)
+        for product_id in product_ids
+    }
+    cached_recipes = cache.get_many(cache_keys.values())
+    recipes = {
+        product_id: cached_recipes[cache_key]
+        for product_id, cache_key in cache_keys.items()
+        if cache_key in cached_recipes
+    }
+
+    missing_ids = [product_id for product_id in cache_keys if product_id not in recipes]
+    if missing_ids:
+        missing_recipes = _read_recipes(missing_ids)
+        cache.set_many(
+            {
+                cache_keys[product_id]: recipe
+                for product_id, recipe in missing_recipes.items()
+            },
+            timeout=None,
+        )
+        recipes.update(missing_recipes)
+
+    return recipes
+
+
+def _read_recipes(product_ids):
+    recipes = {product_id: [] for product_id in product_ids}
+    if recipes:
+        material_quantities = MaterialQuantity.objects.filter(
+            product__in=recipes
+        ).values_list('product', 'ingredient', 'quantity')
+        for product_id, material_id, quantity in material_quantities:
+            recipes[product_id].append((material_id, quantity))
+
+    return recipes
+
+
+def clear_recipe(product_id):
+    cache.delete(RECIPE_CACHE_KEY.format(product_id=product_id))
+
+
+def get_material_deductions(sold_quantities, recipes):
+    deductions = {}
+    for product_id, sold_quantity in sold_quantities.items():
+        for material_id, quantity in recipes.get(product_id, ()):
+            deductions[material_id] = (
+                deductions.get(material_id, 0) + quantity * sold_quantity
             )
-            quantity_available = stock.current_capacity
-        except ObjectDoesNotExist:
-            pass
 
-        material_quantities_list.append(int(quantity_available / quantity_needed))
+    return deductions
+
+
+def get_material_prices(material_ids):
+    material_ids = set(material_ids)
+    if not settings.INVENTORY_CATALOGUE_CACHE:
+        return _read_material_prices(material_ids)
+
+    cache_keys = {
+        material_id: MATERIAL_PRICE_CACHE_KEY.format(material_id=material_id)
+        for material_id in material_ids
+    }
+    cached_prices = cache.get_many(cache_keys.values())
+    prices = {
+        material_id: cached_prices[cache_key]
+        for material_id, cache_key in cache_keys.items()
+        if cache_key in cached_prices
+    }
+
+    missing_ids = material_ids.difference(prices)
+    if missing_ids:
+        missing_prices = _read_material_prices(missing_ids)
+        cache.set_many(
+            {
+                cache_keys[material_id]: price
+                for material_id, price in missing_prices.items()
+            },
+            timeout=None,
+        )
+        prices.update(missing_prices)
+
+    return prices
+
+
+def _read_material_prices(material_ids):
+    return dict(Material.objects.filter(pk__in=material_ids).values_list('pk', 'price'))
+
+
+def clear_material_price(material_id):
+    cache.delete(MATERIAL_PRICE_CACHE_KEY.format(material_id=material_id))
+
+
+def retry_on_database_locked(func):
+    # Runs an atomic write again when SQLite gives up waiting for its write
+    # lock. A transaction that read before writing cannot wait for the lock
+    # and fails at once, so retrying with a backoff is the only way through a
+    # burst of sales. Inside an outer transaction the error is raised as is,
+    # since only the outermost block can start over.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DATABASE_LOCKED_ATTEMPTS):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if (
+                    'database is locked' not in str(error)
+                    or connection.in_atomic_block
+                    or attempt == DATABASE_LOCKED_ATTEMPTS - 1
+                ):
+                    raise
+            time.sleep(DATABASE_LOCKED_DELAY * 2**attempt * random.uniform(1, 2))
 
-    return min(material_quantities_list)
+    return wrapper
@@ -0,0 +1,193 @@
+from django.db import transaction
+from django.db.models import F, Min, Sum
+from rest_framework import serializers
+
+from inventory import caching, services
+from inventory.models import MaterialStock, MaterialStockShard
+
+# Most shards a stock can be split into.
+MAX_SHARD_COUNT = 64
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def set_shard_count(material_stock_id, shard_count):
+    # Splits the free stock of a material stock over shard_count shards, or
+    # with 0 keeps it all on the stock row again.
+    if not isinstance(shard_count, int) or not 0 <= shard_count <= MAX_SHARD_COUNT:
+        raise serializers.ValidationError(
+            "Shard count is not an integer between 0 and {}".format(MAX_SHARD_COUNT)
+        )
+
+    _collect(material_stock_id)
+    MaterialStockShard.objects.filter(material_stock=material_stock_id).delete()
+    MaterialStockShard.objects.bulk_create(
+        [
+            MaterialStockShard(material_stock_id=material_stock_id)
+            for _ in range(shard_count)
+        ]
+    )
+    MaterialStock.objects.filter(pk=material_stock_id).update(shard_count=shard_count)
+    if shard_count:
+        _spread(material_stock_id)
+
+
+def take(material_stock_id, quantity):
+    # Takes quantity off a sharded stock inside the transaction of a sale and
+    # returns whether there was enough. Concurrent sales lock different shards,
+    # so they do not queue on the stock row.
+    shard = (
+        MaterialStockShard.objects.select_for_update(skip_locked=True)
+        .filter(material_stock=material_stock_id, current_capacity__gte=quantity)
+        .order_by('?')
+        .first()
+    )
+    if shard is not None:
+        MaterialStockShard.objects.filter(pk=shard.pk).update(
+            current_capacity=F('current_capacity') - quantity
+        )
+        return True
+
+    # No free shard holds enough on its own, so the sale waits for all of them.
+    material_stock = _collect(material_stock_id)
+    if quantity > material_stock.unheld_capacity:
+        return False
+    MaterialStock.objects.filter(pk=material_stock_id).update(
+        current_capacity=F('current_capacity') - quantity
+    )
+    return True
+
+
+def lock(store_id, material_ids, collect=False):
+    # Locks the stock rows of a store's materials in the order every write
+    # takes them, so no two can deadlock: the unsharded rows in material
+    # order, as a sale does, then the sharded ones in material order, as a
+    # sale takes from them. With collect, the stock of the shards is moved
+    # back to their rows, for the writes that work on the row, until the next
+    # rebalance spreads it again. Returns the rows by material.
+    material_stocks = {
+        material_stock.material_id: material_stock
+        for material_stock in MaterialStock.objects.select_for_update()
+        .filter(store=store_id, material__in=material_ids, shard_count=0)
+        .order_by('material')
+    }
+    sharded_stock_ids = MaterialStock.objects.filter(
+        store=store_id, material__in=material_ids, shard_count__gt=0
+    ).order_by('material')
+    for material_stock_id in sharded_stock_ids.values_list('pk', flat=True):
+        if collect:
+            material_stock = _collect(material_stock_id)
+        else:
+            material_stock = MaterialStock.objects.select_for_update().get(
+                pk=material_stock_id
+            )
+        material_stocks[material_stock.material_id] = material_stock
+
+    return material_stocks
+
+
+def rebalance():
+    # Spreads the free stock of every sharded stock evenly over its shards
+    # again once one of them has run below half of its share. Returns how many
+    # stocks were rebalanced.
+    rows = (
+        MaterialStock.objects.filter(shard_count__gt=0)
+        .annotate(
+            lowest=Min('shards__current_capacity'),
+            sharded=Sum('shards__current_capacity'),
+        )
+        .order_by('pk')
+        .values_list(
+            'pk',
+            'current_capacity',
+            'held_capacity',
+            'shard_count',
+            'lowest',
+            'sharded',
+        )
+    )
+
+    rebalanced = 0
+    for pk, current_capacity, held_capacity, shard_count, lowest, sharded in rows:
+        share = (current_capacity - held_capacity + (sharded or 0)) // shard_count
+        if (lowest or 0) * 2 < share:
+            _rebalance(pk)
+            rebalanced += 1
+
+    return rebalanced
+
+
+def refresh_availability(levels):
+    # Sales of a sharded stock leave the availability of the products made
+    # from it to this. Refreshes it for the sharded stocks whose unheld stock
+    # has changed since the {material_stock_id: level} of the last call, which
+    # are updated in place, and returns how many stocks were refreshed.
+    rows = (
+        MaterialStock.objects.filter(shard_count__gt=0)
+        .annotate(unheld=services.get_current_capacity() - F('held_capacity'))
+        .order_by('pk')
+        .values_list('pk', 'store', 'material', 'unheld')
+    )
+
+    changed_levels = {}
+    store_material_ids = {}
+    for pk, store_id, material_id, unheld in rows:
+        if levels.get(pk) != unheld:
+            changed_levels[pk] = unheld
+            store_material_ids.setdefault(store_id, []).append(material_id)
+
+    for store_id, material_ids in sorted(store_material_ids.items()):
+        _refresh_availability(store_id, material_ids)
+    levels.update(changed_levels)
+
+    return len(changed_levels)
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _refresh_availability(store_id, material_ids):
+    services.refresh_material_availability(store_id, material_ids)
+    caching.invalidate_stores([store_id])
+
+
+@services.retry_on_database_locked
+@transaction.atomic
+def _rebalance(material_stock_id):
+    _spread(material_stock_id)
+
+
+def _collect(material_stock_id):
+    # Locks the stock row before its shards, like the slow path of take.
+    material_stock = MaterialStock.objects.select_for_update().get(pk=material_stock_id)
+    sharded = sum(
+        MaterialStockShard.objects.select_for_update()
+        .filter(material_stock=material_stock_id)
+        .order_by('pk')
+        .values_list('current_capacity', flat=True)
+    )
+    if sharded:
+        MaterialStockShard.objects.filter(material_stock=material_stock_id).update(
+            current_capacity=0
+        )
+        MaterialStock.objects.filter(pk=material_stock_id).update(
+            current_capacity=F('current_capacity') + sharded
+        )
+        material_stock.current_capacity += sharded
+
+    return material_stock
+
+
+def _spread(material_stock_id):
+    # The held stock stays on the row, where holds reserve it, along with what
+    # does not divide evenly.
+    material_stock = _collect(material_stock_id)
+    if not material_stock.shard_count:
+        return
+
+    share = material_stock.unheld_capacity // material_stock.shard_count
+    MaterialStockShard.objects.filter(material_stock=material_stock_id).update(
+        current_capacity=share
+    )
+    MaterialStock.objects.filter(pk=material_stock_id).update(
+        current_capacity=F('current_capacity') - share * material_stock.shard_count
+    )
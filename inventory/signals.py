@@ -0,0 +1,180 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from inventory import alerts, caching, ledger, services
+from inventory.models import (Material, MaterialQuantity, MaterialStock,
+                              Product, ProductAvailability, StockMovement,
+                              Store)
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def clear_material_price(sender, instance, **kwargs):
+    services.clear_material_price(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def clear_product_recipe(sender, instance, **kwargs):
+    services.clear_recipe(instance.pk)
+
+
+@receiver(post_save, sender=MaterialQuantity)
+@receiver(post_delete, sender=MaterialQuantity)
+def clear_material_quantity_recipe(sender, instance, **kwargs):
+    services.clear_recipe(instance.product_id)
+
+
+@receiver(pre_save, sender=MaterialQuantity)
+def clear_previous_material_quantity_recipe(sender, instance, **kwargs):
+    # A recipe row moved to another product also changes the old product.
+    instance._previous_product_id = None
+    if instance.pk is not None:
+        instance._previous_product_id = (
+            MaterialQuantity.objects.filter(pk=instance.pk)
+            .values_list('product', flat=True)
+            .first()
+        )
+        if instance._previous_product_id is not None:
+            services.clear_recipe(instance._previous_product_id)
+
+
+@receiver(post_save, sender=MaterialStock)
+@receiver(post_delete, sender=MaterialStock)
+def refresh_material_stock_availability(sender, instance, **kwargs):
+    services.refresh_material_availability(instance.store_id, [instance.material_id])
+
+
+@receiver(pre_save, sender=MaterialStock)
+def get_previous_material_stock_capacity(sender, instance, **kwargs):
+    instance._previous_current_capacity = 0
+    instance._previous_reorder_point = None
+    if instance.pk is not None:
+        (
+            instance._previous_current_capacity,
+            instance._previous_reorder_point,
+        ) = MaterialStock.objects.filter(pk=instance.pk).values_list(
+            'current_capacity', 'reorder_point'
+        ).first() or (
+            0,
+            None,
+        )
+
+
+@receiver(post_save, sender=MaterialStock)
+def record_material_stock_adjustment(sender, instance, **kwargs):
+    # Saves from the material stock endpoints and the admin set the current
+    # capacity directly, so the ledger gets the difference.
+    ledger.record(
+        StockMovement.ADJUSTMENT,
+        {
+            (instance.store_id, instance.material_id): instance.current_capacity
+            - getattr(instance, '_previous_current_capacity', 0)
+        },
+    )
+
+
+@receiver(post_save, sender=MaterialStock)
+def check_material_stock_alert(sender, instance, **kwargs):
+    if instance.reorder_point is not None:
+        alerts.check([instance])
+    elif getattr(instance, '_previous_reorder_point', None) is not None:
+        # No reorder point, nothing to be low against.
+        alerts.resolve([instance.pk])
+
+
+@receiver(post_save, sender=MaterialQuantity)
+@receiver(post_delete, sender=MaterialQuantity)
+def refresh_material_quantity_availability(sender, instance, **kwargs):
+    product_ids = {instance.product_id}
+    if getattr(instance, '_previous_product_id', None) is not None:
+        product_ids.add(instance._previous_product_id)
+
+    store_products = Store.products.through.objects.filter(
+        product__in=product_ids
+    ).values_list('store', 'product')
+    for store_id, product_id in store_products:
+        services.refresh_product_availability(store_id, [product_id])
+
+
+@receiver(m2m_changed, sender=Store.products.through)
+def refresh_store_products_availability(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action == 'post_clear':
+        # pk_set is not given on clear.
+        if reverse:
+            ProductAvailability.objects.filter(product=instance).delete()
+        else:
+            ProductAvailability.objects.filter(store=instance).delete()
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    if reverse:
+        store_product_ids = [(store_id, [instance.pk]) for store_id in pk_set]
+    else:
+        store_product_ids = [(instance.pk, pk_set)]
+
+    for store_id, product_ids in store_product_ids:
+        if action == 'post_add':
+            services.refresh_product_availability(store_id, product_ids)
+        else:
+            ProductAvailability.objects.filter(
+                store=store_id, product__in=product_ids
+            ).delete()
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_store(sender, instance, **kwargs):
+    caching.invalidate_stores([instance.pk])
+
+
+@receiver(post_save, sender=MaterialStock)
+@receiver(post_delete, sender=MaterialStock)
+def invalidate_material_stock_store(sender, instance, **kwargs):
+    caching.invalidate_stores([instance.store_id])
+
+
+@receiver(post_save, sender=Material)
+def invalidate_material_stores(sender, instance, **kwargs):
+    # The restock totals use the material price.
+    caching.invalidate_stores(
+        MaterialStock.objects.filter(material=instance).values_list('store', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Product)
+def invalidate_product_stores(sender, instance, **kwargs):
+    # Deleting a product removes its Store.products rows without m2m_changed.
+    caching.invalidate_stores(instance.store_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=MaterialQuantity)
+@receiver(post_delete, sender=MaterialQuantity)
+def invalidate_material_quantity_stores(sender, instance, **kwargs):
+    product_ids = {instance.product_id}
+    if getattr(instance, '_previous_product_id', None) is not None:
+        product_ids.add(instance._previous_product_id)
+
+    caching.invalidate_stores(
+        Store.products.through.objects.filter(product__in=product_ids).values_list(
+            'store', flat=True
+        )
+    )
+
+
+@receiver(m2m_changed, sender=Store.products.through)
+def invalidate_store_products(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        caching.invalidate_stores([instance.pk])
+    elif action == 'pre_clear':
+        # pk_set is not given on clear.
+        caching.invalidate_stores(instance.store_set.values_list('pk', flat=True))
+    else:
+        caching.invalidate_stores(pk_set)
@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+
+from django.db import connections
+from django.http import StreamingHttpResponse
+
+from inventorymanagement.databases import STREAM_DATABASE
+
+STREAM_QUERY_PARAM = 'stream'
+STREAM_CHUNK_SIZE = 2000
+
+
+def is_stream_requested(request):
+    return request.query_params.get(STREAM_QUERY_PARAM) in ('1', 'true')
+
+
+def iter_queryset(queryset):
+    # Reads the rows of a streamed query a chunk at a time, through a
+    # server-side cursor where the database has them, on the stream database
+    # when there is one.
+    if STREAM_DATABASE in connections.databases:
+        queryset = queryset.using(STREAM_DATABASE)
+    return queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+def iter_json_envelope(key, rows, get_extra=None):
+    # Writes {"<key>": [rows...], **extra} piece by piece so the response never
+    # holds more than one chunk of rows; get_extra runs once the rows are done.
+    yield '{%s: [' % json.dumps(key)
+    chunk = []
+    separator = ''
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield separator + ', '.join(chunk)
+            separator = ', '
+            chunk = []
+    if chunk:
+        yield separator + ', '.join(chunk)
+    yield ']'
+
+    if get_extra is not None:
+        for extra_key, value in get_extra().items():
+            yield ', %s: %s' % (json.dumps(extra_key), json.dumps(value))
+    yield '}'
+
+
+def stream_json_envelope(key, rows, get_extra=None):
+    return StreamingHttpResponse(
+        iter_json_envelope(key, rows, get_extra), content_type='application/json'
+    )
+
+
+def iter_csv(columns, rows):
+    # Writes a header and the rows as CSV, a chunk of rows at a time.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % STREAM_CHUNK_SIZE == 0:
+            yield _flush(buffer)
+    if buffer.tell():
+        yield _flush(buffer)
+
+
+def iter_ndjson(columns, rows):
+    # Writes every row as a JSON object on its own line.
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(columns, row))) + '\n')
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _flush(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
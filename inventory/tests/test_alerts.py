@@ -0,0 +1,185 @@
+import datetime
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import alerts, holds, ingestion, shards
+from inventory.models import MaterialStock, StockAlert
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+WEBHOOK_URL = 'http://127.0.0.1:9000/alerts/'
+
+
+class StockAlertTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with a product made of one material, stocked 20 of 100 with a reorder point of 10.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory()
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        self.material = MaterialFactory()
+        self.material_stock = MaterialStockFactory(
+            store=self.store,
+            material=self.material,
+            current_capacity=20,
+            max_capacity=100,
+            reorder_point=10,
+        )
+        MaterialQuantityFactory(
+            quantity=1, product=self.product, ingredient=self.material
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_raise_once_while_low(self):
+        self._sell(8)
+        self.assertFalse(StockAlert.objects.exists())
+
+        self._sell(4)
+        self._sell(3)
+
+        self.assertEqual(
+            list(
+                StockAlert.objects.values_list(
+                    'material_stock', 'current_capacity', 'reorder_point', 'resolved_at'
+                )
+            ),
+            [(self.material_stock.pk, 8, 10, None)],
+        )
+
+    def test_resolve_on_restock(self):
+        self._sell(15)
+        self.client.post(
+            '/restock/',
+            {"materials": [{"material": self.material.pk, "quantity": 5}]},
+            format='json',
+        )
+        self.assertIsNotNone(StockAlert.objects.get().resolved_at)
+
+        # Going low again raises a new alert.
+        self._sell(1)
+        self.assertEqual(
+            list(
+                StockAlert.objects.order_by('pk').values_list(
+                    'current_capacity', flat=True
+                )
+            ),
+            [5, 9],
+        )
+        self.assertEqual(StockAlert.objects.filter(resolved_at=None).count(), 1)
+
+    def test_raise_on_ingested_sales_and_committed_holds(self):
+        ingestion.ingest_sales(
+            self.user, [(1, {"product": self.product.pk, "quantity": 11})]
+        )
+        self.assertEqual(StockAlert.objects.get().current_capacity, 9)
+
+        MaterialStock.objects.filter(pk=self.material_stock.pk).update(
+            current_capacity=20
+        )
+        alerts.check_materials(self.store.pk, [self.material.pk])
+        hold = holds.reserve(self.store, [{"product": self.product.pk, "quantity": 12}])
+        self.assertFalse(StockAlert.objects.filter(resolved_at=None).exists())
+        holds.commit(hold.pk)
+
+        self.assertEqual(StockAlert.objects.get(resolved_at=None).current_capacity, 8)
+
+    def test_raise_on_sharded_stock(self):
+        shards.set_shard_count(self.material_stock.pk, 4)
+        self._sell(4)
+        self.assertFalse(StockAlert.objects.exists())
+
+        self._sell(7)
+
+        self.assertEqual(StockAlert.objects.get().current_capacity, 9)
+
+    def test_change_reorder_point(self):
+        material_stock = MaterialStock.objects.get(pk=self.material_stock.pk)
+        material_stock.reorder_point = 25
+        material_stock.save()
+        self.assertEqual(StockAlert.objects.get(resolved_at=None).reorder_point, 25)
+
+        material_stock.reorder_point = None
+        material_stock.save()
+        self.assertFalse(StockAlert.objects.filter(resolved_at=None).exists())
+
+    @override_settings(INVENTORY_ALERT_WEBHOOK_URL=WEBHOOK_URL)
+    @mock.patch('inventory.alerts.urllib.request.urlopen')
+    def test_deliver(self, urlopen):
+        self._sell(12)
+        self.assertEqual(alerts.deliver(), 1)
+        self.assertEqual(alerts.deliver(), 0)
+
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.full_url, WEBHOOK_URL)
+        self.assertEqual(
+            json.loads(request.data),
+            [
+                {
+                    "id": StockAlert.objects.get().pk,
+                    "store": self.store.pk,
+                    "material": self.material.pk,
+                    "current_capacity": 8,
+                    "reorder_point": 10,
+                    "created_at": mock.ANY,
+                    "resolved_at": None,
+                }
+            ],
+        )
+        self.assertIsNotNone(StockAlert.objects.get().delivered_at)
+
+    @override_settings(INVENTORY_ALERT_WEBHOOK_URL=WEBHOOK_URL)
+    @mock.patch('inventory.alerts.urllib.request.urlopen')
+    def test_deliver_claims(self, urlopen):
+        self._sell(12)
+
+        # The webhook is called once the batch is claimed.
+        def post(request, timeout):
+            self.assertIsNotNone(StockAlert.objects.get().claimed_at)
+            return mock.MagicMock()
+
+        urlopen.side_effect = post
+
+        # An alert claimed by another worker is left to it until the claim is stale.
+        StockAlert.objects.update(claimed_at=timezone.now())
+        self.assertEqual(alerts.deliver(), 0)
+        StockAlert.objects.update(
+            claimed_at=timezone.now()
+            - datetime.timedelta(seconds=alerts.ALERT_CLAIM_TIMEOUT + 1)
+        )
+        self.assertEqual(alerts.deliver(), 1)
+        self.assertIsNotNone(StockAlert.objects.get().delivered_at)
+
+    @override_settings(INVENTORY_ALERT_WEBHOOK_URL=WEBHOOK_URL)
+    @mock.patch(
+        'inventory.alerts.urllib.request.urlopen', side_effect=OSError("refused")
+    )
+    def test_deliver_alerts_command_webhook_failed(self, urlopen):
+        self._sell(12)
+
+        with self.assertRaises(CommandError):
+            call_command('deliver_alerts', stdout=StringIO())
+        # The alert stays queued, and is not left claimed.
+        self.assertIsNone(StockAlert.objects.get().delivered_at)
+        self.assertIsNone(StockAlert.objects.get().claimed_at)
+
+    def test_deliver_alerts_command_without_webhook(self):
+        with self.assertRaises(CommandError):
+            call_command('deliver_alerts', stdout=StringIO())
+
+    def _sell(self, quantity):
+        response = self.client.post(
+            '/sales/',
+            {"sale": [{"product": self.product.pk, "quantity": quantity}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
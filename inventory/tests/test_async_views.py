@@ -0,0 +1,155 @@
+import asyncio
+import json
+from unittest import mock
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.test import (AsyncClient, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from inventory import async_views
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+@override_settings(INVENTORY_RESPONSE_CACHE=True)
+class AsyncViewsTest(TransactionTestCase):
+    # The reads run on the pool threads, which only see committed data.
+
+    def setUp(self):
+        """
+        Create a store with one product made of one material and a client with the token of its user.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory()
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        self.material = MaterialFactory()
+        self.material_stock = MaterialStockFactory(
+            store=self.store,
+            material=self.material,
+            current_capacity=20,
+            max_capacity=100,
+        )
+        MaterialQuantityFactory(
+            quantity=2, product=self.product, ingredient=self.material
+        )
+        token = Token.objects.create(user=self.user)
+        self.authorization = 'Token {}'.format(token.key)
+        self.client = AsyncClient()
+        async_views.LONG_POLL_INTERVAL, self.interval = (
+            0.05,
+            async_views.LONG_POLL_INTERVAL,
+        )
+
+    def tearDown(self):
+        async_views.LONG_POLL_INTERVAL = self.interval
+
+    async def test_get_inventory(self):
+        response = await self._get('/async/inventory/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            {
+                "materials": [
+                    {
+                        "material": self.material.pk,
+                        "max_capacity": 100,
+                        "current_capacity": 20,
+                        "percentage_of_capacity": 20.0,
+                    }
+                ]
+            },
+        )
+
+    async def test_get_product_capacity_store(self):
+        response = await self._get(
+            '/async/stores/{}/product-capacity/'.format(self.store.pk)
+        )
+
+        self.assertEqual(
+            json.loads(response.content),
+            {"remaining_capacities": [{"product": self.product.pk, "quantity": 10}]},
+        )
+
+    async def test_long_poll_times_out(self):
+        response = await self._get('/async/inventory/', {'wait': 0.2})
+        not_modified = await self._get(
+            '/async/inventory/', {'wait': 0.2}, if_none_match=response['ETag']
+        )
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_long_poll_other_wait(self):
+        # A poll asking for less of the wait left still matches the version, one
+        # with other parameters does not.
+        response = await self._get('/async/inventory/', {'wait': 0.3})
+        not_modified = await self._get(
+            '/async/inventory/', {'wait': 0.1}, if_none_match=response['ETag']
+        )
+        other_query = await self._get(
+            '/async/inventory/',
+            {'wait': 0.1, 'store': self.store.pk},
+            if_none_match=response['ETag'],
+        )
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(other_query.status_code, status.HTTP_200_OK)
+
+    async def test_long_poll_returns_change(self):
+        response = await self._get('/async/product-capacity/', {'wait': 5})
+        poll = asyncio.ensure_future(
+            self._get(
+                '/async/product-capacity/',
+                {'wait': 5},
+                if_none_match=response['ETag'],
+            )
+        )
+        await asyncio.sleep(0.2)
+        self.assertFalse(poll.done())
+
+        self.material_stock.current_capacity = 4
+        await sync_to_async(self.material_stock.save)()
+        changed = await asyncio.wait_for(poll, 2)
+
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(
+            json.loads(changed.content)['remaining_capacities'][0]['quantity'], 2
+        )
+
+    async def test_invalid_requests(self):
+        invalid_wait = await self._get('/async/inventory/', {'wait': 'x'})
+        stream = await self._get('/async/inventory/', {'stream': 1})
+        post = await self.client.post(
+            '/async/inventory/', authorization=self.authorization
+        )
+        anonymous = await AsyncClient().get('/async/inventory/')
+
+        self.assertEqual(invalid_wait.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(stream.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(post.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def _get(self, path, data=None, **headers):
+        # Django 3.1's AsyncClient takes the raw header names and does not put
+        # the data of a GET in the query string.
+        if data is not None:
+            path = '{}?{}'.format(path, urlencode(data))
+        return self.client.get(path, authorization=self.authorization, **headers)
+
+
+class StoreWatcherTest(SimpleTestCase):
+    @mock.patch('inventory.async_views.LONG_POLL_INTERVAL', 0.01)
+    @mock.patch('inventory.async_views.caching.get_store_versions', return_value=['b'])
+    async def test_wait_right_after_last_poll(self, get_store_versions):
+        watcher = async_views.StoreWatcher()
+        # Times out before the first check, leaving no poll waiting.
+        self.assertFalse(await watcher.wait({1: 'b'}, 0.001))
+
+        self.assertTrue(await watcher.wait({1: 'a'}, 1))
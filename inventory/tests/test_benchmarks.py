@@ -0,0 +1,40 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import benchmarks
+from inventory.urls import router
+
+
+class BenchmarkTest(APITestCase):
+    def test_run_benchmark(self):
+        results = benchmarks.run_benchmark(
+            {'materials': 5, 'products': 5, 'max_ingredients': 3}, iterations=2
+        )
+
+        self.assertEqual(len(results), len(router.registry) + 2)
+        for result in results:
+            self.assertEqual(result['status'], status.HTTP_200_OK, result['path'])
+            self.assertGreater(result['queries'], 0, result['path'])
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        # The stores, then the material stocks and products read as the
+        # snapshot is streamed.
+        snapshot = next(result for result in results if result['path'] == '/snapshot/')
+        self.assertEqual(snapshot['queries'], 3)
+
+    def test_compare_results(self):
+        previous = self._get_report(queries=2, p50_ms=1.0)
+        current = self._get_report(queries=3, p50_ms=1.1)
+
+        self.assertEqual(
+            benchmarks.compare_results(previous, current, 0.2),
+            ["small GET /sales/: queries 2 -> 3"],
+        )
+
+    def _get_report(self, queries, p50_ms):
+        endpoint = {
+            'method': 'GET',
+            'path': '/sales/',
+            'queries': queries,
+            'p50_ms': p50_ms,
+        }
+        return {'results': [{'scale': 'small', 'endpoints': [endpoint]}]}
@@ -0,0 +1,138 @@
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+@override_settings(INVENTORY_RESPONSE_CACHE=True)
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with one product made of one material and log the client in as its user.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory()
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        self.material = MaterialFactory(price=2)
+        self.material_stock = MaterialStockFactory(
+            store=self.store,
+            material=self.material,
+            current_capacity=20,
+            max_capacity=100,
+        )
+        MaterialQuantityFactory(
+            quantity=2, product=self.product, ingredient=self.material
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_cached(self):
+        response = self.client.get('/product-capacity/')
+
+        # Only the user's stores are read to find the cached response.
+        with self.assertNumQueries(1):
+            cached_response = self.client.get('/product-capacity/')
+
+        self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached_response.data, response.data)
+        self.assertEqual(cached_response['ETag'], response['ETag'])
+
+    def test_get_not_modified(self):
+        response = self.client.get('/inventory/')
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                '/inventory/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertFalse(not_modified.content)
+
+    def test_get_cached_per_url(self):
+        response = self.client.get('/inventory/')
+        paginated_response = self.client.get('/inventory/', {'page_size': 1})
+
+        self.assertNotEqual(response['ETag'], paginated_response['ETag'])
+        self.assertIn('next', paginated_response.data)
+
+    def test_get_cached_per_user(self):
+        response = self.client.get('/inventory/')
+        other_user = UserFactory()
+        StoreFactory(user=other_user)
+        self.client.force_authenticate(user=other_user)
+        other_response = self.client.get('/inventory/')
+
+        self.assertNotEqual(other_response['ETag'], response['ETag'])
+        self.assertEqual(other_response.data, {"materials": []})
+
+    def test_sale_invalidates(self):
+        response = self.client.get('/sales/')
+        self.client.post(
+            '/sales/',
+            {"sale": [{"product": self.product.product_id, "quantity": 1}]},
+            format='json',
+        )
+        not_modified = self.client.get('/sales/', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified.data['sale'][0]['quantity'], 9)
+
+    def test_restock_invalidates(self):
+        self.client.get('/inventory/')
+        self.client.post(
+            '/restock/',
+            {"materials": [{"material": self.material.material_id, "quantity": 10}]},
+            format='json',
+        )
+        response = self.client.get('/inventory/')
+
+        self.assertEqual(response.data['materials'][0]['current_capacity'], 30)
+
+    def test_material_stock_change_invalidates(self):
+        self.client.get('/product-capacity/')
+        self.material_stock.current_capacity = 4
+        self.material_stock.save()
+        response = self.client.get('/product-capacity/')
+
+        self.assertEqual(response.data['remaining_capacities'][0]['quantity'], 2)
+
+    def test_material_price_change_invalidates(self):
+        self.client.get('/restock/')
+        self.material.price = 3
+        self.material.save()
+        response = self.client.get('/restock/')
+
+        self.assertEqual(response.data['total_price'], 240.0)
+
+    def test_material_quantity_change_invalidates(self):
+        material = MaterialFactory()
+        MaterialStockFactory(store=self.store, material=material, current_capacity=5)
+        self.client.get('/product-capacity/')
+        MaterialQuantityFactory(quantity=5, product=self.product, ingredient=material)
+        response = self.client.get('/product-capacity/')
+
+        self.assertEqual(response.data['remaining_capacities'][0]['quantity'], 1)
+
+    def test_store_products_change_invalidates(self):
+        self.client.get('/product-capacity/')
+        self.store.products.remove(self.product)
+        response = self.client.get('/product-capacity/')
+
+        self.assertEqual(response.data['remaining_capacities'], [])
+
+        self.product.store_set.add(self.store)
+        response = self.client.get('/product-capacity/')
+
+        self.assertEqual(len(response.data['remaining_capacities']), 1)
+
+    def test_product_delete_invalidates(self):
+        self.client.get('/sales/')
+        self.product.delete()
+        response = self.client.get('/sales/')
+
+        self.assertEqual(response.data['sale'], [])
@@ -0,0 +1,91 @@
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from inventorymanagement.databases import (SINGLE_NODE_PRAGMAS,
+                                           STREAM_DATABASE, get_databases,
+                                           set_pragmas)
+
+
+class DatabasesTest(SimpleTestCase):
+    def test_get_databases_sqlite(self):
+        databases = get_databases(Path('/code'), {})
+
+        self.assertEqual(
+            databases,
+            {
+                'default': {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': Path('/code/db.sqlite3'),
+                }
+            },
+        )
+
+    def test_get_databases_sqlite_single_node(self):
+        databases = get_databases(
+            Path('/code'), {'DATABASE_SQLITE_MODE': 'single-node'}
+        )
+
+        self.assertEqual(databases['default']['PRAGMAS'], SINGLE_NODE_PRAGMAS)
+
+    def test_get_databases_postgresql(self):
+        databases = get_databases(
+            Path('/code'),
+            {
+                'DATABASE_ENGINE': 'postgresql',
+                'DATABASE_NAME': 'inventory',
+                'DATABASE_HOST': 'db',
+                'DATABASE_CONN_MAX_AGE': '300',
+            },
+        )
+
+        self.assertEqual(
+            databases['default']['ENGINE'], 'django.db.backends.postgresql'
+        )
+        self.assertEqual(databases['default']['NAME'], 'inventory')
+        self.assertEqual(databases['default']['HOST'], 'db')
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 300)
+        self.assertNotIn('DISABLE_SERVER_SIDE_CURSORS', databases['default'])
+
+    def test_get_databases_pgbouncer(self):
+        databases = get_databases(
+            Path('/code'),
+            {'DATABASE_ENGINE': 'postgresql', 'DATABASE_POOLER': 'pgbouncer'},
+        )
+
+        self.assertTrue(databases['default']['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 60)
+        self.assertNotIn(STREAM_DATABASE, databases)
+
+    def test_get_databases_pgbouncer_stream_host(self):
+        databases = get_databases(
+            Path('/code'),
+            {
+                'DATABASE_ENGINE': 'postgresql',
+                'DATABASE_HOST': 'pgbouncer',
+                'DATABASE_POOLER': 'pgbouncer',
+                'DATABASE_STREAM_HOST': 'db',
+            },
+        )
+
+        self.assertEqual(databases['default']['HOST'], 'pgbouncer')
+        self.assertEqual(databases[STREAM_DATABASE]['HOST'], 'db')
+        self.assertEqual(databases[STREAM_DATABASE]['PORT'], '5432')
+        self.assertFalse(databases[STREAM_DATABASE]['DISABLE_SERVER_SIDE_CURSORS'])
+
+
+class SetPragmasTest(TestCase):
+    def test_set_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            cache_size = cursor.fetchone()[0]
+            with mock.patch.dict(
+                connection.settings_dict, {'PRAGMAS': {'cache_size': -1234}}
+            ):
+                set_pragmas(sender=None, connection=connection)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1234)
+
+            cursor.execute('PRAGMA cache_size = {}'.format(cache_size))
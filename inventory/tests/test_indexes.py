@@ -0,0 +1,66 @@
+import re
+
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from inventory import benchmarks, services
+from inventory.models import MaterialStock, ProductAvailability
+
+# Without ANALYZE statistics SQLite plans from the schema alone, so these plans
+# are the ones it picks however many rows the tables hold.
+TABLE_SCAN = re.compile(r'\bSCAN (TABLE )?inventory_')
+
+
+class IndexTest(APITestCase):
+    def setUp(self):
+        """
+        Create two stores of different users so every query has to pick out one user's rows.
+        """
+        benchmarks.create_store(materials=50, products=50, max_ingredients=5, seed=1)
+        self.store, self.material_ids, self.product_ids = benchmarks.create_store(
+            materials=50, products=50, max_ingredients=5
+        )
+
+    def test_endpoints_do_not_scan(self):
+        client = APIClient()
+        client.force_authenticate(user=self.store.user)
+        for method, path, data in benchmarks.get_endpoints(
+            self.material_ids, self.product_ids
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                getattr(client, method)(path, data, format='json')
+
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                plan = self._explain(query['sql'])
+                self.assertIsNone(TABLE_SCAN.search(plan), path + '\n' + plan)
+
+    def test_material_stock_level_covered(self):
+        queryset = (
+            MaterialStock.objects.filter(
+                store=self.store, material__in=self.material_ids[:5]
+            )
+            .annotate(
+                unheld_capacity=services.get_current_capacity() - F('held_capacity')
+            )
+            .values_list('material', 'unheld_capacity')
+        )
+
+        self.assertIn('COVERING INDEX material_stock_level_idx', queryset.explain())
+
+    def test_product_availability_list_covered(self):
+        queryset = ProductAvailability.objects.filter(store=self.store).order_by(
+            'product'
+        )
+
+        plan = queryset.explain()
+        self.assertIn('COVERING INDEX product_availability_list_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def _explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
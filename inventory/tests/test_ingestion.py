@@ -0,0 +1,358 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import ingestion, services
+from inventory.models import (Material, MaterialStock, Product,
+                              ProductAvailability)
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class SalesIngestionTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with two stores selling the same product made of one material, and a store of another user.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory()
+        self.material = MaterialFactory()
+        MaterialQuantityFactory(
+            quantity=2, product=self.product, ingredient=self.material
+        )
+        self.store1 = StoreFactory(user=self.user, products=(self.product,))
+        self.store2 = StoreFactory(user=self.user, products=(self.product,))
+        MaterialStockFactory(
+            store=self.store1, material=self.material, current_capacity=20
+        )
+        MaterialStockFactory(
+            store=self.store2, material=self.material, current_capacity=10
+        )
+        self.other_store = StoreFactory(products=(self.product,))
+
+    def test_ingest_sales(self):
+        journal = "\n".join(
+            [
+                json.dumps(
+                    {"store": self.store1.pk, "product": self.product.pk, "quantity": 4}
+                ),
+                json.dumps(
+                    {"store": self.store2.pk, "product": self.product.pk, "quantity": 3}
+                ),
+                "not json",
+                json.dumps({"store": self.store1.pk, "quantity": 1}),
+                json.dumps(
+                    {
+                        "store": self.other_store.pk,
+                        "product": self.product.pk,
+                        "quantity": 1,
+                    }
+                ),
+                json.dumps(
+                    {
+                        "store": self.store2.pk,
+                        "product": ProductFactory().pk,
+                        "quantity": 1,
+                    }
+                ),
+                # Fits the store on its own but not after the line above.
+                json.dumps(
+                    {"store": self.store2.pk, "product": self.product.pk, "quantity": 3}
+                ),
+                "",
+                json.dumps(
+                    {"store": self.store1.pk, "product": self.product.pk, "quantity": 6}
+                ),
+            ]
+        )
+        report = ingestion.ingest_sales(
+            self.user, ingestion.iter_sale_lines(StringIO(journal)), batch_size=4
+        )
+
+        self.assertEqual(report["lines"], 8)
+        self.assertEqual(report["applied"], 3)
+        self.assertEqual([error["line"] for error in report["errors"]], [3, 4, 5, 6, 7])
+        self.assertEqual(report["errors"][1]["error"], "Product field is not given")
+        self.assertEqual(self._get_current_capacity(self.store1), 0)
+        self.assertEqual(self._get_current_capacity(self.store2), 4)
+        self.assertEqual(
+            ProductAvailability.objects.get(store=self.store2).available_quantity, 2
+        )
+
+    def test_ingest_sales_batch_query_count(self):
+        with CaptureQueriesContext(connection) as small_batch:
+            self._ingest_lines(1)
+        with self.assertNumQueries(len(small_batch)):
+            report = self._ingest_lines(5)
+
+        self.assertEqual(report["applied"], 5)
+        self.assertEqual(self._get_current_capacity(self.store1), 8)
+
+    def test_post_sales_bulk_ndjson(self):
+        self.client.force_authenticate(user=self.user)
+        journal = "\n".join(
+            json.dumps(
+                {"store": self.store1.pk, "product": self.product.pk, "quantity": 1}
+            )
+            for _ in range(3)
+        )
+        response = self.client.post(
+            '/sales/bulk/', journal, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"lines": 3, "applied": 3, "errors": []})
+        self.assertEqual(self._get_current_capacity(self.store1), 14)
+
+    def test_post_sales_bulk_store_not_int(self):
+        self.client.force_authenticate(user=self.user)
+        journal = json.dumps(
+            {"store": [self.store1.pk], "product": self.product.pk, "quantity": 1}
+        )
+        response = self.client.post(
+            '/sales/bulk/', journal, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "lines": 1,
+                "applied": 0,
+                "errors": [{"line": 1, "error": "Store is not an integer"}],
+            },
+        )
+
+    def test_post_sales_bulk_csv(self):
+        self.client.force_authenticate(user=self.user)
+        journal = (
+            "store,product,quantity\n{store},{product},2\n{store},{product},x\n".format(
+                store=self.store2.pk, product=self.product.pk
+            )
+        )
+        response = self.client.post('/sales/bulk/', journal, content_type='text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "lines": 2,
+                "applied": 1,
+                "errors": [{"line": 3, "error": "Quantity is not an integer"}],
+            },
+        )
+        self.assertEqual(self._get_current_capacity(self.store2), 6)
+
+    def test_import_sales_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as journal:
+            journal.write("product,quantity,store\n")
+            journal.write("{},5,{}\n".format(self.product.pk, self.store1.pk))
+        stdout = StringIO()
+        try:
+            call_command(
+                'import_sales', journal.name, user=self.user.username, stdout=stdout
+            )
+        finally:
+            os.remove(journal.name)
+
+        self.assertEqual(
+            json.loads(stdout.getvalue()), {"lines": 1, "applied": 1, "errors": []}
+        )
+        self.assertEqual(self._get_current_capacity(self.store1), 10)
+
+    def _ingest_lines(self, count):
+        lines = [
+            (
+                line_number,
+                {"store": self.store1.pk, "product": self.product.pk, "quantity": 1},
+            )
+            for line_number in range(count)
+        ]
+        return ingestion.ingest_sales(self.user, lines)
+
+    def _get_current_capacity(self, store):
+        return MaterialStock.objects.get(
+            store=store, material=self.material
+        ).current_capacity
+
+
+class CatalogueIngestionTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store selling one product made of one stocked material and log the client in as its user.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory(name="bread")
+        self.material = MaterialFactory(name="flour", price=2)
+        MaterialQuantityFactory(
+            quantity=2, product=self.product, ingredient=self.material
+        )
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        MaterialStockFactory(
+            store=self.store, material=self.material, current_capacity=20
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_ingest_materials(self):
+        catalogue = "name,price\nflour,3.50\nsugar,\nsalt,-1\nyeast,1.25\n"
+        report = ingestion.ingest_catalogue(
+            'materials', ingestion.iter_records(StringIO(catalogue), 'text/csv')
+        )
+
+        self.assertEqual(report["lines"], 4)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(
+            report["errors"],
+            [
+                {
+                    "line": 4,
+                    "error": "price: Ensure this value is greater than or equal to 0.",
+                }
+            ],
+        )
+        self.assertEqual(
+            services.get_material_prices([self.material.pk])[self.material.pk],
+            Decimal('3.50'),
+        )
+        self.assertEqual(Material.objects.get(name="sugar").price, 0)
+
+    def test_post_products_bulk(self):
+        catalogue = "\n".join(
+            [
+                json.dumps({"name": "bread"}),
+                json.dumps({"name": "cake"}),
+                json.dumps({}),
+            ]
+        )
+        response = self.client.post(
+            '/products/bulk/', catalogue, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "lines": 3,
+                "created": 1,
+                "updated": 0,
+                "errors": [{"line": 3, "error": "name: This field is required."}],
+            },
+        )
+        self.assertEqual(Product.objects.filter(name__in=["bread", "cake"]).count(), 2)
+
+    def test_post_material_quantities_bulk(self):
+        MaterialFactory(name="sugar")
+        self.client.get('/product-capacity/')
+        catalogue = (
+            "product,material,quantity\n"
+            "bread,flour,4\n"
+            "bread,sugar,1\n"
+            "cake,flour,1\n"
+            "bread,salt,1\n"
+            "bread,flour,0\n"
+        )
+        response = self.client.post(
+            '/material-quantities/bulk/', catalogue, content_type='text/csv'
+        )
+
+        self.assertEqual(
+            response.data,
+            {
+                "lines": 5,
+                "created": 1,
+                "updated": 1,
+                "errors": [
+                    {"line": 4, "error": "Product cake not found"},
+                    {"line": 5, "error": "Material salt not found"},
+                    {
+                        "line": 6,
+                        "error": "quantity: Ensure this value is greater than or equal to 1.",
+                    },
+                ],
+            },
+        )
+        self.assertEqual(
+            dict(services.get_recipes([self.product.pk])[self.product.pk]),
+            {self.material.pk: 4, Material.objects.get(name="sugar").pk: 1},
+        )
+        # The sugar is not stocked in the store, so the bread cannot be made.
+        response = self.client.get('/product-capacity/')
+        self.assertEqual(response.data['remaining_capacities'][0]['quantity'], 0)
+
+    def test_post_bulk_of_other_user(self):
+        # Another user can create materials, but not change the ones of the store.
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.post(
+            '/materials/bulk/',
+            "name,price\nflour,0.01\nsugar,1\n",
+            content_type='text/csv',
+        )
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            response.data["errors"],
+            [{"line": 2, "error": "Material flour not found in the user's stores"}],
+        )
+        self.assertEqual(Material.objects.get(pk=self.material.pk).price, 2)
+
+        response = self.client.post(
+            '/material-quantities/bulk/',
+            "product,material,quantity\nbread,flour,9\n",
+            content_type='text/csv',
+        )
+
+        self.assertEqual(response.data["updated"], 0)
+        self.assertEqual(
+            response.data["errors"],
+            [{"line": 2, "error": "Recipe of bread not found in the user's stores"}],
+        )
+        self.assertEqual(
+            dict(services.get_recipes([self.product.pk])[self.product.pk]),
+            {self.material.pk: 2},
+        )
+
+    def test_ingest_materials_batch_query_count(self):
+        with CaptureQueriesContext(connection) as small_batch:
+            self._ingest_materials(1)
+        with self.assertNumQueries(len(small_batch)):
+            report = self._ingest_materials(50)
+
+        self.assertEqual(report["created"], 50)
+
+    def test_import_catalogue_command(self):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.ndjson', delete=False
+        ) as catalogue:
+            catalogue.write(json.dumps({"name": "cake"}) + "\n")
+        stdout = StringIO()
+        try:
+            call_command('import_catalogue', 'products', catalogue.name, stdout=stdout)
+        finally:
+            os.remove(catalogue.name)
+
+        self.assertEqual(
+            json.loads(stdout.getvalue()),
+            {"lines": 1, "created": 1, "updated": 0, "errors": []},
+        )
+
+    def _ingest_materials(self, count):
+        # Names are unique across calls so every line creates a material.
+        lines = [
+            (
+                line_number,
+                {"name": "material {} of {}".format(line_number, count), "price": "1"},
+            )
+            for line_number in range(count)
+        ]
+        return ingestion.ingest_catalogue('materials', lines)
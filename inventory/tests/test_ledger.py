@@ -0,0 +1,167 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from inventory import holds, ingestion, ledger
+from inventory.models import MaterialStock, StockMovement, StockSnapshot
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class StockLedgerTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with a product made of two of one material and log the client in as its user.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory()
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        self.material = MaterialFactory()
+        self.material_stock = MaterialStockFactory(
+            store=self.store,
+            material=self.material,
+            current_capacity=20,
+            max_capacity=100,
+        )
+        MaterialQuantityFactory(
+            quantity=2, product=self.product, ingredient=self.material
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_record_every_change(self):
+        self.client.post(
+            '/restock/',
+            {"materials": [{"material": self.material.pk, "quantity": 30}]},
+            format='json',
+        )
+        self.client.post(
+            '/sales/',
+            {"sale": [{"product": self.product.pk, "quantity": 5}]},
+            format='json',
+        )
+        ingestion.ingest_sales(
+            self.user,
+            [(1, {"product": self.product.pk, "quantity": 1})] * 3,
+        )
+        hold = holds.reserve(self.store, [{"product": self.product.pk, "quantity": 2}])
+        holds.commit(hold.pk)
+        # A hold given back changes no current capacity.
+        holds.release(
+            holds.reserve(self.store, [{"product": self.product.pk, "quantity": 1}]).pk
+        )
+
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(store=self.store)
+                .order_by('pk')
+                .values_list('kind', 'quantity')
+            ),
+            [
+                (StockMovement.ADJUSTMENT, 20),
+                (StockMovement.RESTOCK, 30),
+                (StockMovement.SALE, -10),
+                (StockMovement.SALE, -6),
+                (StockMovement.SALE, -4),
+            ],
+        )
+        self.material_stock.refresh_from_db()
+        self.assertEqual(self.material_stock.current_capacity, 30)
+        self.assertEqual(
+            ledger.get_stock_levels(self.store.pk, timezone.now()),
+            {self.material.pk: 30},
+        )
+
+    def test_record_material_stock_save(self):
+        material_stock = MaterialStock.objects.get(pk=self.material_stock.pk)
+        material_stock.current_capacity = 15
+        material_stock.save()
+        material_stock.max_capacity = 90
+        material_stock.save()
+
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(store=self.store)
+                .order_by('pk')
+                .values_list('kind', 'quantity')
+            ),
+            [(StockMovement.ADJUSTMENT, 20), (StockMovement.ADJUSTMENT, -5)],
+        )
+
+    def test_get_stock_levels_at(self):
+        start = timezone.now() - datetime.timedelta(hours=3)
+        self._add_movements(start, [30, -10, -5])
+
+        self.assertEqual(
+            ledger.get_stock_levels(self.store.pk, start - datetime.timedelta(days=1)),
+            {},
+        )
+        self.assertEqual(
+            ledger.get_stock_levels(self.store.pk, start), {self.material.pk: 20}
+        )
+        self.assertEqual(
+            ledger.get_stock_levels(
+                self.store.pk, start + datetime.timedelta(minutes=90)
+            ),
+            {self.material.pk: 50},
+        )
+        self.assertEqual(
+            ledger.get_stock_levels(self.store.pk, timezone.now()),
+            {self.material.pk: 35},
+        )
+
+    def test_compact(self):
+        start = timezone.now() - datetime.timedelta(hours=3)
+        self._add_movements(start, [30, -10, -5])
+        material = MaterialFactory()
+        MaterialStockFactory(store=self.store, material=material, current_capacity=7)
+        StockMovement.objects.filter(material=material).update(created_at=start)
+        times = [
+            start + datetime.timedelta(minutes=minutes) for minutes in range(0, 181, 30)
+        ]
+        levels = [ledger.get_stock_levels(self.store.pk, at) for at in times]
+
+        self.assertEqual(ledger.compact(start + datetime.timedelta(minutes=90)), 2)
+        # Only the material that moved since is snapshotted again.
+        self.assertEqual(ledger.compact(start + datetime.timedelta(minutes=150)), 1)
+        self.assertEqual(ledger.compact(start + datetime.timedelta(minutes=160)), 0)
+
+        self.assertEqual(StockSnapshot.objects.count(), 3)
+        self.assertEqual(
+            [ledger.get_stock_levels(self.store.pk, at) for at in times], levels
+        )
+        self.assertEqual(levels[-1], {self.material.pk: 35, material.pk: 7})
+
+    def test_compact_stock_ledger_command(self):
+        StockMovement.objects.update(
+            created_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        out = StringIO()
+        call_command('compact_stock_ledger', stdout=out)
+
+        self.assertEqual(out.getvalue(), "Took 1 snapshots.\n")
+        self.assertEqual(
+            list(StockSnapshot.objects.values_list('material', 'current_capacity')),
+            [(self.material.pk, 20)],
+        )
+
+    def _add_movements(self, start, quantities):
+        # Moves the opening stock to start and adds a movement an hour apart
+        # after it.
+        StockMovement.objects.filter(store=self.store).update(created_at=start)
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(
+                    store=self.store,
+                    material=self.material,
+                    quantity=quantity,
+                    kind=StockMovement.RESTOCK if quantity > 0 else StockMovement.SALE,
+                    created_at=start + datetime.timedelta(hours=hour),
+                )
+                for hour, quantity in enumerate(quantities, start=1)
+            ]
+        )
@@ -0,0 +1,68 @@
+from io import StringIO
+
+import factory
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from inventory import profiling
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+@override_settings(INVENTORY_PROFILING=True)
+class ProfilingMiddlewareTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with a token and a client with the token. Create a store with products and material
+        quantities.
+        """
+        password = factory.Faker('pystr', min_chars=8, max_chars=16)
+        self.user = UserFactory.create(password=password)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + str(self.token))
+
+        product1 = ProductFactory()
+        product2 = ProductFactory()
+        StoreFactory(user=self.user, products=(product1, product2))
+        MaterialQuantityFactory(product=product1, ingredient=MaterialFactory())
+        MaterialQuantityFactory(product=product2, ingredient=MaterialFactory())
+
+        profiling.profile.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/sales/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+
+    def test_report(self):
+        self.client.get('/sales/')
+        self.client.get('/sales/')
+        StoreFactory(user=self.user)
+        self.client.get('/stores/')
+
+        report = {
+            row['endpoint']: row
+            for row in profiling.get_report([profiling.profile.snapshot()])
+        }
+
+        self.assertEqual(report['SalesViewSet.list']['requests'], 2)
+        self.assertEqual(report['SalesViewSet.list']['duplicates'], [])
+        self.assertEqual(report['StoreViewSet.list']['requests'], 1)
+        # Each store loads its products separately.
+        self.assertEqual(report['StoreViewSet.list']['duplicates'][0]['count'], 2)
+
+    def test_profiling_report_command(self):
+        self.client.get('/sales/')
+        stdout = StringIO()
+
+        call_command('profiling_report', stdout=stdout)
+
+        self.assertIn("SalesViewSet.list: 1 requests", stdout.getvalue())
@@ -0,0 +1,282 @@
+from unittest import mock
+
+from django.db import OperationalError, transaction
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from inventory import services
+from inventory.models import (Material, MaterialQuantity, MaterialStock,
+                              ProductAvailability)
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory)
+
+
+class ProductAvailableQuantityTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with three products sharing materials, one material without stock and one product without a
+        recipe.
+        """
+        self.product1 = ProductFactory()
+        self.product2 = ProductFactory()
+        self.product3 = ProductFactory()
+        self.product4 = ProductFactory()
+        self.store = StoreFactory(
+            products=(self.product1, self.product2, self.product3, self.product4)
+        )
+        material1 = MaterialFactory()
+        material2 = MaterialFactory()
+        material3 = MaterialFactory()
+        MaterialStockFactory(store=self.store, material=material1, current_capacity=20)
+        MaterialStockFactory(store=self.store, material=material2, current_capacity=7)
+        MaterialQuantityFactory(quantity=2, product=self.product1, ingredient=material1)
+        MaterialQuantityFactory(quantity=3, product=self.product1, ingredient=material2)
+        MaterialQuantityFactory(quantity=6, product=self.product2, ingredient=material1)
+        MaterialQuantityFactory(quantity=1, product=self.product3, ingredient=material1)
+        MaterialQuantityFactory(quantity=1, product=self.product3, ingredient=material3)
+
+    def test_get_products_available_quantity(self):
+        available_quantities = services.get_products_available_quantity(
+            self.store,
+            [
+                self.product1.product_id,
+                self.product2.product_id,
+                self.product3.product_id,
+                self.product4.product_id,
+            ],
+        )
+
+        self.assertEqual(
+            available_quantities,
+            {
+                self.product1.product_id: 2,
+                self.product2.product_id: 3,
+                self.product3.product_id: 0,
+            },
+        )
+
+    def test_get_products_available_quantity_subset(self):
+        available_quantities = services.get_products_available_quantity(
+            self.store, [self.product2.product_id]
+        )
+
+        self.assertEqual(available_quantities, {self.product2.product_id: 3})
+
+
+@override_settings(INVENTORY_CATALOGUE_CACHE=True)
+class RecipeCacheTest(APITestCase):
+    def setUp(self):
+        """
+        Create a product with a recipe of two materials.
+        """
+        self.product = ProductFactory()
+        self.material1 = MaterialFactory()
+        self.material2 = MaterialFactory()
+        self.material_quantity = MaterialQuantityFactory(
+            quantity=2, product=self.product, ingredient=self.material1
+        )
+        MaterialQuantityFactory(
+            quantity=3, product=self.product, ingredient=self.material2
+        )
+
+    def test_get_recipes_warm_cache(self):
+        services.get_recipes([self.product.product_id])
+
+        with self.assertNumQueries(0):
+            recipes = services.get_recipes([self.product.product_id])
+
+        self.assertEqual(
+            sorted(recipes[self.product.product_id]),
+            [(self.material1.material_id, 2), (self.material2.material_id, 3)],
+        )
+
+    @override_settings(INVENTORY_CATALOGUE_CACHE=False)
+    def test_get_recipes_without_cache(self):
+        services.get_recipes([self.product.product_id])
+        # Changed without the signals, as through another worker.
+        MaterialQuantity.objects.filter(pk=self.material_quantity.pk).update(quantity=5)
+
+        with self.assertNumQueries(1):
+            recipes = services.get_recipes([self.product.product_id])
+
+        self.assertIn((self.material1.material_id, 5), recipes[self.product.product_id])
+
+    def test_get_recipes_material_quantity_changed(self):
+        services.get_recipes([self.product.product_id])
+
+        self.material_quantity.quantity = 5
+        self.material_quantity.save()
+        recipes = services.get_recipes([self.product.product_id])
+
+        self.assertIn((self.material1.material_id, 5), recipes[self.product.product_id])
+
+    def test_get_recipes_material_quantity_deleted(self):
+        services.get_recipes([self.product.product_id])
+
+        self.material_quantity.delete()
+        recipes = services.get_recipes([self.product.product_id])
+
+        self.assertEqual(
+            recipes[self.product.product_id], [(self.material2.material_id, 3)]
+        )
+
+    def test_get_recipes_material_quantity_moved(self):
+        other_product = ProductFactory()
+        services.get_recipes([self.product.product_id, other_product.product_id])
+
+        self.material_quantity.product = other_product
+        self.material_quantity.save()
+        recipes = services.get_recipes(
+            [self.product.product_id, other_product.product_id]
+        )
+
+        self.assertEqual(
+            recipes[self.product.product_id], [(self.material2.material_id, 3)]
+        )
+        self.assertEqual(
+            recipes[other_product.product_id], [(self.material1.material_id, 2)]
+        )
+
+
+@override_settings(INVENTORY_CATALOGUE_CACHE=True)
+class MaterialPriceCacheTest(APITestCase):
+    def setUp(self):
+        """
+        Create a material priced 2.
+        """
+        self.material = MaterialFactory(price=2)
+
+    def test_get_material_prices_warm_cache(self):
+        services.get_material_prices([self.material.pk])
+
+        with self.assertNumQueries(0):
+            prices = services.get_material_prices([self.material.pk])
+
+        self.assertEqual(prices, {self.material.pk: 2})
+
+    def test_get_material_prices_material_changed(self):
+        services.get_material_prices([self.material.pk])
+
+        self.material.price = 3
+        self.material.save()
+
+        self.assertEqual(
+            services.get_material_prices([self.material.pk]), {self.material.pk: 3}
+        )
+
+    @override_settings(INVENTORY_CATALOGUE_CACHE=False)
+    def test_get_material_prices_without_cache(self):
+        services.get_material_prices([self.material.pk])
+        # Changed without the signals, as through another worker.
+        Material.objects.filter(pk=self.material.pk).update(price=3)
+
+        self.assertEqual(
+            services.get_material_prices([self.material.pk]), {self.material.pk: 3}
+        )
+
+
+class ProductAvailabilityTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with two products sharing a material.
+        """
+        self.product1 = ProductFactory()
+        self.product2 = ProductFactory()
+        self.store = StoreFactory(products=(self.product1, self.product2))
+        self.material = MaterialFactory()
+        self.material_stock = MaterialStockFactory(
+            store=self.store, material=self.material, current_capacity=20
+        )
+        MaterialQuantityFactory(
+            quantity=2, product=self.product1, ingredient=self.material
+        )
+        MaterialQuantityFactory(
+            quantity=5, product=self.product2, ingredient=self.material
+        )
+
+    def _get_available_quantities(self):
+        return dict(
+            ProductAvailability.objects.filter(store=self.store).values_list(
+                'product', 'available_quantity'
+            )
+        )
+
+    def test_material_quantity_created(self):
+        self.assertEqual(
+            self._get_available_quantities(),
+            {self.product1.product_id: 10, self.product2.product_id: 4},
+        )
+
+    def test_material_stock_changed(self):
+        self.material_stock.current_capacity = 9
+        self.material_stock.save()
+
+        self.assertEqual(
+            self._get_available_quantities(),
+            {self.product1.product_id: 4, self.product2.product_id: 1},
+        )
+
+    def test_store_products_changed(self):
+        product3 = ProductFactory()
+        self.store.products.remove(self.product2)
+        self.store.products.add(product3)
+
+        self.assertEqual(
+            self._get_available_quantities(),
+            {self.product1.product_id: 10, product3.product_id: 0},
+        )
+
+    def test_refresh_material_availability(self):
+        MaterialStock.objects.filter(pk=self.material_stock.pk).update(
+            current_capacity=15
+        )
+        services.refresh_material_availability(
+            self.store.pk, [self.material.material_id]
+        )
+
+        self.assertEqual(
+            self._get_available_quantities(),
+            {self.product1.product_id: 7, self.product2.product_id: 3},
+        )
+
+
+@mock.patch('inventory.services.time.sleep')
+class RetryOnDatabaseLockedTest(SimpleTestCase):
+    def test_retry(self, sleep):
+        write = mock.Mock(
+            side_effect=[
+                OperationalError("database is locked"),
+                OperationalError("database is locked"),
+                1,
+            ]
+        )
+
+        self.assertEqual(services.retry_on_database_locked(write)(), 1)
+        self.assertEqual(write.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_retry_gives_up(self, sleep):
+        write = mock.Mock(side_effect=OperationalError("database is locked"))
+
+        with self.assertRaises(OperationalError):
+            services.retry_on_database_locked(write)()
+        self.assertEqual(write.call_count, services.DATABASE_LOCKED_ATTEMPTS)
+
+    def test_no_retry_other_error(self, sleep):
+        write = mock.Mock(side_effect=OperationalError("no such table"))
+
+        with self.assertRaises(OperationalError):
+            services.retry_on_database_locked(write)()
+        self.assertEqual(write.call_count, 1)
+
+
+class RetryOnDatabaseLockedInTransactionTest(APITestCase):
+    def test_no_retry_in_transaction(self):
+        write = mock.Mock(side_effect=OperationalError("database is locked"))
+
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                services.retry_on_database_locked(write)()
+        self.assertEqual(write.call_count, 1)
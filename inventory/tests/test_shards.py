@@ -0,0 +1,230 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.test import APITestCase
+
+from inventory import holds, ingestion, ledger, shards
+from inventory.models import MaterialStock, StockMovement
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class ShardTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with a product made of one material, stocked 100 of 200 and split over 4 shards.
+        """
+        self.user = UserFactory()
+        self.product = ProductFactory()
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        self.material = MaterialFactory()
+        self.material_stock = MaterialStockFactory(
+            store=self.store,
+            material=self.material,
+            current_capacity=100,
+            max_capacity=200,
+        )
+        MaterialQuantityFactory(
+            quantity=1, product=self.product, ingredient=self.material
+        )
+        shards.set_shard_count(self.material_stock.pk, 4)
+        self.client.force_authenticate(user=self.user)
+
+    def test_set_shard_count(self):
+        self._assert_stock(row=0, shards=[25, 25, 25, 25])
+        self._assert_reads(100)
+
+        shards.set_shard_count(self.material_stock.pk, 0)
+
+        self._assert_stock(row=100, shards=[])
+        self._assert_reads(100)
+        # Moving the stock between the row and its shards is not a movement.
+        self.assertEqual(
+            list(StockMovement.objects.values_list('kind', 'quantity')),
+            [(StockMovement.ADJUSTMENT, 100)],
+        )
+
+    def test_set_shard_count_invalid(self):
+        with self.assertRaises(serializers.ValidationError):
+            shards.set_shard_count(self.material_stock.pk, shards.MAX_SHARD_COUNT + 1)
+
+    def test_sale_takes_from_one_shard(self):
+        response = self._sell(10)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._assert_stock(row=0, shards=[15, 25, 25, 25])
+        # The availability of the product is left to the rebalancer.
+        self._assert_reads(90, available_quantity=100)
+        self.assertEqual(shards.refresh_availability({}), 1)
+        self._assert_reads(90)
+        self.assertEqual(
+            ledger.get_stock_levels(self.store.pk, timezone.now()),
+            {self.material.pk: 90},
+        )
+
+    def test_sale_larger_than_a_shard(self):
+        response = self._sell(60)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._assert_stock(row=40, shards=[0, 0, 0, 0])
+        self._assert_reads(40, available_quantity=100)
+
+        self.assertEqual(shards.rebalance(), 1)
+        self._assert_stock(row=0, shards=[10, 10, 10, 10])
+        shards.refresh_availability({})
+        self._assert_reads(40)
+        # Shards above half of their share are left as they are.
+        self._sell(4)
+        self.assertEqual(shards.rebalance(), 0)
+
+    def test_sale_more_than_stock(self):
+        response = self._sell(101)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self._assert_stock(row=0, shards=[25, 25, 25, 25])
+
+    def test_hold(self):
+        hold = holds.reserve(self.store, [{"product": self.product.pk, "quantity": 30}])
+
+        self._assert_stock(row=100, shards=[0, 0, 0, 0])
+        self.assertEqual(shards.rebalance(), 1)
+        # The held stock stays on the row.
+        self._assert_stock(row=32, shards=[17, 17, 17, 17])
+        self._assert_reads(100, available_quantity=70)
+
+        holds.commit(hold.pk)
+        self._assert_stock(row=2, shards=[17, 17, 17, 17])
+
+    def test_restock(self):
+        response = self.client.post(
+            '/restock/',
+            {"materials": [{"material": self.material.pk, "quantity": 100}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            '/restock/',
+            {"materials": [{"material": self.material.pk, "quantity": 50}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._assert_stock(row=50, shards=[25, 25, 25, 25])
+        self._assert_reads(150)
+
+    def test_ingest_sales(self):
+        report = ingestion.ingest_sales(
+            self.user, [(1, {"product": self.product.pk, "quantity": 30})]
+        )
+
+        self.assertEqual(report["applied"], 1)
+        self._assert_stock(row=70, shards=[0, 0, 0, 0])
+
+    def test_lock(self):
+        material = MaterialFactory()
+        MaterialStockFactory(store=self.store, material=material, current_capacity=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            material_stocks = shards.lock(
+                self.store.pk, [self.material.pk, material.pk], collect=True
+            )
+
+        # The unsharded row is read first, then the sharded one.
+        self.assertIn('"shard_count" = 0', queries[0]['sql'])
+        self.assertEqual(
+            {
+                material_id: material_stock.current_capacity
+                for material_id, material_stock in material_stocks.items()
+            },
+            {self.material.pk: 100, material.pk: 5},
+        )
+        self._assert_stock(row=100, shards=[0, 0, 0, 0])
+
+    def test_order_inventory_by_current_capacity(self):
+        material = MaterialFactory()
+        MaterialStockFactory(
+            store=self.store, material=material, current_capacity=50, max_capacity=200
+        )
+
+        response = self.client.get('/inventory/', {'ordering': '-current_capacity'})
+
+        self.assertEqual(
+            [row['material'] for row in response.data['materials']],
+            [self.material.pk, material.pk],
+        )
+
+    def test_shard_stock_command(self):
+        out = StringIO()
+        call_command(
+            'shard_stock', self.store.pk, self.material.pk, shards=2, stdout=out
+        )
+
+        self.assertEqual(
+            out.getvalue(),
+            "Material stock {} has 2 shards.\n".format(self.material_stock.pk),
+        )
+        self._assert_stock(row=0, shards=[50, 50])
+        with self.assertRaises(CommandError):
+            call_command('shard_stock', self.store.pk, 0, stdout=out)
+
+    def test_rebalance_shards_command(self):
+        self._sell(60)
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+
+        self.assertEqual(
+            out.getvalue(),
+            "Rebalanced 1 stocks.\nRefreshed the availability of 1 stocks.\n",
+        )
+
+    def test_refresh_availability(self):
+        levels = {}
+        self.assertEqual(shards.refresh_availability(levels), 1)
+        self.assertEqual(shards.refresh_availability(levels), 0)
+
+        self._sell(10)
+        self.assertEqual(shards.refresh_availability(levels), 1)
+        self.assertEqual(levels, {self.material_stock.pk: 90})
+
+    def _sell(self, quantity):
+        return self.client.post(
+            '/sales/',
+            {"sale": [{"product": self.product.pk, "quantity": quantity}]},
+            format='json',
+        )
+
+    def _assert_stock(self, row, shards):
+        material_stock = MaterialStock.objects.get(pk=self.material_stock.pk)
+        self.assertEqual(material_stock.current_capacity, row)
+        self.assertEqual(
+            sorted(material_stock.shards.values_list('current_capacity', flat=True)),
+            sorted(shards),
+        )
+
+    def _assert_reads(self, current_capacity, available_quantity=None):
+        response = self.client.get('/inventory/')
+        self.assertEqual(
+            response.data['materials'][0]['current_capacity'], current_capacity
+        )
+        response = self.client.get(
+            '/material-stocks/{}/'.format(self.material_stock.pk)
+        )
+        self.assertEqual(response.data['current_capacity'], current_capacity)
+        response = self.client.get('/product-capacity/')
+        self.assertEqual(
+            response.data['remaining_capacities'],
+            [
+                {
+                    "product": self.product.pk,
+                    "quantity": current_capacity
+                    if available_quantity is None
+                    else available_quantity,
+                }
+            ],
+        )
@@ -1,3 +1,5 @@
+import json
+
 import factory
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -28,6 +30,12 @@ class InventoryViewSetTest(APITestCase):
         MaterialStockFactory(store=store, material=material1)
         MaterialStockFactory(store=store, material=material2)
         MaterialStockFactory(store=store, material=material3)
+        self.low_material_stock = MaterialStockFactory(
+            store=store,
+            material=MaterialFactory(),
+            current_capacity=0,
+            max_capacity=100,
+        )
 
     def test_get_inventory(self):
         view = views.InventoryViewSet.as_view({'get': 'list'})
@@ -43,6 +51,79 @@ class InventoryViewSetTest(APITestCase):
             response.data, self._get_expected_object(MaterialStock.objects.all())
         )
 
+    def test_get_inventory_paginated(self):
+        view = views.InventoryViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/inventory/', {'page_size': 2}, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        material_stocks = MaterialStock.objects.order_by('id')
+        expected = self._get_expected_object(material_stocks[:2])
+        self.assertEqual(response.data['materials'], expected['materials'])
+        self.assertIsNone(response.data['previous'])
+
+        request = self.factory.get(response.data['next'], format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        expected = self._get_expected_object(material_stocks[2:])
+        self.assertEqual(response.data['materials'], expected['materials'])
+        self.assertIsNone(response.data['next'])
+
+    def test_get_inventory_stream(self):
+        view = views.InventoryViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/inventory/', {'stream': 1}, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            self._get_expected_object(MaterialStock.objects.order_by('id')),
+        )
+
+    def test_get_inventory_below_percentage(self):
+        view = views.InventoryViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/inventory/', {'below_pct': 0.1}, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            self._get_expected_object(
+                MaterialStock.objects.filter(pk=self.low_material_stock.pk)
+            ),
+        )
+
+    def test_get_inventory_below_percentage_not_number(self):
+        view = views.InventoryViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/inventory/', {'below_pct': 'low'}, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_inventory_ordering_percentage(self):
+        view = views.InventoryViewSet.as_view({'get': 'list'})
+        request = self.factory.get(
+            '/inventory/', {'ordering': '-percentage'}, format='json'
+        )
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(1):
+            response = view(request)
+
+        percentages = [
+            material['percentage_of_capacity']
+            for material in response.data['materials']
+        ]
+        self.assertEqual(percentages, sorted(percentages, reverse=True))
+        self.assertEqual(
+            response.data['materials'][-1]['material'],
+            self.low_material_stock.material_id,
+        )
+
     def _get_expected_object(self, obj):
         materials_list = []
         for material in obj:
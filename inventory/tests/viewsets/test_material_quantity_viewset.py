@@ -0,0 +1,60 @@
+import factory
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import (APIRequestFactory, APITestCase,
+                                 force_authenticate)
+
+from inventory import views
+from inventory.tests.factories import (MaterialQuantityFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class MaterialQuantityViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with a token and two stores selling the same product, and a product of another user.
+        """
+        password = factory.Faker('pystr', min_chars=8, max_chars=16)
+        self.user = UserFactory.create(password=password)
+        self.token = Token.objects.create(user=self.user)
+        self.factory = APIRequestFactory()
+
+        # set up the data
+        self.product = ProductFactory()
+        StoreFactory(user=self.user, products=(self.product,))
+        StoreFactory(user=self.user, products=(self.product,))
+        self.material_quantity = MaterialQuantityFactory(product=self.product)
+        other_product = ProductFactory()
+        StoreFactory(products=(other_product,))
+        MaterialQuantityFactory(product=other_product)
+
+    def test_get_material_quantities_once(self):
+        view = views.MaterialQuantityViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/material-quantities/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [material_quantity['id'] for material_quantity in response.data],
+            [self.material_quantity.pk],
+        )
+
+    def test_get_material_quantity_in_two_stores(self):
+        view = views.MaterialQuantityViewSet.as_view({'get': 'retrieve'})
+        request = self.factory.get('/material-quantities/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request, pk=self.material_quantity.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['quantity'], self.material_quantity.quantity)
+
+    def test_get_material_quantities_query_budget(self):
+        MaterialQuantityFactory.create_batch(10, product=self.product)
+        view = views.MaterialQuantityViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/material-quantities/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(1):
+            response = view(request)
+
+        self.assertEqual(len(response.data), 11)
@@ -0,0 +1,62 @@
+import factory
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import (APIRequestFactory, APITestCase,
+                                 force_authenticate)
+
+from inventory import views
+from inventory.tests.factories import (MaterialFactory, MaterialStockFactory,
+                                       StoreFactory, UserFactory)
+
+
+class MaterialViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with a token and two stores stocking the same material, and a material of another user.
+        """
+        password = factory.Faker('pystr', min_chars=8, max_chars=16)
+        self.user = UserFactory.create(password=password)
+        self.token = Token.objects.create(user=self.user)
+        self.factory = APIRequestFactory()
+
+        # set up the data
+        store1 = StoreFactory(user=self.user)
+        store2 = StoreFactory(user=self.user)
+        self.material = MaterialFactory()
+        MaterialStockFactory(store=store1, material=self.material)
+        MaterialStockFactory(store=store2, material=self.material)
+        MaterialStockFactory(store=StoreFactory(), material=MaterialFactory())
+
+    def test_get_materials_once(self):
+        view = views.MaterialViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/materials/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [material['material_id'] for material in response.data],
+            [self.material.material_id],
+        )
+
+    def test_get_material_in_two_stores(self):
+        view = views.MaterialViewSet.as_view({'get': 'retrieve'})
+        request = self.factory.get('/materials/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request, pk=self.material.material_id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], self.material.name)
+
+    def test_get_materials_query_budget(self):
+        store = self.user.store_set.first()
+        MaterialStockFactory.create_batch(
+            10, store=store, material=factory.SubFactory(MaterialFactory)
+        )
+        view = views.MaterialViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/materials/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(1):
+            response = view(request)
+
+        self.assertEqual(len(response.data), 11)
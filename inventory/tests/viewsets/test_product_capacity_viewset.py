@@ -1,4 +1,6 @@
 import factory
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import (APIRequestFactory, APITestCase,
@@ -26,9 +28,9 @@ class ProductCapacityViewSetTest(APITestCase):
         # set up the data
         product1 = ProductFactory()
         product2 = ProductFactory()
-        store = StoreFactory(user=self.user, products=(product1, product2))
-        material1 = MaterialFactory()
-        material2 = MaterialFactory()
+        self.store = store = StoreFactory(user=self.user, products=(product1, product2))
+        self.material1 = material1 = MaterialFactory()
+        self.material2 = material2 = MaterialFactory()
         MaterialStockFactory(store=store, material=material1, current_capacity=20)
         MaterialStockFactory(store=store, material=material2, current_capacity=20)
         MaterialQuantityFactory(quantity=2, product=product1, ingredient=material1)
@@ -50,6 +52,52 @@ class ProductCapacityViewSetTest(APITestCase):
             response.data, self._get_expected_object(Product.objects.all())
         )
 
+    def test_get_product_capacity_query_count_constant(self):
+        view = views.ProductCapacityViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/product-capacity/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with CaptureQueriesContext(connection) as small_catalogue:
+            view(request)
+
+        for _ in range(5):
+            product = ProductFactory()
+            self.store.products.add(product)
+            MaterialQuantityFactory(product=product, ingredient=self.material1)
+            MaterialQuantityFactory(product=product, ingredient=self.material2)
+
+        request = self.factory.get('/product-capacity/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(len(small_catalogue)):
+            response = view(request)
+
+        self.assertEqual(len(response.data['remaining_capacities']), 7)
+
+    def test_get_product_capacity_store_route(self):
+        store = StoreFactory(user=self.user, products=self.store.products.all())
+        MaterialStockFactory(store=store, material=self.material1, current_capacity=4)
+        MaterialStockFactory(store=store, material=self.material2, current_capacity=8)
+        response = self._get_store_route(store)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "remaining_capacities": [
+                    {"product": product.product_id, "quantity": 2}
+                    for product in Product.objects.order_by('pk')
+                ]
+            },
+        )
+
+    def test_get_product_capacity_store_route_other_user(self):
+        response = self._get_store_route(StoreFactory())
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def _get_store_route(self, store):
+        self.client.force_authenticate(user=self.user)
+        return self.client.get('/stores/{}/product-capacity/'.format(store.pk))
+
     def _get_expected_object(self, obj):
         products_list = []
         for product in obj:
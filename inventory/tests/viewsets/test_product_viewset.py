@@ -0,0 +1,59 @@
+import factory
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import (APIRequestFactory, APITestCase,
+                                 force_authenticate)
+
+from inventory import views
+from inventory.tests.factories import (MaterialQuantityFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class ProductViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with a token and two stores selling the same product, and a product of another user.
+        """
+        password = factory.Faker('pystr', min_chars=8, max_chars=16)
+        self.user = UserFactory.create(password=password)
+        self.token = Token.objects.create(user=self.user)
+        self.factory = APIRequestFactory()
+
+        # set up the data
+        self.product = ProductFactory()
+        self.store = StoreFactory(user=self.user, products=(self.product,))
+        StoreFactory(user=self.user, products=(self.product,))
+        self.material_quantity = MaterialQuantityFactory(product=self.product)
+        StoreFactory(products=(ProductFactory(),))
+
+    def test_get_products_once(self):
+        view = views.ProductViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/products/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    'product_id': self.product.product_id,
+                    'name': self.product.name,
+                    'materials': [self.material_quantity.ingredient_id],
+                }
+            ],
+        )
+
+    def test_get_products_query_budget(self):
+        products = ProductFactory.create_batch(10)
+        self.store.products.add(*products)
+        for product in products:
+            MaterialQuantityFactory.create_batch(2, product=product)
+        view = views.ProductViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/products/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        # The products, then the materials of all of them at once.
+        with self.assertNumQueries(2):
+            response = view(request)
+
+        self.assertEqual(len(response.data), 11)
@@ -1,4 +1,8 @@
+import json
+
 import factory
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import (APIRequestFactory, APITestCase,
@@ -49,6 +53,67 @@ class RestockViewSetTest(APITestCase):
             response.data, self._get_expected_object(MaterialStock.objects.all())
         )
 
+    def test_get_restock_query_count_constant(self):
+        view = views.RestockViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/restock/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with CaptureQueriesContext(connection) as small_store:
+            view(request)
+
+        store = MaterialStock.objects.first().store
+        for _ in range(5):
+            MaterialStockFactory(store=store, material=MaterialFactory())
+
+        request = self.factory.get('/restock/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(len(small_store)):
+            response = view(request)
+
+        self.assertEqual(len(response.data['materials']), 8)
+
+    def test_get_restock_price_changed(self):
+        view = views.RestockViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/restock/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        view(request)
+
+        material = Material.objects.get(pk=1)
+        material.price = 1000
+        material.save()
+
+        request = self.factory.get('/restock/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(
+            response.data, self._get_expected_object(MaterialStock.objects.all())
+        )
+
+    def test_get_restock_paginated(self):
+        view = views.RestockViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/restock/', {'page_size': 2}, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        material_stocks = MaterialStock.objects.order_by('id')
+        expected = self._get_expected_object(material_stocks)
+        self.assertEqual(response.data['materials'], expected['materials'][:2])
+        self.assertEqual(response.data['total_price'], expected['total_price'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_get_restock_stream(self):
+        view = views.RestockViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/restock/', {'stream': 'true'}, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            self._get_expected_object(MaterialStock.objects.order_by('id')),
+        )
+
     def test_post_restock_valid_list(self):
         view = views.RestockViewSet.as_view({'post': 'create'})
         post_data = {
@@ -148,6 +213,101 @@ class RestockViewSetTest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_post_restock_quantity_exceed_rolls_back(self):
+        view = views.RestockViewSet.as_view({'post': 'create'})
+        post_data = {
+            "materials": [
+                {"material": 1, "quantity": 5},
+                {"material": 2, "quantity": 1000},
+            ]
+        }
+        request = self.factory.post('/restock/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            list(MaterialStock.objects.values_list('current_capacity', flat=True)),
+            [20, 20, 20],
+        )
+
+    def test_post_restock_same_material_twice(self):
+        view = views.RestockViewSet.as_view({'post': 'create'})
+        post_data = {
+            "materials": [
+                {"material": 1, "quantity": 5},
+                {"material": 1, "quantity": 5},
+            ]
+        }
+        request = self.factory.post('/restock/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            MaterialStock.objects.get(material=1).current_capacity,
+            30,
+        )
+
+    def test_post_restock_material_in_two_stores(self):
+        material_stock = MaterialStock.objects.first()
+        other_store = StoreFactory(user=self.user)
+        MaterialStockFactory(
+            store=other_store,
+            material=material_stock.material,
+            current_capacity=20,
+            max_capacity=100,
+        )
+        post_data = {
+            "materials": [{"material": material_stock.material_id, "quantity": 5}]
+        }
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post('/restock/', post_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            MaterialStock.objects.filter(
+                material=material_stock.material, current_capacity=20
+            ).count(),
+            2,
+        )
+
+        response = self.client.post(
+            '/stores/{}/restock/'.format(other_store.pk), post_data, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            MaterialStock.objects.get(
+                store=other_store, material=material_stock.material
+            ).current_capacity,
+            25,
+        )
+        self.assertEqual(
+            MaterialStock.objects.get(pk=material_stock.pk).current_capacity, 20
+        )
+
+    def test_post_restock_query_count_constant(self):
+        view = views.RestockViewSet.as_view({'post': 'create'})
+        post_data = {"materials": [{"material": 1, "quantity": 5}]}
+        request = self.factory.post('/restock/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with CaptureQueriesContext(connection) as single_item:
+            view(request)
+
+        post_data = {
+            "materials": [
+                {"material": 1, "quantity": 5},
+                {"material": 2, "quantity": 5},
+                {"material": 3, "quantity": 5},
+            ]
+        }
+        request = self.factory.post('/restock/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(len(single_item)):
+            response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def _get_expected_object(self, obj):
         materials_list = []
         total_price = 0.0
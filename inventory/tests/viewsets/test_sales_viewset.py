@@ -1,4 +1,6 @@
 import factory
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import (APIRequestFactory, APITestCase,
@@ -26,7 +28,7 @@ class SalesViewSetTest(APITestCase):
         # set up the data
         product1 = ProductFactory()
         product2 = ProductFactory()
-        store = StoreFactory(user=self.user, products=(product1, product2))
+        self.store = store = StoreFactory(user=self.user, products=(product1, product2))
         material1 = MaterialFactory()
         material2 = MaterialFactory()
         self.material_stock1 = MaterialStockFactory(
@@ -146,3 +148,184 @@ class SalesViewSetTest(APITestCase):
         response = view(request)
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_sales_shared_material_exceed(self):
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {
+            "sale": [{"product": 1, "quantity": 6}, {"product": 2, "quantity": 6}]
+        }
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            MaterialStock.objects.get(
+                material=self.material_stock1.material
+            ).current_capacity,
+            20,
+        )
+
+    def test_post_sales_product_exceed_on_its_own(self):
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {
+            "sale": [{"product": 1, "quantity": 1}, {"product": 2, "quantity": 11}]
+        }
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data[0],
+            "Product 2 sold quantity is more than the current available quantity",
+        )
+
+    def test_post_sales_reads_stock_once(self):
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {
+            "sale": [{"product": 1, "quantity": 1}, {"product": 2, "quantity": 1}]
+        }
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with CaptureQueriesContext(connection) as queries:
+            view(request)
+
+        # The locked read the basket is checked against, and the refresh of
+        # the product availabilities after the deduction.
+        self.assertEqual(
+            [
+                query['sql'].split()[0]
+                for query in queries
+                if 'FROM "inventory_materialstock"' in query['sql']
+            ],
+            ['SELECT', 'SELECT'],
+        )
+
+    def test_post_sales_query_count_constant(self):
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {"sale": [{"product": 1, "quantity": 1}]}
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with CaptureQueriesContext(connection) as single_line:
+            view(request)
+
+        post_data = {
+            "sale": [
+                {"product": 1, "quantity": 1},
+                {"product": 2, "quantity": 1},
+                {"product": 1, "quantity": 2},
+            ]
+        }
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        with self.assertNumQueries(len(single_line)):
+            response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            MaterialStock.objects.get(
+                material=self.material_stock1.material
+            ).current_capacity,
+            10,
+        )
+
+    def test_get_sales_after_post(self):
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {"sale": [{"product": 1, "quantity": 3}]}
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        view(request)
+
+        view = views.SalesViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/sales/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {"sale": [{"product": 1, "quantity": 7}, {"product": 2, "quantity": 7}]},
+        )
+
+    def test_post_sales_store_route(self):
+        store = self._create_second_store()
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {"sale": [{"product": 1, "quantity": 2}]}
+        request = self.factory.post(
+            '/stores/{}/sales/'.format(store.pk), post_data, format='json'
+        )
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request, store_pk=store.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            MaterialStock.objects.get(pk=self.material_stock1.pk).current_capacity, 20
+        )
+        self.assertEqual(
+            MaterialStock.objects.get(
+                store=store, material=self.material_stock1.material
+            ).current_capacity,
+            6,
+        )
+
+    def test_post_sales_several_stores(self):
+        self._create_second_store()
+        view = views.SalesViewSet.as_view({'post': 'create'})
+        post_data = {"sale": [{"product": 1, "quantity": 2}]}
+        request = self.factory.post('/sales/', post_data, format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_sales_several_stores(self):
+        store = self._create_second_store()
+        view = views.SalesViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/sales/', format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        # The user's stores, then the availabilities of all of them.
+        with self.assertNumQueries(2):
+            response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "stores": [
+                    {
+                        "store": self.store.pk,
+                        "sale": [
+                            {"product": 1, "quantity": 10},
+                            {"product": 2, "quantity": 10},
+                        ],
+                    },
+                    {
+                        "store": store.pk,
+                        "sale": [
+                            {"product": 1, "quantity": 5},
+                            {"product": 2, "quantity": 5},
+                        ],
+                    },
+                ]
+            },
+        )
+
+    def test_get_sales_other_user_store(self):
+        store = StoreFactory()
+        view = views.SalesViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/stores/{}/sales/'.format(store.pk), format='json')
+        force_authenticate(request, user=self.user, token=self.token)
+        response = view(request, store_pk=store.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def _create_second_store(self):
+        store = StoreFactory(user=self.user, products=self.store.products.all())
+        MaterialStockFactory(
+            store=store, material=self.material_stock1.material, current_capacity=10
+        )
+        MaterialStockFactory(
+            store=store, material=self.material_stock2.material, current_capacity=10
+        )
+        return store
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import streaming
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class SnapshotViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with two stores, each selling a product made of one stocked material.
+        """
+        self.user = UserFactory()
+        self.stores = []
+        self.material_stocks = []
+        self.products = []
+        for current_capacity in (6, 9):
+            product = ProductFactory()
+            material = MaterialFactory()
+            MaterialQuantityFactory(quantity=3, product=product, ingredient=material)
+            store = StoreFactory(user=self.user, products=(product,))
+            self.material_stocks.append(
+                MaterialStockFactory(
+                    store=store,
+                    material=material,
+                    current_capacity=current_capacity,
+                    max_capacity=10,
+                )
+            )
+            self.stores.append(store)
+            self.products.append(product)
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_snapshot_ndjson(self):
+        response = self.client.get('/snapshot/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).decode().splitlines()
+        ]
+        snapshot_at = rows[0]['snapshot_at']
+        self.assertEqual(rows, self._get_expected_rows(self.stores, snapshot_at))
+
+    def test_get_snapshot_csv(self):
+        response = self.client.get(
+            '/stores/{}/snapshot/'.format(self.stores[1].pk), {'output': 'csv'}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="snapshot.csv"'
+        )
+        rows = list(
+            csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode()))
+        )
+        material_stock = self.material_stocks[1]
+        self.assertEqual(
+            rows,
+            [
+                {
+                    'snapshot_at': rows[0]['snapshot_at'],
+                    'store': str(self.stores[1].pk),
+                    'kind': 'material',
+                    'id': str(material_stock.material_id),
+                    'current_capacity': '9',
+                    'max_capacity': '10',
+                    'available_quantity': '',
+                },
+                {
+                    'snapshot_at': rows[0]['snapshot_at'],
+                    'store': str(self.stores[1].pk),
+                    'kind': 'product',
+                    'id': str(self.products[1].pk),
+                    'current_capacity': '',
+                    'max_capacity': '',
+                    'available_quantity': '3',
+                },
+            ],
+        )
+
+    def test_get_snapshot_in_chunks(self):
+        streaming.STREAM_CHUNK_SIZE, chunk_size = 1, streaming.STREAM_CHUNK_SIZE
+        try:
+            response = self.client.get('/snapshot/', {'output': 'csv'})
+            chunks = list(response.streaming_content)
+        finally:
+            streaming.STREAM_CHUNK_SIZE = chunk_size
+
+        # The header with the first row, then one chunk per row.
+        self.assertEqual(len(chunks), 4)
+
+    def test_get_snapshot_invalid_output(self):
+        response = self.client.get('/snapshot/', {'output': 'xml'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_snapshot_other_store(self):
+        response = self.client.get('/stores/{}/snapshot/'.format(StoreFactory().pk))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_snapshot_command(self):
+        stdout = io.StringIO()
+        call_command(
+            'export_snapshot',
+            user=self.user.username,
+            store=[self.stores[0].pk],
+            stdout=stdout,
+        )
+
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(
+            rows, self._get_expected_rows(self.stores[:1], rows[0]['snapshot_at'])
+        )
+
+    def _get_expected_rows(self, stores, snapshot_at):
+        rows = []
+        for store, material_stock in zip(stores, self.material_stocks):
+            rows.append(
+                {
+                    'snapshot_at': snapshot_at,
+                    'store': store.pk,
+                    'kind': 'material',
+                    'id': material_stock.material_id,
+                    'current_capacity': material_stock.current_capacity,
+                    'max_capacity': 10,
+                    'available_quantity': None,
+                }
+            )
+        for store, material_stock, product in zip(
+            stores, self.material_stocks, self.products
+        ):
+            rows.append(
+                {
+                    'snapshot_at': snapshot_at,
+                    'store': store.pk,
+                    'kind': 'product',
+                    'id': product.pk,
+                    'current_capacity': None,
+                    'max_capacity': None,
+                    'available_quantity': material_stock.current_capacity // 3,
+                }
+            )
+        return rows
@@ -0,0 +1,50 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import alerts
+from inventory.models import MaterialStock
+from inventory.tests.factories import (MaterialFactory, MaterialStockFactory,
+                                       StoreFactory, UserFactory)
+
+
+class StockAlertViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with two stores low on a material, one of them restocked since, and a low store of another user.
+        """
+        self.user = UserFactory()
+        self.material = MaterialFactory()
+        self.stores = [StoreFactory(user=self.user) for _ in range(2)]
+        self.material_stocks = [
+            MaterialStockFactory(
+                store=store,
+                material=self.material,
+                current_capacity=5,
+                reorder_point=10,
+            )
+            for store in self.stores + [StoreFactory()]
+        ]
+        MaterialStock.objects.filter(pk=self.material_stocks[1].pk).update(
+            current_capacity=50
+        )
+        alerts.check_materials(self.stores[1].pk, [self.material.pk])
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_open_alerts(self):
+        response = self.client.get('/alerts/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(alert['store'], alert['current_capacity']) for alert in response.data],
+            [(self.stores[0].pk, 5)],
+        )
+
+    def test_get_store_alerts_resolved(self):
+        response = self.client.get(
+            '/stores/{}/alerts/'.format(self.stores[1].pk), {'resolved': '1'}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['store'], self.stores[1].pk)
+        self.assertIsNotNone(response.data[0]['resolved_at'])
@@ -0,0 +1,93 @@
+import datetime
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory.models import StockMovement
+from inventory.tests.factories import (MaterialFactory, MaterialStockFactory,
+                                       StoreFactory, UserFactory)
+
+
+class StockHistoryViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create an user with two stores of one material, stocked a day ago and restocked an hour ago.
+        """
+        self.user = UserFactory()
+        self.material = MaterialFactory()
+        self.stores = []
+        self.day_ago = timezone.now() - datetime.timedelta(days=1)
+        for current_capacity in (6, 9):
+            store = StoreFactory(user=self.user)
+            MaterialStockFactory(
+                store=store,
+                material=self.material,
+                current_capacity=current_capacity,
+                max_capacity=20,
+            )
+            StockMovement.objects.filter(store=store).update(created_at=self.day_ago)
+            StockMovement.objects.create(
+                store=store,
+                material=self.material,
+                quantity=4,
+                kind=StockMovement.RESTOCK,
+                created_at=timezone.now() - datetime.timedelta(hours=1),
+            )
+            self.stores.append(store)
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_stock_history(self):
+        response = self.client.get('/stock-history/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['stores'],
+            [
+                {
+                    "store": store.pk,
+                    "materials": [
+                        {"material": self.material.pk, "current_capacity": capacity}
+                    ],
+                }
+                for store, capacity in zip(self.stores, (10, 13))
+            ],
+        )
+
+    def test_get_store_stock_history_at(self):
+        at = self.day_ago + datetime.timedelta(minutes=1)
+        response = self.client.get(
+            '/stores/{}/stock-history/'.format(self.stores[1].pk),
+            {'at': at.isoformat()},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['at'], at)
+        self.assertEqual(
+            response.data['stores'],
+            [
+                {
+                    "store": self.stores[1].pk,
+                    "materials": [
+                        {"material": self.material.pk, "current_capacity": 9}
+                    ],
+                }
+            ],
+        )
+
+    def test_get_stock_history_before_stock(self):
+        response = self.client.get(
+            '/stock-history/',
+            {'at': (self.day_ago - datetime.timedelta(days=1)).isoformat()},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [store['materials'] for store in response.data['stores']], [[], []]
+        )
+
+    def test_get_stock_history_invalid_at(self):
+        response = self.client.get('/stock-history/', {'at': 'yesterday'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], "At is not a valid date and time")
@@ -0,0 +1,195 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import holds
+from inventory.models import MaterialStock, StockHold
+from inventory.tests.factories import (MaterialFactory,
+                                       MaterialQuantityFactory,
+                                       MaterialStockFactory, ProductFactory,
+                                       StoreFactory, UserFactory)
+
+
+class StockHoldViewSetTest(APITestCase):
+    def setUp(self):
+        """
+        Create a store with two products sharing one material and log the client in as its user.
+        """
+        self.user = UserFactory()
+        self.product1 = ProductFactory()
+        self.product2 = ProductFactory()
+        self.store = StoreFactory(
+            user=self.user, products=(self.product1, self.product2)
+        )
+        self.material = MaterialFactory()
+        MaterialStockFactory(
+            store=self.store, material=self.material, current_capacity=20
+        )
+        MaterialQuantityFactory(
+            quantity=2, product=self.product1, ingredient=self.material
+        )
+        MaterialQuantityFactory(
+            quantity=1, product=self.product2, ingredient=self.material
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_post_hold(self):
+        response = self.client.post(
+            '/holds/',
+            {"items": [{"product": self.product1.pk, "quantity": 6}], "ttl": 60},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['store'], self.store.pk)
+        self.assertEqual(
+            response.data['items'], [{"product": self.product1.pk, "quantity": 6}]
+        )
+        self._assert_capacities(current=20, held=12)
+        # The held stock is left out of the availability and cannot be sold.
+        capacities = self.client.get('/product-capacity/').data['remaining_capacities']
+        self.assertEqual(
+            {capacity['product']: capacity['quantity'] for capacity in capacities},
+            {self.product1.pk: 4, self.product2.pk: 8},
+        )
+        response = self.client.post(
+            '/sales/',
+            {"sale": [{"product": self.product2.pk, "quantity": 9}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_hold_more_than_available(self):
+        self._reserve(self.product1, 8)
+        response = self.client.post(
+            '/stores/{}/holds/'.format(self.store.pk),
+            {"items": [{"product": self.product2.pk, "quantity": 5}]},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            str(response.data[0]),
+            "Product {} held quantity is more than the current available "
+            "quantity".format(self.product2.pk),
+        )
+        self._assert_capacities(current=20, held=16)
+
+    def test_post_hold_invalid(self):
+        invalid_ttl = self.client.post(
+            '/holds/',
+            {"items": [{"product": self.product1.pk, "quantity": 1}], "ttl": 0},
+            format='json',
+        )
+        no_items = self.client.post('/holds/', {"ttl": 60}, format='json')
+        other_product = self.client.post(
+            '/holds/',
+            {"items": [{"product": ProductFactory().pk, "quantity": 1}]},
+            format='json',
+        )
+
+        self.assertEqual(invalid_ttl.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(no_items.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(other_product.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_commit_hold(self):
+        hold = self._reserve(self.product1, 3)
+        response = self.client.post('/holds/{}/commit/'.format(hold.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['items'], [{"product": self.product1.pk, "quantity": 3}]
+        )
+        self._assert_capacities(current=14, held=0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_commit_hold_locks_before_update(self):
+        hold = self._reserve(self.product1, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            holds.commit(hold.pk)
+
+        statements = [
+            query['sql'].split(' ')[0]
+            for query in queries
+            if '"inventory_materialstock"' in query['sql'].split(' WHERE ')[0]
+        ]
+        # The rows are read under lock before they are updated.
+        self.assertEqual(statements[0], 'SELECT')
+        self.assertIn('UPDATE', statements)
+
+    def test_commit_expired_hold(self):
+        hold = self._reserve(self.product1, 3)
+        StockHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now())
+        response = self.client.post('/holds/{}/commit/'.format(hold.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data[0]), "Hold has expired")
+        self._assert_capacities(current=20, held=0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_patch_held_capacity(self):
+        hold = self._reserve(self.product1, 4)
+        material_stock = MaterialStock.objects.get(
+            store=self.store, material=self.material
+        )
+        response = self.client.patch(
+            '/material-stocks/{}/'.format(material_stock.pk),
+            {"current_capacity": 20, "held_capacity": 0},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._assert_capacities(current=20, held=8)
+        response = self.client.post('/holds/{}/commit/'.format(hold.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_release_hold(self):
+        hold = self._reserve(self.product2, 5)
+        response = self.client.post('/holds/{}/release/'.format(hold.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self._assert_capacities(current=20, held=0)
+        response = self.client.post('/holds/{}/release/'.format(hold.pk))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_other_user_hold(self):
+        hold = self._reserve(self.product2, 1)
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.post('/holds/{}/commit/'.format(hold.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self._assert_capacities(current=20, held=1)
+
+    def test_expire_holds(self):
+        for _ in range(3):
+            self._reserve(self.product2, 2)
+        kept = self._reserve(self.product2, 1)
+        StockHold.objects.exclude(pk=kept.pk).update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        stdout = StringIO()
+        call_command('expire_holds', batch_size=2, stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), "Expired 3 holds.\n")
+        self.assertEqual(list(StockHold.objects.all()), [kept])
+        self._assert_capacities(current=20, held=1)
+
+    def _reserve(self, product, quantity):
+        return holds.reserve(
+            self.store, [{"product": product.pk, "quantity": quantity}]
+        )
+
+    def _assert_capacities(self, current, held):
+        material_stock = MaterialStock.objects.get(
+            store=self.store, material=self.material
+        )
+        self.assertEqual(material_stock.current_capacity, current)
+        self.assertEqual(material_stock.held_capacity, held)
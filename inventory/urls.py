@@ -1,7 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from inventory import views
+from inventory import async_views, views
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -17,8 +17,61 @@ router.register(r'inventory', views.InventoryViewSet, 'inventory')
 router.register(r'product-capacity', views.ProductCapacityViewSet, 'product-capacity')
 router.register(r'restock', views.RestockViewSet, 'restock')
 router.register(r'sales', views.SalesViewSet, 'sales')
+router.register(r'snapshot', views.SnapshotViewSet, 'snapshot')
+router.register(r'holds', views.StockHoldViewSet, 'holds')
+router.register(r'stock-history', views.StockHistoryViewSet, 'stock-history')
+router.register(r'alerts', views.StockAlertViewSet, 'alerts')
 
-# The API URLs are now determined automatically by the router.
+# The API URLs are now determined automatically by the router, next to the
+# routes scoped to one of the user's stores.
 urlpatterns = [
+    path(
+        'stores/<int:store_pk>/product-capacity/',
+        views.ProductCapacityViewSet.as_view({'get': 'list'}),
+        name='store-product-capacity',
+    ),
+    path(
+        'stores/<int:store_pk>/restock/',
+        views.RestockViewSet.as_view({'get': 'list', 'post': 'create'}),
+        name='store-restock',
+    ),
+    path(
+        'stores/<int:store_pk>/sales/',
+        views.SalesViewSet.as_view({'get': 'list', 'post': 'create'}),
+        name='store-sales',
+    ),
+    path(
+        'stores/<int:store_pk>/holds/',
+        views.StockHoldViewSet.as_view({'get': 'list', 'post': 'create'}),
+        name='store-holds',
+    ),
+    path(
+        'stores/<int:store_pk>/snapshot/',
+        views.SnapshotViewSet.as_view({'get': 'list'}),
+        name='store-snapshot',
+    ),
+    path(
+        'stores/<int:store_pk>/alerts/',
+        views.StockAlertViewSet.as_view({'get': 'list'}),
+        name='store-alerts',
+    ),
+    path(
+        'stores/<int:store_pk>/stock-history/',
+        views.StockHistoryViewSet.as_view({'get': 'list'}),
+        name='store-stock-history',
+    ),
+    # Long-polling reads for dashboards, served without a thread per
+    # connection when running under ASGI.
+    path('async/inventory/', async_views.inventory, name='async-inventory'),
+    path(
+        'async/product-capacity/',
+        async_views.product_capacity,
+        name='async-product-capacity',
+    ),
+    path(
+        'async/stores/<int:store_pk>/product-capacity/',
+        async_views.product_capacity,
+        name='async-store-product-capacity',
+    ),
     path('', include(router.urls)),
 ]
@@ -1,18 +1,32 @@
 from django.contrib.auth.models import User
-from django.db import IntegrityError
-from rest_framework import mixins, viewsets
-from rest_framework.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import (DecimalField, ExpressionWrapper, F, FloatField,
+                              Prefetch, Sum)
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
+from inventory import exports, holds, ingestion, ledger, services
+from inventory.caching import cache_response
+from inventory.filters import BelowPercentageFilter, StableOrderingFilter
 from inventory.models import (Material, MaterialQuantity, MaterialStock,
-                              Product, Store)
+                              Product, ProductAvailability, StockAlert,
+                              StockHold, Store)
+from inventory.pagination import MaterialStockCursorPagination
 from inventory.serializers import (MaterialCapacityInPercentageSerializer,
                                    MaterialQuantitySerializer,
                                    MaterialSerializer, MaterialStockSerializer,
                                    ProductCapacitySerializer,
                                    ProductSerializer, RestockSerializer,
-                                   SalesSerializer, StoreSerializer,
+                                   SalesSerializer, StockAlertSerializer,
+                                   StockHoldSerializer, StoreSerializer,
                                    UserSerializer)
+from inventory.streaming import (is_stream_requested, iter_queryset,
+                                 stream_json_envelope)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -42,8 +56,11 @@ class MaterialStockViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         data = request.data
 
-        if instance.current_capacity != data['current_capacity']:
+        if instance.total_capacity != data['current_capacity']:
             raise ValidationError("Current capacity cannot be changed")
+        # Left out of the save, since a sharded stock keeps part of it in its
+        # shards.
+        data = {key: value for key, value in data.items() if key != 'current_capacity'}
         try:
             serializer = self.get_serializer(instance=instance, data=data, partial=True)
             serializer.is_valid(raise_exception=True)
@@ -52,62 +69,292 @@ class MaterialStockViewSet(viewsets.ModelViewSet):
             raise ValidationError(e.args[0])
         return Response(serializer.data)
 
+    # The ledger movement of a save is written with it.
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
 
-class MaterialViewSet(viewsets.ModelViewSet):
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+
+class CatalogueImportMixin:
+    catalogue_kind = None
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        return _ingest_request_body(
+            request,
+            ingestion.iter_records,
+            lambda lines: ingestion.ingest_catalogue(
+                self.catalogue_kind, lines, user=request.user
+            ),
+        )
+
+
+class MaterialViewSet(CatalogueImportMixin, viewsets.ModelViewSet):
     serializer_class = MaterialSerializer
+    catalogue_kind = 'materials'
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Material.objects.filter(
-                material_stocks__store__user=self.request.user
-            )
+            # A subquery instead of joining the stocks, which repeats a
+            # material once per store of the user that stocks it.
+            material_ids = MaterialStock.objects.filter(
+                store__user=self.request.user
+            ).values('material')
+            return Material.objects.filter(pk__in=material_ids)
 
 
-class MaterialQuantityViewSet(viewsets.ModelViewSet):
+class MaterialQuantityViewSet(CatalogueImportMixin, viewsets.ModelViewSet):
     serializer_class = MaterialQuantitySerializer
+    catalogue_kind = 'recipes'
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return MaterialQuantity.objects.filter(
-                product__store__user=self.request.user
-            )
+            product_ids = Store.products.through.objects.filter(
+                store__user=self.request.user
+            ).values('product')
+            return MaterialQuantity.objects.filter(product__in=product_ids)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogueImportMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
+    catalogue_kind = 'products'
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Product.objects.filter(store__user=self.request.user)
+            product_ids = Store.products.through.objects.filter(
+                store__user=self.request.user
+            ).values('product')
+            return Product.objects.filter(pk__in=product_ids).prefetch_related(
+                Prefetch('materials', queryset=Material.objects.only('pk'))
+            )
 
 
 class InventoryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = MaterialCapacityInPercentageSerializer
+    pagination_class = MaterialStockCursorPagination
+    filter_backends = [BelowPercentageFilter, StableOrderingFilter]
+    ordering_fields = ['percentage', 'current_capacity', 'max_capacity', 'material']
+    ordering_aliases = {'current_capacity': 'total_capacity'}
+    ordering = ['id']
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return MaterialStock.objects.filter(store__user=self.request.user)
+            # Same operation order as the Python formula so the rounded
+            # percentages match exactly.
+            percentage = ExpressionWrapper(
+                Cast('total_capacity', FloatField()) / F('max_capacity') * 100.0,
+                output_field=FloatField(),
+            )
+            return (
+                MaterialStock.objects.filter(store__user=self.request.user)
+                .annotate(total_capacity=services.get_current_capacity())
+                .annotate(percentage=percentage)
+            )
 
+    @cache_response
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
+        # Rows are read with values() and shaped by hand instead of going
+        # through the serializer fields, which is most of the cost per row.
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            'id', 'material', 'max_capacity', 'total_capacity', 'percentage'
+        )
+        if is_stream_requested(request):
+            rows = iter_queryset(queryset)
+            return stream_json_envelope("materials", map(self._get_material, rows))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                {"materials": [self._get_material(row) for row in page]}
+            )
 
-        data = {"materials": serializer.data}
+        data = {"materials": [self._get_material(row) for row in queryset]}
         return Response(data)
 
+    def _get_material(self, row):
+        return {
+            "material": row['material'],
+            "max_capacity": row['max_capacity'],
+            "current_capacity": row['total_capacity'],
+            "percentage_of_capacity": round(row['percentage'], 2),
+        }
+
+
+class StoreMixin:
+    # Resolves the stores of a request once and keeps them on the request: the
+    # store of a /stores/{store_pk}/... route, or all the user's stores.
+    def get_stores(self):
+        if not hasattr(self.request, 'stores'):
+            stores = Store.objects.filter(user=self.request.user).order_by('pk')
+            if 'store_pk' in self.kwargs:
+                stores = stores.filter(pk=self.kwargs['store_pk'])
+            self.request.stores = list(stores)
+            if not self.request.stores:
+                raise NotFound("Store not found")
+
+        return self.request.stores
+
+    def get_store(self):
+        stores = self.get_stores()
+        if len(stores) > 1:
+            raise ValidationError(
+                "User has more than one store, use the /stores/{store_id}/ routes"
+            )
+        return stores[0]
+
+
+class ProductQuantityMixin(StoreMixin):
+    def _get_product_quantities(self, key):
+        # The availabilities of every requested store come from one query. A
+        # user with several stores gets them grouped by store.
+        stores = self.get_stores()
+        queryset = ProductAvailability.objects.filter(store__in=stores).order_by(
+            'store', 'product'
+        )
+        if len(stores) == 1:
+            return {key: self.get_serializer(queryset, many=True).data}
+
+        product_quantities = {store.pk: [] for store in stores}
+        for product_availability in queryset:
+            product_quantities[product_availability.store_id].append(
+                product_availability
+            )
+        return {
+            "stores": [
+                {
+                    "store": store_id,
+                    key: self.get_serializer(store_product_quantities, many=True).data,
+                }
+                for store_id, store_product_quantities in product_quantities.items()
+            ]
+        }
+
+
+class StockHoldViewSet(
+    StoreMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    serializer_class = StockHoldSerializer
 
-class ProductCapacityViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
-    serializer_class = ProductCapacitySerializer
+    def get_queryset(self):
+        if self.request.user.is_authenticated:
+            stock_holds = StockHold.objects.filter(store__user=self.request.user)
+            if 'store_pk' in self.kwargs:
+                stock_holds = stock_holds.filter(store=self.kwargs['store_pk'])
+            return stock_holds.order_by('pk')
 
+    def create(self, request, *args, **kwargs):
+        items = request.data.get("items")
+        if not isinstance(items, list):
+            raise ValidationError("No items given")
+
+        hold = holds.reserve(
+            self.get_store(), items, request.data.get("ttl", holds.HOLD_TTL)
+        )
+        serializer = self.get_serializer(hold)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, *args, **kwargs):
+        hold = self.get_object()
+        if not holds.commit(hold.pk):
+            raise ValidationError("Hold has expired")
+        return Response({"items": hold.items})
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, *args, **kwargs):
+        hold = self.get_object()
+        holds.release(hold.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SnapshotViewSet(StoreMixin, viewsets.GenericViewSet):
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Store.objects.get(user=self.request.user)
+            return Store.objects.filter(user=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset()).products
-        serializer = self.get_serializer(queryset, many=True)
+        output = request.query_params.get('output', 'ndjson')
+        if output not in exports.SNAPSHOT_FORMATS:
+            raise ValidationError(
+                "Output must be one of {}".format(", ".join(exports.SNAPSHOT_FORMATS))
+            )
+
+        return exports.stream_snapshot(
+            [store.pk for store in self.get_stores()], output
+        )
+
+
+class StockAlertViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = StockAlertSerializer
+
+    def get_queryset(self):
+        # The open alerts, or every alert with ?resolved=1.
+        if self.request.user.is_authenticated:
+            stock_alerts = StockAlert.objects.filter(store__user=self.request.user)
+            if 'store_pk' in self.kwargs:
+                stock_alerts = stock_alerts.filter(store=self.kwargs['store_pk'])
+            if self.request.query_params.get('resolved') != '1':
+                stock_alerts = stock_alerts.filter(resolved_at__isnull=True)
+            return stock_alerts.order_by('pk')
 
-        data = {"remaining_capacities": serializer.data}
+
+class StockHistoryViewSet(StoreMixin, viewsets.GenericViewSet):
+    def get_queryset(self):
+        if self.request.user.is_authenticated:
+            return Store.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        # The material stock levels of the stores at ?at=<ISO 8601 date time>,
+        # or now.
+        at = timezone.now()
+        if 'at' in request.query_params:
+            try:
+                at = parse_datetime(request.query_params['at'])
+            except ValueError:
+                at = None
+            if at is None:
+                raise ValidationError("At is not a valid date and time")
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+
+        data = []
+        for store in self.get_stores():
+            levels = ledger.get_stock_levels(store.pk, at)
+            data.append(
+                {
+                    "store": store.pk,
+                    "materials": [
+                        {
+                            "material": material_id,
+                            "current_capacity": levels[material_id],
+                        }
+                        for material_id in sorted(levels)
+                    ],
+                }
+            )
+
+        return Response({"at": at, "stores": data})
+
+
+class ProductCapacityViewSet(
+    ProductQuantityMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
+    serializer_class = ProductCapacitySerializer
+
+    def get_queryset(self):
+        if self.request.user.is_authenticated:
+            return self.get_store()
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        data = self._get_product_quantities("remaining_capacities")
         return Response(data)
 
 
@@ -115,13 +362,38 @@ class RestockViewSet(
     mixins.ListModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet
 ):
     serializer_class = RestockSerializer
+    pagination_class = MaterialStockCursorPagination
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return MaterialStock.objects.filter(store__user=self.request.user)
+            material_stocks = MaterialStock.objects.filter(
+                store__user=self.request.user
+            )
+            if 'store_pk' in self.kwargs:
+                material_stocks = material_stocks.filter(store=self.kwargs['store_pk'])
+            return material_stocks
 
+    @cache_response
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        if is_stream_requested(request):
+            totals = {"total_price": 0}
+            return stream_json_envelope(
+                "materials",
+                self._iter_materials(queryset, totals),
+                lambda: {"total_price": round(float(totals["total_price"]), 2)},
+            )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(
+                {
+                    "materials": serializer.data,
+                    "total_price": self._get_queryset_total_price(queryset),
+                }
+            )
+
         serializer = self.get_serializer(queryset, many=True)
         total_price = self._get_total_price(serializer.data)
 
@@ -148,28 +420,59 @@ class RestockViewSet(
 
         return Response(final_data)
 
+    def _iter_materials(self, queryset, totals):
+        rows = iter_queryset(
+            queryset.order_by('id')
+            .annotate(total_capacity=services.get_current_capacity())
+            .values_list(
+                'material', 'max_capacity', 'total_capacity', 'material__price'
+            )
+        )
+        for material, max_capacity, current_capacity, price in rows:
+            quantity = max_capacity - current_capacity
+            totals["total_price"] += price * quantity
+            yield {"material": material, "quantity": quantity}
+
+    def _get_queryset_total_price(self, queryset):
+        total_price = queryset.annotate(
+            total_capacity=services.get_current_capacity()
+        ).aggregate(
+            total_price=Sum(
+                ExpressionWrapper(
+                    (F('max_capacity') - F('total_capacity')) * F('material__price'),
+                    output_field=DecimalField(max_digits=20, decimal_places=2),
+                )
+            )
+        )[
+            'total_price'
+        ]
+        return round(float(total_price or 0), 2)
+
     def _get_total_price(self, materials):
+        prices = services.get_material_prices(
+            material['material'] for material in materials
+        )
         total_price = 0
         for material in materials:
-            price = Material.objects.get(pk=material['material']).price
-            total_price += price * material['quantity']
+            total_price += prices[material['material']] * material['quantity']
         return round(float(total_price), 2)
 
 
 class SalesViewSet(
-    mixins.ListModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet
+    ProductQuantityMixin,
+    mixins.ListModelMixin,
+    mixins.UpdateModelMixin,
+    viewsets.GenericViewSet,
 ):
     serializer_class = SalesSerializer
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Store.objects.get(user=self.request.user)
+            return self.get_store()
 
+    @cache_response
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset()).products
-        serializer = self.get_serializer(queryset, many=True)
-
-        data = {"sale": serializer.data}
+        data = self._get_product_quantities("sale")
         return Response(data)
 
     def create(self, request, *args, **kwargs):
@@ -190,3 +493,24 @@ class SalesViewSet(
             raise ValidationError("No sale given")
 
         return Response(final_data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        return _ingest_request_body(
+            request,
+            ingestion.iter_sale_lines,
+            lambda lines: ingestion.ingest_sales(request.user, lines),
+        )
+
+
+def _ingest_request_body(request, iter_lines, ingest):
+    # The body is read as it is parsed, so it is never held in memory as a
+    # whole.
+    content_type = request.content_type.split(';')[0].strip()
+    lines = iter_lines(ingestion.iter_text_lines(request.stream or []), content_type)
+    try:
+        report = ingest(lines)
+    except UnicodeDecodeError:
+        raise ValidationError("File is not UTF-8 encoded")
+
+    return Response(report)
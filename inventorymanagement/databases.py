@@ -0,0 +1,70 @@
+import os
+
+# Alias of the connection for streamed reads behind a transaction pooler, see
+# get_databases.
+STREAM_DATABASE = 'stream'
+
+# Set on every new SQLite connection in single-node mode. WAL lets readers
+# carry on while a sale commits, and busy_timeout makes a writer wait for the
+# lock instead of failing straight away.
+SINGLE_NODE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+
+def get_databases(base_dir, environ=os.environ):
+    # DATABASE_ENGINE=postgresql switches to PostgreSQL; anything else keeps the
+    # SQLite file in the project directory.
+    engine = environ.get('DATABASE_ENGINE', 'sqlite3')
+    if engine != 'postgresql':
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': environ.get('DATABASE_NAME', base_dir / 'db.sqlite3'),
+        }
+        if environ.get('DATABASE_SQLITE_MODE') == 'single-node':
+            database['PRAGMAS'] = dict(SINGLE_NODE_PRAGMAS)
+        return {'default': database}
+
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('DATABASE_NAME', 'inventorymanagement'),
+        'USER': environ.get('DATABASE_USER', 'postgres'),
+        'PASSWORD': environ.get('DATABASE_PASSWORD', ''),
+        'HOST': environ.get('DATABASE_HOST', 'localhost'),
+        'PORT': environ.get('DATABASE_PORT', '5432'),
+        # Keep connections open between requests instead of reconnecting.
+        'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 60)),
+    }
+    databases = {'default': database}
+    if environ.get('DATABASE_POOLER') == 'pgbouncer':
+        # A transaction pooler may run every transaction on another server
+        # connection, so a cursor cannot be kept open across them.
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        # Without one, psycopg2 loads a whole result before iterator() yields,
+        # so streamed reads connect to DATABASE_STREAM_HOST instead: the server
+        # itself or a pooler in session mode.
+        if environ.get('DATABASE_STREAM_HOST'):
+            databases[STREAM_DATABASE] = dict(
+                database,
+                HOST=environ['DATABASE_STREAM_HOST'],
+                PORT=environ.get('DATABASE_STREAM_PORT', database['PORT']),
+                DISABLE_SERVER_SIDE_CURSORS=False,
+                TEST={'MIRROR': 'default'},
+            )
+
+    return databases
+
+
+def set_pragmas(sender, connection, **kwargs):
+    # connection_created receiver applying the PRAGMAS of a SQLite database.
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from inventorymanagement.databases import get_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'inventorymanagement.urls'
@@ -77,12 +81,10 @@ WSGI_APPLICATION = 'inventorymanagement.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# SQLite by default, PostgreSQL when DATABASE_ENGINE=postgresql, see
+# inventorymanagement/databases.py for the other DATABASE_* variables.
+
+DATABASES = get_databases(BASE_DIR)
 
 
 # Password validation
@@ -133,3 +135,52 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
+
+
+# Per-request SQL and timing profiling, see inventory/profiling.py.
+# Adds a Server-Timing header and keeps a rolling window of the last
+# INVENTORY_PROFILING_WINDOW requests per endpoint for `manage.py profiling_report`.
+
+INVENTORY_PROFILING = os.environ.get('INVENTORY_PROFILING') == '1'
+
+INVENTORY_PROFILING_WINDOW = 1000
+
+
+# Cache of the read endpoints, see inventory/caching.py. Entries are keyed by
+# per-store versions that the signals in inventory/signals.py replace on every
+# write. Set CACHE_URL to a redis:// URL (needs django-redis) to share the cache
+# between workers; otherwise every process keeps its own local memory cache.
+
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+
+# The material prices and recipes read by restocks and sales are only cached
+# once the cache is shared, see services.get_recipes.
+INVENTORY_CATALOGUE_CACHE = bool(os.environ.get('CACHE_URL'))
+
+# Without a shared cache a worker would keep serving responses, and 304s, for
+# writes handled by the other workers, so the cache is only on by default with
+# CACHE_URL.
+INVENTORY_RESPONSE_CACHE = (
+    os.environ.get(
+        'INVENTORY_RESPONSE_CACHE', '1' if os.environ.get('CACHE_URL') else '0'
+    )
+    == '1'
+)
+
+INVENTORY_RESPONSE_CACHE_TIMEOUT = 300
+
+
+# Threads running the queries of the async /async/... routes under ASGI, see
+# inventory/async_views.py.
+INVENTORY_ASYNC_READ_THREADS = int(os.environ.get('INVENTORY_ASYNC_READ_THREADS', 8))
+
+
+# Low stock alerts are posted to this URL by `manage.py deliver_alerts`, see
+# inventory/alerts.py. Without it they are only listed at /alerts/.
+INVENTORY_ALERT_WEBHOOK_URL = os.environ.get('INVENTORY_ALERT_WEBHOOK_URL', '')